@@ -1,51 +1,125 @@
 import openai
 import os
-import json
+import re
+import html
 import random
-import openai
+import time
 from dotenv import load_dotenv
+from llm_gateway import get_llm_gateway
+from theory_cache import TheoryCache, theory_key
+from content_pack import load_content_pack
+from question_pool import QuestionPool
+from question_bank import load_question_bank, sample_unseen, LEVEL_BITS, LEVEL_CATEGORIES
 
 load_dotenv()
 
+_shared_generator = None
+
+# Bump when the theory prompt changes so cached lessons are regenerated
+THEORY_PROMPT_VERSION = 1
+
+# The 14-day program, one topic per day (after the student's weak topics)
+CURRICULUM_TOPICS = ('Algebra', 'Geometry', 'Arithmetic', 'Percentages', 'Fractions', 'Ratios', 'Equations', 'Inequalities', 'Functions', 'Graphs', 'Probability', 'Statistics', 'Number Theory', 'Combinatorics')
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+# Longest wrong-answer explanation stored with a quiz answer
+FEEDBACK_MAX_CHARS = 300
+
+def _resident_mb():
+    """Current resident set size of this process in MB (None if unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except Exception:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return None
+
+def get_content_generator():
+    """Return the process-wide AIContentGenerator, loading the question bank on first use"""
+    global _shared_generator
+    if _shared_generator is None:
+        rss_before = _resident_mb()
+        started = time.perf_counter()
+        _shared_generator = AIContentGenerator()
+        elapsed = time.perf_counter() - started
+        rss_after = _resident_mb()
+        if rss_before is not None and rss_after is not None:
+            print(f"[OK] Question bank loaded in {elapsed:.2f}s: {len(_shared_generator.full_dataset)} problems, resident {rss_after:.1f} MB (+{rss_after - rss_before:.1f} MB)")
+        else:
+            print(f"[OK] Question bank loaded in {elapsed:.2f}s: {len(_shared_generator.full_dataset)} problems")
+    return _shared_generator
+
+def clean_text(text):
+    """Remove markdown and LaTeX formatting, keep only essential math symbols"""
+    if not text:
+        return ""
+    
+    # Decode HTML entities multiple times to catch nested encoding
+    for _ in range(3):
+        text = html.unescape(text)
+    
+    # Remove all LaTeX delimiters and backslashes
+    text = text.replace('\\(', '').replace('\\)', '')
+    text = text.replace('\\[', '').replace('\\]', '')
+    text = text.replace('\(', '').replace('\)', '')
+    
+    # Replace LaTeX commands with simple text
+    text = re.sub(r'\\text\{([^}]+)\}', r'\1', text)  # \text{Area} -> Area
+    text = re.sub(r'\\times', '×', text)  # \times -> ×
+    text = re.sub(r'\\div', '÷', text)  # \div -> ÷
+    text = re.sub(r'\\pi', 'π', text)  # \pi -> π
+    text = re.sub(r'\\frac\{([^}]+)\}\{([^}]+)\}', r'(\1/\2)', text)  # \frac{1}{2} -> (1/2)
+    text = re.sub(r'\\[a-zA-Z]+\{[^}]*\}', '', text)  # Remove other LaTeX commands
+    text = re.sub(r'\\[a-zA-Z]+', '', text)  # Remove LaTeX commands without braces
+    
+    # Remove markdown formatting
+    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\*\*|__', '', text)
+    text = re.sub(r'\*|_', '', text)
+    text = re.sub(r'^---+$', '', text, flags=re.MULTILINE)
+    
+    # Remove extra symbols but keep essential math ones
+    text = re.sub(r'[{}\[\]`~]', '', text)  # Remove brackets, backticks
+    text = re.sub(r'\\', '', text)  # Remove backslashes
+    text = re.sub(r'\$', '', text)  # Remove dollar signs
+    
+    # Clean up whitespace and improve formatting
+    text = re.sub(r'\s+', ' ', text)  # Multiple spaces to single
+    text = re.sub(r'\n{3,}', '\n\n', text)  # Multiple newlines to double
+    
+    # Add proper spacing around sections
+    text = re.sub(r'(Definition|Key Concepts|Example|Solution|Common Patterns)', r'\n\n\1', text)
+    text = re.sub(r'(\d+\.)\s*([A-Z])', r'\n\1 \2', text)  # Number lists
+    text = re.sub(r'(-\s*)', r'\n- ', text)  # Bullet points
+    
+    # Clean up extra newlines at start
+    text = re.sub(r'^\n+', '', text)
+    
+    return text.strip()
+
+def clean_option(option):
+    """Clean option text by removing letter prefixes like 'a )', 'b )', etc."""
+    # Remove patterns like 'a )', 'b )', 'c )', 'd )' from the beginning
+    cleaned = re.sub(r'^[a-d]\s*\)\s*', '', option, flags=re.IGNORECASE)
+    return clean_text(cleaned.strip())
+
 class AIContentGenerator:
     def __init__(self):
         openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.full_dataset = self._load_all_datasets()
-        self.constants = self._load_constants()
-        self.operations = self._load_operations()
+        # Read-only after construction: one instance is shared by every handler
+        self.full_dataset = load_question_bank()
+        self.constants = tuple(self._load_constants())
+        self.operations = tuple(self._load_operations())
         self.training_context = self._build_training_context()
+        self.theory_cache = TheoryCache(THEORY_PROMPT_VERSION)
+        self.content_pack = load_content_pack()
+        self.question_pool = QuestionPool(self)
         print(f"Loaded {len(self.full_dataset)} problems for LLM training")
     
-    def _load_all_datasets(self):
-        """Load ALL dataset files for comprehensive training"""
-        datasets = []
-        files = ['train.json', 'dev.json', 'test.json', 'challenge_test.json']
-        
-        # Try multiple paths
-        base_paths = [
-            '/root/aymen/math',
-            '../aymen/math',
-            'c:/Users/Ahmed/Desktop/aymen/math'
-        ]
-        
-        for file in files:
-            loaded = False
-            for base_path in base_paths:
-                try:
-                    path = f"{base_path}/{file}"
-                    with open(path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        datasets.extend(data)
-                        print(f"Loaded {len(data)} problems from {file}")
-                        loaded = True
-                        break
-                except Exception:
-                    continue
-            if not loaded:
-                print(f"Failed to load {file} from any path")
-        
-        return datasets
-    
     def _load_constants(self):
         """Load mathematical constants"""
         base_paths = ['/root/aymen/math', '../aymen/math', 'c:/Users/Ahmed/Desktop/aymen/math']
@@ -70,12 +144,7 @@ class AIContentGenerator:
     
     def _build_training_context(self):
         """Build comprehensive training context from all data"""
-        categories = {}
-        for problem in self.full_dataset:
-            cat = problem.get('category', 'general')
-            if cat not in categories:
-                categories[cat] = []
-            categories[cat].append(problem)
+        categories = self.full_dataset.topic_counts()
         
         context = f"""DTM EXAM DATASET ANALYSIS:
 Total Problems: {len(self.full_dataset)}
@@ -85,11 +154,11 @@ Operations Available: {len(self.operations)}
 
 PROBLEM PATTERNS:"""
         
-        for cat, problems in categories.items():
-            context += f"\n{cat.upper()}: {len(problems)} problems"
-            if problems:
-                sample = problems[0]
-                context += f"\n  Sample: {sample['Problem'][:80]}..."
+        for cat, count in categories.items():
+            context += f"\n{cat.upper()}: {count} problems"
+            if count:
+                sample = self.full_dataset[self.full_dataset.category_indices((cat,))[0]]
+                context += f"\n  Sample: {sample['text'][:80]}..."
         
         return context
     
@@ -127,80 +196,72 @@ INSTRUCTIONS:
     
     def _clean_text(self, text):
         """Remove markdown and LaTeX formatting, keep only essential math symbols"""
-        import re
-        import html
-        if not text:
-            return ""
-        
-        # Decode HTML entities multiple times to catch nested encoding
-        for _ in range(3):
-            text = html.unescape(text)
-        
-        # Remove all LaTeX delimiters and backslashes
-        text = text.replace('\\(', '').replace('\\)', '')
-        text = text.replace('\\[', '').replace('\\]', '')
-        text = text.replace('\(', '').replace('\)', '')
-        
-        # Replace LaTeX commands with simple text
-        text = re.sub(r'\\text\{([^}]+)\}', r'\1', text)  # \text{Area} -> Area
-        text = re.sub(r'\\times', '×', text)  # \times -> ×
-        text = re.sub(r'\\div', '÷', text)  # \div -> ÷
-        text = re.sub(r'\\pi', 'π', text)  # \pi -> π
-        text = re.sub(r'\\frac\{([^}]+)\}\{([^}]+)\}', r'(\1/\2)', text)  # \frac{1}{2} -> (1/2)
-        text = re.sub(r'\\[a-zA-Z]+\{[^}]*\}', '', text)  # Remove other LaTeX commands
-        text = re.sub(r'\\[a-zA-Z]+', '', text)  # Remove LaTeX commands without braces
-        
-        # Remove markdown formatting
-        text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\*\*|__', '', text)
-        text = re.sub(r'\*|_', '', text)
-        text = re.sub(r'^---+$', '', text, flags=re.MULTILINE)
-        
-        # Remove extra symbols but keep essential math ones
-        text = re.sub(r'[{}\[\]`~]', '', text)  # Remove brackets, backticks
-        text = re.sub(r'\\', '', text)  # Remove backslashes
-        text = re.sub(r'\$', '', text)  # Remove dollar signs
-        
-        # Clean up whitespace and improve formatting
-        text = re.sub(r'\s+', ' ', text)  # Multiple spaces to single
-        text = re.sub(r'\n{3,}', '\n\n', text)  # Multiple newlines to double
-        
-        # Add proper spacing around sections
-        text = re.sub(r'(Definition|Key Concepts|Example|Solution|Common Patterns)', r'\n\n\1', text)
-        text = re.sub(r'(\d+\.)\s*([A-Z])', r'\n\1 \2', text)  # Number lists
-        text = re.sub(r'(-\s*)', r'\n- ', text)  # Bullet points
-        
-        # Clean up extra newlines at start
-        text = re.sub(r'^\n+', '', text)
+        return clean_text(text)
+    
+    def generate_diagnostic_questions_structured(self, level='Beginner', language='uz', count=12, seen=None):
+        """Diagnostic questions: ready AI-generated ones from the background pool, topped up from the dataset"""
+        # Validate language
+        language = self._validate_language(language)
+        level = self._pool_level(level)
         
-        return text.strip()
+        # One pool per category of the level, so weak-topic analysis still sees categories
+        categories = LEVEL_CATEGORIES[level]
+        questions = []
+        for i, category in enumerate(categories):
+            share = count * (i + 1) // len(categories) - count * i // len(categories)
+            questions.extend(self.question_pool.take('diagnostic', category, level, language, share))
+        
+        if len(questions) < count:
+            print(f"Using dataset questions for {level} level ({len(questions)} from the AI pool)")
+            questions.extend(self._get_dataset_questions(count - len(questions), language=language, level=level, seen=seen))
+        random.shuffle(questions)
+        return questions
     
-    def generate_diagnostic_questions_structured(self, level='Beginner', language='uz', count=12):
-        """Generate questions using comprehensive dataset training with guaranteed count"""
+    def generate_practice_questions(self, topic, language='uz', count=5, user_level='Intermediate', seen=None):
+        """Practice questions: ready AI-generated ones from the background pool, topped up from the dataset"""
         # Validate language
         language = self._validate_language(language)
         
-        # USE DATASET ONLY - NO AI GENERATION to avoid language mixing
-        print(f"Using dataset questions for {level} level")
-        return self._get_dataset_questions(count, language=language, level=level)
+        questions = self.question_pool.take('practice', topic, self._pool_level(user_level), language, count)
+        if len(questions) < count:
+            print(f"Using dataset questions for {topic} ({len(questions)} from the AI pool)")
+            questions.extend(self._get_dataset_questions(count - len(questions), topic, language=language, seen=seen))
+        return questions
+    
+    def _pool_level(self, level):
+        level = (level or 'Intermediate').rstrip('+')
+        return level if level in LEVELS else 'Intermediate'
+    
+    async def generate_ai_questions(self, kind, topic, level, language, count):
+        """Ask the model for `count` questions; returns the ones that pass _parse_questions, cleaned
         
-        # OLD AI generation code (disabled)
-        if False:
-         for attempt in range(3):
-            try:
-                training_examples = self._get_comprehensive_examples(level, count=10)
-                lang_text = "Uzbek" if language == 'uz' else "English"
-                difficulty = {
-                    'Beginner': 'basic arithmetic and simple algebra',
-                    'Intermediate': 'algebra, geometry, percentages', 
-                    'Advanced': 'complex problems like DTM exam'
-                }.get(level, 'intermediate')
-                
-                lang_instructions = self._get_language_instructions(language)
-                
-                # Enhanced difficulty-specific prompts
-                difficulty_instructions = {
-            'Beginner': f"""
+        Called by the background QuestionPool, never while a student waits.
+        """
+        if kind == 'diagnostic':
+            prompt = self._diagnostic_prompt(topic, level, language, count)
+        else:
+            prompt = self._practice_prompt(topic, level, language, count)
+        content = await get_llm_gateway().chat(prompt, max_tokens=2500, temperature=0.8)
+        
+        questions = []
+        for q in self._parse_questions(content):
+            text = self._clean_text(q['text'])
+            options = [self._clean_option(option) for option in q['options']]
+            # Cleaning can empty or merge options that differed only in formatting
+            if text and all(options) and len(set(options)) == 4:
+                questions.append({'text': text, 'options': options, 'correct': q['correct'], 'topic': topic, 'rationale': ''})
+        return questions
+    
+    def _diagnostic_prompt(self, category, level, language, count):
+        """Prompt for diagnostic questions in one dataset category, modelled on dataset examples"""
+        pool = self.full_dataset.indices(LEVEL_BITS[level], (category,)) or self.full_dataset.category_indices((category,))
+        training_examples = [self.full_dataset[i] for i in random.sample(pool, min(5, len(pool)))]
+        lang_text = "Uzbek" if language == 'uz' else "English"
+        lang_instructions = self._get_language_instructions(language)
+        
+        # Difficulty-specific instructions
+        difficulty_instructions = {
+            'Beginner': """
 DIFFICULTY: BEGINNER LEVEL
 - Use simple arithmetic operations (+, -, ×, ÷)
 - Problems should be 1-2 steps maximum
@@ -208,18 +269,18 @@ DIFFICULTY: BEGINNER LEVEL
 - Avoid complex formulas or equations
 - Focus on basic concepts: addition, subtraction, multiplication, division, percentages
 - Question length: 50-100 words maximum
-- Examples: "What is 25% of 80?" or "If 3 apples cost $6, how much do 5 apples cost?""",
+- Examples: "What is 25% of 80?" or "If 3 apples cost $6, how much do 5 apples cost?\"""",
             
-            'Intermediate': f"""
+            'Intermediate': """
 DIFFICULTY: INTERMEDIATE LEVEL  
 - Use moderate complexity problems (2-3 steps)
 - Include basic algebra, geometry, and word problems
 - Use decimals, fractions, and simple equations
 - Introduce concepts like area, perimeter, ratios
 - Question length: 75-150 words
-- Examples: "Solve for x: 2x + 5 = 15" or "Find the area of a rectangle with length 8m and width 5m""",
+- Examples: "Solve for x: 2x + 5 = 15" or "Find the area of a rectangle with length 8m and width 5m\"""",
             
-            'Advanced': f"""
+            'Advanced': """
 DIFFICULTY: ADVANCED LEVEL - DTM EXAM COMPLEXITY
 - Use highly complex multi-step problems (4+ steps)
 - Include advanced calculus, physics, complex geometry
@@ -228,23 +289,22 @@ DIFFICULTY: ADVANCED LEVEL - DTM EXAM COMPLEXITY
 - Use advanced mathematical symbols: ², ³, √, sin, cos, tan, log
 - Complex word problems with multiple variables and constraints
 - Question length: 150-300 words
-- Examples: "A particle moves along y = x² - 4x + 3. Find velocity when acceleration = 0" or "Solve: log₂(x+1) + log₂(x-1) = 3"
 - Include physics concepts: projectile motion, waves, thermodynamics
 - Geometry: conic sections, 3D problems, coordinate geometry"""
-                }
-                
-                # For Beginner level, use dataset questions directly instead of AI
-                if level == 'Beginner':
-                    print("Using dataset questions for Beginner level")
-                    dataset_questions = self._get_dataset_questions(count, language=language, level='Beginner')
-                    if len(dataset_questions) == count:
-                        return dataset_questions
-                    else:
-                        print(f"Warning: Only got {len(dataset_questions)} questions from dataset")
-                        # Continue to try AI generation as fallback
-                
-                prompt = f"""
-Generate {count} math questions in {lang_text} for {level} level DTM exam.
+        }
+        
+        return f"""
+{lang_instructions}
+
+Generate {count} {category} math questions in {lang_text} for {level} level DTM exam.
+
+{difficulty_instructions[level]}
+
+DATASET EXAMPLES ({category.upper()}):
+{self._format_comprehensive_examples(training_examples)}
+
+- ENSURE ALL 4 OPTIONS ARE COMPLETELY DIFFERENT
+- Write every question and option in {lang_text} only
 
 Format each question exactly like this:
 
@@ -255,78 +315,24 @@ C) 6
 D) 7
 CORRECT: B
 
-QUESTION: What is 10 - 4?
-A) 5
-B) 6
-C) 7
-D) 8
-CORRECT: B
-
 Generate {count} questions now:
 """
-                
-                response = openai.ChatCompletion.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=2500,
-                    temperature=0.7
-                )
-                
-                questions = self._parse_questions(response.choices[0].message.content)
-                
-                # If we got exactly the right count, return
-                if len(questions) == count:
-                    print(f"AI generation completed")
-                    return questions
-                elif len(questions) > 0:
-                    print(f"Generated only {len(questions)}/{count} questions")
-                    # Supplement with dataset questions
-                    needed = count - len(questions)
-                    dataset_questions = self._get_dataset_questions(needed, language=language)
-                    questions.extend(dataset_questions)
-                    return questions[:count]
-                    
-            except Exception as e:
-                print(f"AI attempt {attempt + 1} failed: {e}")
-                continue
-        
-        # If all AI attempts failed, use dataset
-        print("AI generation failed, using dataset questions")
-        return self._get_dataset_questions(count, language=language, level=level)
     
-    def generate_practice_questions(self, topic, language='uz', count=5, user_level='Intermediate'):
-        """Generate practice questions using comprehensive dataset training"""
-        # Validate language
-        language = self._validate_language(language)
-        
-        # USE DATASET ONLY - NO AI to avoid language mixing
-        print(f"Using dataset questions for {topic}")
-        return self._get_dataset_questions(count, topic, language=language)
-        
-        # OLD CODE (disabled)
-        if False:
-         topic_examples = self._get_comprehensive_topic_examples(topic, count=8)
-        
+    def _practice_prompt(self, topic, user_level, language, count):
+        """Prompt for practice questions on a lesson topic, modelled on dataset examples"""
+        topic_examples = self._get_comprehensive_topic_examples(topic, count=8)
         lang_text = "Uzbek" if language == 'uz' else "English"
         
         # Language-specific instructions
         lang_instructions = self._get_language_instructions(language)
         
-        # Get user level for difficulty adaptation
-        user_level = 'Intermediate'  # Default
-        try:
-            # Try to get user level from context if available
-            user_level = context.get('user_level', 'Intermediate') if 'context' in locals() else 'Intermediate'
-        except:
-            pass
-            
         level_instructions = {
             'Beginner': f"Generate SIMPLE {topic} problems suitable for beginners. Use basic operations and 1-2 steps maximum.",
             'Intermediate': f"Generate MODERATE {topic} problems with 2-3 steps. Include some algebra and geometry concepts.", 
             'Advanced': f"Generate HIGHLY COMPLEX {topic} problems with 4+ steps. MUST include advanced calculus, trigonometry, logarithms, or physics concepts. Use mathematical symbols like ², √, sin, cos, log. Create DTM exam-level difficulty."
         }
         
-        prompt = f"""
+        return f"""
 {self.training_context}
 
 {lang_instructions}
@@ -334,7 +340,7 @@ Generate {count} questions now:
 TOPIC: {topic.upper()}
 LEVEL: {user_level.upper()}
 
-{level_instructions.get(user_level, level_instructions['Intermediate'])}
+{level_instructions[user_level]}
 
 TOPIC-SPECIFIC TRAINING for {topic}:
 {self._format_comprehensive_examples(topic_examples)}
@@ -360,39 +366,6 @@ CORRECT: [A/B/C/D]
 
 IMPORTANT: Each option must be DIFFERENT and UNIQUE!
 """
-        
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=2000,
-                temperature=0.8
-            )
-            
-            questions = self._parse_questions(response.choices[0].message.content)
-            
-            # Always ensure we have exactly the requested count
-            if len(questions) < count:
-                print(f"AI generated only {len(questions)}/{count} questions, supplementing with dataset")
-                needed = count - len(questions)
-                dataset_questions = self._get_dataset_questions(needed, topic, language=language)
-                questions.extend(dataset_questions)
-            
-            # Return exactly the requested count
-            return questions[:count]
-            
-        except Exception as e:
-            print(f"AI generation failed: {e}")
-            # Always return dataset questions as fallback
-            dataset_questions = self._get_dataset_questions(count, topic, language=language)
-            if len(dataset_questions) >= count:
-                return dataset_questions[:count]
-            # If still not enough, pad with random questions
-            while len(dataset_questions) < count:
-                random_q = self._get_dataset_questions(1, language=language)
-                if random_q:
-                    dataset_questions.extend(random_q)
-            return dataset_questions[:count]
     
     def _parse_questions(self, content):
         """Parse AI response into structured question format"""
@@ -449,88 +422,24 @@ IMPORTANT: Each option must be DIFFERENT and UNIQUE!
         print(f"Parsed {len(questions)} valid questions")
         return questions
     
+    def _level_pool(self, level, count):
+        """Bank indices for a difficulty level (levels are scored when the bank is compiled)"""
+        if level not in ('Beginner', 'Advanced'):
+            level = 'Intermediate'
+        pool = self.full_dataset.level_indices(LEVEL_BITS[level])
+        
+        # Fallback to category-based filtering if the level filter yields too few results
+        if len(pool) < count:
+            pool = self.full_dataset.category_indices(LEVEL_CATEGORIES[level])
+        return pool
+    
     def _get_comprehensive_examples(self, level, count=10):
-        """Get examples from full dataset based on difficulty with enhanced filtering"""
+        """Get examples from full dataset based on difficulty"""
         if not self.full_dataset:
             return []
         
-        # Enhanced difficulty filtering
-        if level == 'Beginner':
-            # Simple arithmetic, basic algebra, short problems
-            filtered = []
-            for p in self.full_dataset:
-                text = p.get('Problem', '').lower()
-                category = p.get('category', '')
-                
-                # Beginner criteria: short problems, basic operations
-                if (len(text) < 150 and 
-                    category in ['general', 'gain'] and
-                    any(word in text for word in ['add', 'subtract', 'multiply', 'divide', 'sum', 'difference', 'simple']) and
-                    not any(word in text for word in ['equation', 'formula', 'complex', 'derivative', 'integral'])):
-                    filtered.append(p)
-                    
-        elif level == 'Advanced':
-            # Complex problems, multiple steps, advanced concepts
-            filtered = []
-            for p in self.full_dataset:
-                text = p.get('Problem', '').lower()
-                original_text = p.get('Problem', '')
-                category = p.get('category', '')
-                
-                # Enhanced Advanced criteria: much more selective
-                complexity_score = 0
-                
-                # Length factor (longer = more complex)
-                if len(text) > 200: complexity_score += 3
-                elif len(text) > 150: complexity_score += 2
-                elif len(text) > 100: complexity_score += 1
-                
-                # Advanced mathematical symbols
-                if any(symbol in original_text for symbol in ['²', '³', '^', '√', 'log', 'sin', 'cos', 'tan']):
-                    complexity_score += 3
-                
-                # Complex mathematical terms
-                advanced_terms = ['quadratic', 'polynomial', 'derivative', 'integral', 'matrix', 'vector', 'trigonometric', 'logarithmic', 'exponential', 'parabola', 'hyperbola', 'ellipse']
-                complexity_score += sum(2 for term in advanced_terms if term in text)
-                
-                # Multi-step indicators
-                multi_step = ['system of equations', 'solve for', 'find the value', 'determine', 'calculate', 'given that', 'if and only if']
-                complexity_score += sum(1 for indicator in multi_step if indicator in text)
-                
-                # Advanced categories with higher weight
-                if category in ['physics', 'probability']:
-                    complexity_score += 2
-                elif category == 'geometry':
-                    complexity_score += 1
-                
-                # Only include if complexity score is high enough
-                if complexity_score >= 5 and category in ['physics', 'geometry', 'probability']:
-                    filtered.append(p)
-                    
-        else:  # Intermediate
-            # Medium complexity problems
-            filtered = []
-            for p in self.full_dataset:
-                text = p.get('Problem', '').lower()
-                category = p.get('category', '')
-                
-                # Intermediate criteria: moderate length and complexity
-                if (50 < len(text) < 200 and
-                    category in ['general', 'geometry', 'gain'] and
-                    any(word in text for word in ['find', 'solve', 'calculate']) and
-                    not any(word in text for word in ['complex', 'advanced', 'derivative'])):
-                    filtered.append(p)
-        
-        # Fallback to category-based filtering if enhanced filtering yields too few results
-        if len(filtered) < count:
-            if level == 'Beginner':
-                filtered = [p for p in self.full_dataset if p.get('category') in ['general', 'gain']]
-            elif level == 'Advanced':
-                filtered = [p for p in self.full_dataset if p.get('category') in ['physics', 'geometry', 'probability']]
-            else:
-                filtered = [p for p in self.full_dataset if p.get('category') in ['general', 'geometry', 'gain']]
-        
-        return random.sample(filtered, min(count, len(filtered)))
+        pool = self._level_pool(level, count)
+        return [self.full_dataset[i] for i in random.sample(pool, min(count, len(pool)))]
     
     def _get_comprehensive_topic_examples(self, topic, count=8):
         """Get comprehensive topic-specific examples from full dataset"""
@@ -554,42 +463,45 @@ IMPORTANT: Each option must be DIFFERENT and UNIQUE!
             'combinatorics': ['probability']
         }
         
-        categories = topic_map.get(topic.lower(), ['general'])
-        filtered = [q for q in self.full_dataset if q.get('category') in categories]
+        # Weak topics from the diagnostic are dataset categories themselves
+        default = [topic.lower()] if topic.lower() in self.full_dataset.categories else ['general']
+        categories = topic_map.get(topic.lower(), default)
+        filtered = self.full_dataset.category_indices(categories)
         
         if not filtered:
-            filtered = self.full_dataset
+            filtered = range(len(self.full_dataset))
             
-        return random.sample(filtered, min(count, len(filtered)))
+        return [self.full_dataset[i] for i in random.sample(filtered, min(count, len(filtered)))]
     
     def _format_comprehensive_examples(self, examples):
         """Format comprehensive dataset examples for LLM training"""
         formatted = []
         for i, ex in enumerate(examples[:5]):  # Show more examples
-            options = ex.get('options', '').split(' , ')[:4]
-            if len(options) == 4:
-                rationale = ex.get('Rationale', '')[:100]
-                category = ex.get('category', 'general')
-                formatted.append(f"""
-EXAMPLE {i+1} [{category.upper()}]:
-Problem: {ex['Problem']}
+            options = ex['options']
+            rationale = ex['rationale'][:100]
+            formatted.append(f"""
+EXAMPLE {i+1} [{ex['topic'].upper()}]:
+Problem: {ex['text']}
 A) {options[0]}
 B) {options[1]} 
 C) {options[2]}
 D) {options[3]}
-Correct: {ex['correct'].upper()}
+Correct: {ex['correct']}
 Rationale: {rationale}...
 """)
         return '\n'.join(formatted)
     
-    def _get_dataset_questions(self, count, topic=None, language='uz', level=None):
-        """Get questions directly from comprehensive dataset - guaranteed count"""
+    def _get_dataset_questions(self, count, topic=None, language='uz', level=None, seen=None):
+        """Get questions directly from comprehensive dataset - guaranteed count
+
+        With the student's SeenQuestions, questions they were not served before come first.
+        """
         if not self.full_dataset:
             return []
             
         # Filter by level first if specified
         if level:
-            filtered = self._get_comprehensive_examples(level, count=count*3)
+            pool = self._level_pool(level, count*3)
         # Filter by topic if specified
         elif topic:
             topic_map = {
@@ -600,68 +512,83 @@ Rationale: {rationale}...
                 'probability': ['probability']
             }
             categories = topic_map.get(topic.lower(), ['general'])
-            filtered = [q for q in self.full_dataset if q.get('category') in categories]
+            pool = self.full_dataset.category_indices(categories)
         else:
-            filtered = self.full_dataset
-            
-        # Filter out questions with answer E first
-        valid_questions = [q for q in filtered if q.get('correct', '').upper() in ['A', 'B', 'C', 'D']]
-        
-        questions = []
-        attempts = 0
-        max_attempts = len(valid_questions) if valid_questions else 0
+            pool = range(len(self.full_dataset))
         
-        # Keep trying until we get exactly the requested count
-        while len(questions) < count and attempts < max_attempts:
-            remaining_questions = [q for q in valid_questions if q not in [item['_source'] for item in questions if '_source' in item]]
-            if not remaining_questions:
-                # If we run out of unique questions, start over with all questions
-                remaining_questions = valid_questions
-            
-            item = random.choice(remaining_questions)
-            attempts += 1
-            
-            # Skip questions with answer E (we only support A-D)
-            if item['correct'].upper() not in ['A', 'B', 'C', 'D']:
-                continue
-                
-            options = item.get('options', '').split(' , ')
-            if len(options) >= 4:
-                clean_options = [self._clean_option(opt.strip()) for opt in options[:4]]
-                # Ensure options are unique and not empty
-                if len(set(clean_options)) == 4 and all(opt for opt in clean_options):
-                    question = {
-                        'text': self._clean_text(item['Problem']),
-                        'options': clean_options,
-                        'correct': item['correct'].upper(),
-                        'topic': item.get('category', 'general'),
-                        'rationale': self._clean_text(item.get('Rationale', '')),
-                        '_source': item  # Keep reference to avoid duplicates
-                    }
-                    questions.append(question)
-        
-        # Remove the _source field before returning
-        for q in questions:
-            q.pop('_source', None)
-                
-        return questions[:count]
-    
-    def generate_theory_explanation(self, topic, language='uz'):
-        """Generate theory explanation using comprehensive dataset context"""
-        # Validate language
+        # Every bank question is already cleaned and has 4 unique options with an A-D answer,
+        # so one draw of unique indices gives the result: O(count), whatever the pool size
+        return [self._serve_question(self.full_dataset[i]) for i in self._pick(pool, count, seen)]
+    
+    def _pick(self, pool, count, seen=None):
+        """Unique bank indices from pool; unseen ones first when a SeenQuestions is given, which records them"""
+        if seen is None:
+            return random.sample(pool, min(count, len(pool)))
+        picked = sample_unseen(pool, count, seen)
+        for index in picked:
+            seen.add(index)
+        return picked
+    
+    async def generate_theory_explanation(self, topic, language='uz', level=None, cache=True, on_progress=None):
+        """Generate theory explanation using comprehensive dataset context.
+
+        Curriculum lessons come from the content pack, then the theory cache, and only then
+        from GPT-4o; pass cache=False for one-off prompts.
+        """
+        if cache:
+            ready = self.ready_theory(topic, language, level)
+            if ready:
+                return ready
+        return await self.write_lesson_theory(topic, language, level, cache, on_progress)
+
+    def ready_theory(self, topic, language='uz', level=None):
+        """Lesson from the content pack or theory cache, or None when it has to be written"""
+        language = self._validate_language(language)
+        return self.content_pack.get(theory_key(topic, language, level)) or self.theory_cache.get(topic, language, level)
+
+    async def write_lesson_theory(self, topic, language='uz', level=None, cache=True, on_progress=None):
+        """Write a lesson with GPT-4o, falling back to a short outline if it fails.
+
+        With cache, students starting the same lesson together share one generation, which
+        stops once all of them have given up, and the result is stored. on_progress, if given, is awaited with the raw text so far while
+        the answer streams in (only for the caller that started the generation).
+        """
         language = self._validate_language(language)
+        try:
+            if not cache:
+                return await self.write_theory(topic, language, level, on_progress)
+            return await get_llm_gateway().single_flight.do(
+                ('theory', theory_key(topic, language, level)),
+                lambda: self._write_and_cache_theory(topic, language, level, on_progress)
+            )
+        except Exception as e:
+            print(f"Theory generation failed: {e}")
+            if language == 'uz':
+                return f"Mavzu: {topic}\nDTM imtihoniga tayyorgarlik uchun asosiy tushunchalar va formulalar."
+            else:
+                return f"Topic: {topic}\nBasic concepts and formulas for DTM exam preparation."
+
+    async def _write_and_cache_theory(self, topic, language, level, on_progress=None):
+        content = await self.write_theory(topic, language, level, on_progress)
+        if content:
+            self.theory_cache.put(topic, language, level, content)
+        return content
+
+    async def write_theory(self, topic, language, level=None, on_progress=None):
+        """Ask GPT-4o for a cleaned theory lesson; raises LLMUnavailable when it cannot answer"""
         topic_examples = self._get_comprehensive_topic_examples(topic, count=5)
         lang_text = "Uzbek" if language == 'uz' else "English"
         
         # Language-specific instructions
         lang_instructions = self._get_language_instructions(language)
+        level_line = f"\nSTUDENT LEVEL: {level}" if level else ""
         
         prompt = f"""
 {self.training_context}
 
 {lang_instructions}
 
-CREATE THEORY LESSON for "{topic}" in {lang_text}.
+CREATE THEORY LESSON for "{topic}" in {lang_text}.{level_line}
 
 ANALYZE THESE PATTERNS:
 {self._format_comprehensive_examples(topic_examples)}
@@ -686,23 +613,16 @@ IMPORTANT: Use plain text only. Write formulas like "Area = length × width". Us
 Keep under 400 words.
 """
         
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=600
-            )
-            
-            content = response.choices[0].message.content
-            return self._clean_text(content)
-        except Exception as e:
-            print(f"Theory generation failed: {e}")
-            if language == 'uz':
-                return f"Mavzu: {topic}\nDTM imtihoniga tayyorgarlik uchun asosiy tushunchalar va formulalar."
-            else:
-                return f"Topic: {topic}\nBasic concepts and formulas for DTM exam preparation."
+        if on_progress is None:
+            return self._clean_text(await get_llm_gateway().chat(prompt, max_tokens=600))
+        
+        content = ''
+        async for piece in get_llm_gateway().stream_chat(prompt, max_tokens=600):
+            content += piece
+            await on_progress(content)
+        return self._clean_text(content)
     
-    def generate_final_test_questions(self, user_level, target_score, count=12):
+    def generate_final_test_questions(self, user_level, target_score, count=12, seen=None):
         """Generate challenging final test questions"""
         try:
             # Use advanced filtering for final test
@@ -714,39 +634,29 @@ Keep under 400 words.
                 difficulty_level = 'Beginner'
             
             # Get challenging questions from dataset
-            filtered_questions = self._get_comprehensive_examples(difficulty_level, count=count*2)
+            pool = self._level_pool(difficulty_level, count*2)
             
-            if len(filtered_questions) < count:
-                # If not enough, mix with slightly easier questions
-                if difficulty_level == 'Advanced':
-                    additional = self._get_comprehensive_examples('Intermediate', count=count)
-                elif difficulty_level == 'Intermediate':
-                    additional = self._get_comprehensive_examples('Beginner', count=count)
-                else:
-                    additional = []
-                
-                filtered_questions.extend(additional)
+            if len(pool) < count:
+                # If not enough, mix with slightly easier questions; a question can pass more than
+                # one level filter, so each index is kept once or the test could ask it twice
+                easier = {'Advanced': 'Intermediate', 'Intermediate': 'Beginner'}.get(difficulty_level)
+                if easier:
+                    pool = list(dict.fromkeys([*pool, *self._level_pool(easier, count)]))
             
             # Ensure we have enough questions
-            if len(filtered_questions) < count:
-                filtered_questions = random.sample(self.full_dataset, min(count, len(self.full_dataset)))
+            if len(pool) < count:
+                pool = range(len(self.full_dataset))
             
             # Select exactly 12 questions
-            selected = random.sample(filtered_questions, min(count, len(filtered_questions)))
+            selected = [self.full_dataset[i] for i in self._pick(pool, count, seen)]
             
             # Format questions
-            formatted_questions = []
-            for q in selected:
-                options = q.get('options', '').split(' , ')
-                if len(options) >= 4:
-                    clean_options = [self._clean_option(opt.strip()) for opt in options[:4]]
-                    if len(set(clean_options)) == 4 and all(opt for opt in clean_options):
-                        formatted_questions.append({
-                            'question': self._clean_text(q['Problem']),
-                            'options': clean_options,
-                            'correct_answer': q['correct'].upper(),
-                            'explanation': self._clean_text(q.get('Rationale', ''))
-                        })
+            formatted_questions = [{
+                'question': q['text'],
+                'options': list(q['options']),
+                'correct_answer': q['correct'],
+                'explanation': q['rationale']
+            } for q in selected]
             
             return formatted_questions[:count]
             
@@ -754,9 +664,31 @@ Keep under 400 words.
             print(f"Error generating final test questions: {e}")
             return []
     
+    def explain_answer(self, question):
+        """Instant explanation of the correct answer: the rationale the bank stores with every
+        dataset question, or '' for questions without one (AI-generated)"""
+        return question.get('rationale', '')[:FEEDBACK_MAX_CHARS]
+    
+    async def write_answer_explanation(self, question):
+        """GPT-4o explanation of the correct answer; slow, so callers run it in the background"""
+        options = '\n'.join(f"{letter}) {option}" for letter, option in zip('ABCD', question['options']))
+        prompt = f"""Explain briefly (2-3 sentences, plain text) why {question['correct']} is the correct answer:
+
+{question['text']}
+{options}"""
+        text = await get_llm_gateway().chat(prompt, key=('explain', question['text'], question['correct']), max_tokens=150)
+        return self._clean_text(text)[:FEEDBACK_MAX_CHARS]
+    
+    def _serve_question(self, question):
+        """Question dict as handlers expect it, from a bank entry"""
+        return {
+            'text': question['text'],
+            'options': list(question['options']),
+            'correct': question['correct'],
+            'topic': question['topic'],
+            'rationale': question['rationale']
+        }
+    
     def _clean_option(self, option):
         """Clean option text by removing letter prefixes like 'a )', 'b )', etc."""
-        import re
-        # Remove patterns like 'a )', 'b )', 'c )', 'd )' from the beginning
-        cleaned = re.sub(r'^[a-d]\s*\)\s*', '', option, flags=re.IGNORECASE)
-        return self._clean_text(cleaned.strip())
\ No newline at end of file
+        return clean_option(option)
@@ -1,34 +1,283 @@
-import requests
 import os
 import json
+import time
+import random
+import asyncio
+import httpx
+from collections import OrderedDict
 from datetime import datetime
 from dotenv import load_dotenv
+from rate_limiter import RateLimiter, PRIORITY_READ, PRIORITY_WRITE, PRIORITY_BACKGROUND
+from storage import Storage
 
 load_dotenv()
 
-class AirtableDB:
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx when installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per-request timeouts (seconds); a stalled Airtable reply must not hold a handler forever
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Airtable accepts at most 10 records per create/update request
+BATCH_SIZE = 10
+
+# Airtable allows 5 requests per second per base; one limiter covers the whole process
+AIRTABLE_RATE_LIMIT = float(os.getenv('AIRTABLE_RATE_LIMIT', '5'))
+MAX_RETRIES = 4
+# Airtable asks clients to back off for 30 seconds after a 429 without Retry-After
+DEFAULT_RETRY_AFTER = 30.0
+# Errors raised before a request reached Airtable; the only ones safe to retry for creates
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Users records are served from memory for this long before re-reading Airtable
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '2000'))
+
+# Users fields that nothing reads back from Airtable straight away; updates that only touch
+# these are buffered per user and flushed together after USER_WRITE_BEHIND_SECONDS.
+# Any other field forces an immediate PATCH that also carries the buffered ones.
+WRITE_BEHIND_USER_FIELDS = {'Last Active', 'Mode', 'Expected'}
+USER_WRITE_BEHIND_SECONDS = float(os.getenv('USER_WRITE_BEHIND_SECONDS', '2'))
+
+class UserCache:
+    """In-process LRU of Users records keyed by Telegram user ID, with a TTL."""
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, record)
+        self._user_by_record = {}  # Airtable record ID -> user_id
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry:
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def put(self, record):
+        key = str(record.get('fields', {}).get('User ID', ''))
+        if not key:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, record)
+        self._entries.move_to_end(key)
+        self._user_by_record[record['id']] = key
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def merge_fields(self, record_id, fields):
+        """Apply not-yet-flushed fields to a cached record; returns the updated record or None"""
+        key = self._user_by_record.get(record_id)
+        entry = self._entries.get(key) if key else None
+        if not entry:
+            return None
+        record = {**entry[1], 'fields': {**entry[1].get('fields', {}), **fields}}
+        self._entries[key] = (entry[0], record)
+        return record
+
+    def invalidate_record(self, record_id):
+        key = self._user_by_record.get(record_id)
+        if key:
+            self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._user_by_record.pop(entry[1]['id'], None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+def _retry_after(response):
+    """Seconds to wait after a 429, from the Retry-After header when Airtable sends one"""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+def _error_text(response):
+    """Describe a failed Airtable response for logging"""
+    if response is None:
+        return "no response"
+    return f"{response.status_code} - {response.text}"
+
+class AirtableDB(Storage):
     def __init__(self):
         self.api_key = os.getenv('AIRTABLE_API_KEY')
         self.base_id = 'appZ8HbsQlPZ4TkPv'
         self.headers = {'Authorization': f'Bearer {self.api_key}'}
-        
+
         self.tables = {
             'Users': 'tblV9TLAFPX5JqcAP',
             'Learning': 'tblInFtIh5fZt59g4',
             'Quizzes': 'tblLYqC470dcUjytq'
         }
-    
-    def get_user(self, user_id):
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Users"]}'
-        params = {'filterByFormula': f'{{User ID}}="{user_id}"'}
-        response = requests.get(url, headers=self.headers, params=params)
-        
-        if response.status_code == 200:
-            records = response.json().get('records', [])
-            return records[0] if records else None
+        self._client = None
+        self.user_cache = UserCache()
+        self.rate_limiter = RateLimiter(rate=AIRTABLE_RATE_LIMIT, burst=max(1, int(AIRTABLE_RATE_LIMIT)))
+        self._pending_user_fields = {}  # Users record ID -> fields waiting for the next flush
+        self._flush_task = None
+
+    def _get_client(self):
+        """Shared keep-alive connection pool, created on first use inside the event loop"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f'https://api.airtable.com/v0/{self.base_id}',
+                headers=self.headers,
+                http2=HTTP2_AVAILABLE,
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+            )
+        return self._client
+
+    async def close(self):
+        """Flush buffered writes and close pooled connections (called on bot shutdown)"""
+        # Cancelling a flush mid-PATCH would lose the batch it already took from the buffer
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self.flush_user_updates()
+        print(f"[INFO] User cache stats: {self.user_cache.stats()}")
+        print(f"[INFO] Airtable rate limiter stats: {self.rate_limiter.stats()}")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method, table, record_id=None, timeout=None, priority=None, **kwargs):
+        """Send one Airtable API request through the shared rate limiter.
+
+        429s (honouring Retry-After), 5xx and network errors are retried with jittered
+        exponential backoff. Creates are not idempotent, so a POST is retried only after
+        a 429 or a connection error, never once it may have reached Airtable.
+        Returns the last response, or None if none arrived.
+        """
+        url = f'/{self.tables[table]}'
+        if record_id:
+            url += f'/{record_id}'
+        if priority is None:
+            priority = PRIORITY_READ if method == 'GET' else PRIORITY_WRITE
+
+        response = None
+        for attempt in range(MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(priority)
+            try:
+                response = await self._get_client().request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+            except httpx.HTTPError as e:
+                print(f"Airtable {method} {table} failed: {e!r}")
+                response = None
+                if method == 'POST' and not isinstance(e, NOT_SENT_ERRORS):
+                    return None
+
+            if response is not None and response.status_code != 429 and (response.status_code < 500 or method == 'POST'):
+                return response
+            if attempt == MAX_RETRIES:
+                break
+
+            delay = min(DEFAULT_RETRY_AFTER, 0.5 * 2 ** attempt)
+            if response is not None and response.status_code == 429:
+                delay = _retry_after(response)
+                self.rate_limiter.pause(delay)
+            delay += random.uniform(0, delay / 4)
+            self.rate_limiter.retries += 1
+            print(f"Airtable {method} {table} got {response.status_code if response is not None else 'no response'}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        return response
+
+    async def _list_records(self, table, formula):
+        response = await self._request('GET', table, params={'filterByFormula': formula})
+        if response is not None and response.status_code == 200:
+            return response.json().get('records', [])
+        print(f"Error listing {table}: {_error_text(response)}")
         return None
-    
-    def create_user(self, user_id, full_name, username, chat_id):
+
+    async def _list_all_records(self, table, priority=None):
+        """Every record of a table, following Airtable's pages of 100; None on error"""
+        records = []
+        params = {'pageSize': 100}
+        while True:
+            response = await self._request('GET', table, params=params, priority=priority)
+            if response is None or response.status_code != 200:
+                print(f"Error listing {table}: {_error_text(response)}")
+                return None
+            page = response.json()
+            records.extend(page.get('records', []))
+            if not page.get('offset'):
+                return records
+            params = {'pageSize': 100, 'offset': page['offset']}
+
+    async def _create_records(self, table, fields_list, priority=None):
+        """Create records in batches of BATCH_SIZE sent concurrently.
+
+        Returns the created records in input order, with None for records whose batch failed.
+        """
+        chunks = [fields_list[i:i + BATCH_SIZE] for i in range(0, len(fields_list), BATCH_SIZE)]
+        responses = await asyncio.gather(*(
+            self._request('POST', table, json={'records': [{'fields': fields} for fields in chunk]}, priority=priority)
+            for chunk in chunks
+        ))
+
+        created = []
+        for chunk, response in zip(chunks, responses):
+            if response is not None and response.status_code == 200:
+                created.extend(response.json().get('records', []))
+            else:
+                print(f"Error creating {len(chunk)} {table} records: {_error_text(response)}")
+                created.extend([None] * len(chunk))
+        return created
+
+    async def _update_records(self, table, records, priority=None, method='PATCH'):
+        """PATCH many {'id', 'fields'} records in batches of BATCH_SIZE sent concurrently.
+
+        method='PUT' replaces the records' fields instead of merging them.
+        Returns the updated records Airtable confirmed.
+        """
+        chunks = [records[i:i + BATCH_SIZE] for i in range(0, len(records), BATCH_SIZE)]
+        responses = await asyncio.gather(*(
+            self._request(method, table, json={'records': chunk}, priority=priority)
+            for chunk in chunks
+        ))
+
+        updated = []
+        for chunk, response in zip(chunks, responses):
+            if response is not None and response.status_code == 200:
+                updated.extend(response.json().get('records', []))
+            else:
+                print(f"Error updating {len(chunk)} {table} records: {_error_text(response)}")
+        return updated
+
+    async def get_user(self, user_id):
+        cached = self.user_cache.get(user_id)
+        if cached:
+            return cached
+        records = await self._list_records('Users', f'{{User ID}}="{user_id}"')
+        if records:
+            return self._cache_user(records[0])
+        return None
+
+    def _cache_user(self, record):
+        """Cache a Users record as Airtable returned it, overlaid with still-buffered fields"""
+        pending = self._pending_user_fields.get(record['id'])
+        if pending:
+            record = {**record, 'fields': {**record.get('fields', {}), **pending}}
+        self.user_cache.put(record)
+        return record
+
+    async def create_user(self, user_id, full_name, username, chat_id):
         data = {
             "fields": {
                 "User ID": str(user_id),
@@ -39,113 +288,161 @@ class AirtableDB:
                 "Last Active": datetime.now().isoformat()
             }
         }
-        
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Users"]}'
+
         print(f"Creating user in Airtable: {user_id}")
-        response = requests.post(url, headers=self.headers, json=data)
-        if response.status_code == 200:
+        response = await self._request('POST', 'Users', json=data)
+        if response is not None and response.status_code == 200:
             print(f"User created successfully in Airtable")
-            return response.json()
+            return self._cache_user(response.json())
         else:
-            print(f"Error creating user: {response.status_code} - {response.text}")
+            print(f"Error creating user: {_error_text(response)}")
             return None
-    
-    def update_user(self, record_id, fields):
-        data = {"fields": fields}
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Users"]}/{record_id}'
-        response = requests.patch(url, headers=self.headers, json=data)
-        return response.json() if response.status_code == 200 else None
-    
-    def create_quiz_session(self, user_id, questions, lesson_day=None):
-        session_id = f"quiz_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    async def update_user(self, record_id, fields):
+        if set(fields) <= WRITE_BEHIND_USER_FIELDS:
+            self._pending_user_fields.setdefault(record_id, {}).update(fields)
+            self._schedule_user_flush()
+            return self.user_cache.merge_fields(record_id, fields) or {'id': record_id, 'fields': dict(fields)}
+
+        # Send now, carrying anything still buffered for this user in the same PATCH
+        pending = self._pending_user_fields.pop(record_id, {})
+        data = {"fields": {**pending, **fields}}
+        response = await self._request('PATCH', 'Users', record_id, json=data)
+        if response is not None and response.status_code == 200:
+            # Airtable answers with the full updated record, which refreshes the cache
+            return self._cache_user(response.json())
+        self.user_cache.invalidate_record(record_id)
+        return None
+
+    def _schedule_user_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_users_later())
+
+    async def _flush_users_later(self):
+        # Updates buffered while a PATCH is in flight go out in the next round
+        while self._pending_user_fields:
+            await asyncio.sleep(USER_WRITE_BEHIND_SECONDS)
+            await self.flush_user_updates()
+
+    async def flush_user_updates(self):
+        """Send every buffered Users update now, up to BATCH_SIZE users per PATCH"""
+        if not self._pending_user_fields:
+            return
+        pending, self._pending_user_fields = self._pending_user_fields, {}
+        updated = await self._update_records('Users', [
+            {'id': record_id, 'fields': fields} for record_id, fields in pending.items()
+        ], priority=PRIORITY_BACKGROUND)
+        for record in updated:
+            self._cache_user(record)
+        dropped = set(pending) - {record['id'] for record in updated}
+        for record_id in dropped:
+            self.user_cache.invalidate_record(record_id)
+        if dropped:
+            print(f"Dropped buffered Users updates for {len(dropped)} records")
+
+    async def create_quiz_session(self, user_id, questions, lesson_day=None):
+        """Save quiz questions in batched creates.
+
+        Returns (session_id, record_ids) where record_ids maps question number to Airtable record ID.
+        """
+        session_id = self.new_quiz_session_id(user_id)
         print(f"Creating quiz session {session_id} with {len(questions)} questions")
-        
-        for i, question in enumerate(questions):
-            data = {
-                "fields": {
-                    "Session ID": session_id,
-                    "User ID": str(user_id),
-                    "Question Number": i + 1,
-                    "Question Text": question['text'],
-                    "Option A": question['options'][0],
-                    "Option B": question['options'][1], 
-                    "Option C": question['options'][2],
-                    "Option D": question['options'][3],
-                    "Correct Answer": question['correct'],
-                    "Question Topic": question.get('topic', 'general'),
-                    "Last Updated": datetime.now().isoformat()
-                }
-            }
-            
-            if lesson_day:
-                data["fields"]["Lesson Day"] = str(lesson_day)
-            
-            url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Quizzes"]}'
-            response = requests.post(url, headers=self.headers, json=data)
-            if response.status_code != 200:
-                print(f"Error creating question {i+1}: {response.text}")
-            else:
-                print(f"Created question {i+1} successfully")
-        
-        return session_id
-    
-    def update_quiz_answer(self, quiz_id, user_answer, score, feedback, is_last=False):
+
+        fields_list = self.quiz_question_fields(session_id, user_id, questions, lesson_day)
+        created = await self._create_records('Quizzes', fields_list)
+        record_ids = {i + 1: record['id'] for i, record in enumerate(created) if record}
+        print(f"Created {len(record_ids)}/{len(questions)} questions for {session_id}")
+
+        return session_id, record_ids
+
+    async def update_quiz_answer(self, quiz_id, user_answer, score, feedback, is_last=False, record_id=None):
+        """Store one answer. With the record_id from create_quiz_session this is a single PATCH;
+        without it the record is looked up by session and question number first."""
         session_id = quiz_id.split('_q')[0]
         question_num = int(quiz_id.split('_q')[1])
-        
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Quizzes"]}'
-        params = {'filterByFormula': f'AND({{Session ID}}="{session_id}", {{Question Number}}={question_num})'}
-        response = requests.get(url, headers=self.headers, params=params)
-        
-        if response.status_code == 200:
-            records = response.json().get('records', [])
-            if records:
-                record_id = records[0]['id']
-                data = {
-                    "fields": {
-                        "User Answer": user_answer,
-                        "Score": score,
-                        "AI Feedback": feedback,
-                        "Last Updated": datetime.now().isoformat()
-                    }
-                }
-                
-                if is_last:
-                    data["fields"]["Session Status"] = "Completed"
-                
-                update_url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Quizzes"]}/{record_id}'
-                update_response = requests.patch(update_url, headers=self.headers, json=data)
-                if update_response.status_code != 200:
-                    print(f"Error updating answer: {update_response.text}")
-                else:
-                    print(f"Updated answer for question {question_num} successfully")
-            else:
+
+        if not record_id:
+            records = await self._list_records('Quizzes', f'AND({{Session ID}}="{session_id}", {{Question Number}}={question_num})')
+            if records is None:
+                print(f"Error finding quiz record for quiz_id: {quiz_id}")
+                return
+            if not records:
                 print(f"No record found for quiz_id: {quiz_id}")
+                return
+            record_id = records[0]['id']
+
+        data = {
+            "fields": {
+                "User Answer": user_answer,
+                "Score": score,
+                "AI Feedback": feedback,
+                "Last Updated": datetime.now().isoformat()
+            }
+        }
+
+        if is_last:
+            data["fields"]["Session Status"] = "Completed"
+
+        update_response = await self._request('PATCH', 'Quizzes', record_id, json=data)
+        if update_response is None or update_response.status_code != 200:
+            print(f"Error updating answer: {_error_text(update_response)}")
         else:
-            print(f"Error finding quiz record: {response.text}")
-    
-    def complete_quiz_session(self, session_id, final_score):
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Quizzes"]}'
-        params = {'filterByFormula': f'{{Session ID}}="{session_id}"'}
-        response = requests.get(url, headers=self.headers, params=params)
-        
-        if response.status_code == 200:
-            records = response.json().get('records', [])
-            for record in records:
-                record_id = record['id']
-                data = {
-                    "fields": {
-                        "Session Status": "Completed",
-                        "Final Score": final_score,
-                        "Last Updated": datetime.now().isoformat()
-                    }
-                }
-                
-                update_url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Quizzes"]}/{record_id}'
-                requests.patch(update_url, headers=self.headers, json=data)
+            print(f"Updated answer for question {question_num} successfully")
+
+    async def update_quiz_feedback(self, record_id, feedback):
+        data = {"fields": {"AI Feedback": feedback, "Last Updated": datetime.now().isoformat()}}
+        update_response = await self._request('PATCH', 'Quizzes', record_id, priority=PRIORITY_BACKGROUND, json=data)
+        if update_response is None or update_response.status_code != 200:
+            print(f"Error updating feedback: {_error_text(update_response)}")
+
+    async def complete_quiz_session(self, session_id, final_score, record_ids=None):
+        """Mark every question of a session completed in batched multi-record PATCHes.
+
+        record_ids is the question number -> record ID map from create_quiz_session;
+        without it the session's records are looked up first.
+        """
+        if record_ids:
+            ids = list(record_ids.values())
+        else:
+            records = await self._list_records('Quizzes', f'{{Session ID}}="{session_id}"')
+            if records is None:
+                return
+            ids = [record['id'] for record in records]
+
+        now = datetime.now().isoformat()
+        await self._update_records('Quizzes', [
+            {"id": record_id, "fields": {"Session Status": "Completed", "Final Score": final_score, "Last Updated": now}}
+            for record_id in ids
+        ])
+        print(f"Quiz session completed with score: {final_score}%")
+
+    async def record_quiz_answers(self, session_id, answers, final_score=None, record_ids=None):
+        """Answers (and completion) of one session in batched multi-record PATCHes"""
+        known = record_ids or {}
+        missing = any(not answer.get('record_id') and number not in known for number, answer in answers.items())
+        if missing or (final_score is not None and not known):
+            records = await self._list_records('Quizzes', f'{{Session ID}}="{session_id}"')
+            if records is None:
+                return False
+            known = {**self.quiz_record_ids(records), **known}
+
+        updates = self.quiz_answer_updates(answers, known, final_score)
+        updated = await self._update_records('Quizzes', [
+            {"id": record_id, "fields": fields} for record_id, fields in updates.items()
+        ])
+        if final_score is not None:
             print(f"Quiz session completed with score: {final_score}%")
-    
-    def create_learning_record(self, user_id, day, topic, theory_summary=""):
+        return len(updated) == len(updates)
+
+    async def get_quiz_records(self, session_id):
+        """All question records of one quiz session"""
+        return await self._list_records('Quizzes', f"{{Session ID}}='{session_id}'")
+
+    async def get_lesson_quiz_records(self, user_id, day):
+        """Practice question records created for a user's lesson day"""
+        return await self._list_records('Quizzes', f"AND({{User ID}}='{user_id}', {{Lesson Day}}={day})")
+
+    async def create_learning_record(self, user_id, day, topic, theory_summary=""):
         """Create a learning record to track user progress"""
         data = {
             "fields": {
@@ -157,20 +454,37 @@ class AirtableDB:
                 "Last Updated": datetime.now().isoformat()
             }
         }
-        
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Learning"]}'
+
         print(f"Creating learning record for Day {day}: {topic}")
-        response = requests.post(url, headers=self.headers, json=data)
-        if response.status_code == 200:
+        response = await self._request('POST', 'Learning', json=data)
+        if response is not None and response.status_code == 200:
             print(f"Learning record created successfully")
             return response.json()['id']
         else:
-            print(f"Error creating learning record: {response.status_code} - {response.text}")
+            print(f"Error creating learning record: {_error_text(response)}")
             return None
-    
-    def update_learning_record(self, record_id, fields):
+
+    async def create_lesson_record(self, fields):
+        """Create a full lesson row in the Learning table, returns its record ID"""
+        response = await self._request('POST', 'Learning', json={"fields": fields})
+        if response is not None and response.status_code == 200:
+            return response.json().get('id')
+        print(f"Error creating lesson record: {_error_text(response)}")
+        return None
+
+    async def get_learning_record(self, record_id):
+        """Fetch one Learning record by ID"""
+        response = await self._request('GET', 'Learning', record_id)
+        if response is not None and response.status_code == 200:
+            return response.json()
+        return None
+
+    async def get_learning_records(self, user_id):
+        """All Learning records of a user"""
+        return await self._list_records('Learning', f"{{User ID}}='{user_id}'")
+
+    async def update_learning_record(self, record_id, fields):
         """Update a learning record"""
         data = {"fields": fields}
-        url = f'https://api.airtable.com/v0/{self.base_id}/{self.tables["Learning"]}/{record_id}'
-        response = requests.patch(url, headers=self.headers, json=data)
-        return response.json() if response.status_code == 200 else None
\ No newline at end of file
+        response = await self._request('PATCH', 'Learning', record_id, json=data)
+        return response.json() if response is not None and response.status_code == 200 else None
@@ -1,5 +1,6 @@
 import json
 from ai_content import AIContentGenerator
+from question_bank import load_raw_datasets
 
 def analyze_dataset_training():
     """Analyze how well the bot is trained on the dataset"""
@@ -16,7 +17,7 @@ def analyze_dataset_training():
     # Analyze categories
     categories = {}
     for problem in ai.full_dataset:
-        cat = problem.get('category', 'unknown')
+        cat = problem.get('topic', 'unknown')
         categories[cat] = categories.get(cat, 0) + 1
     
     print("   Categories Distribution:")
@@ -85,8 +86,8 @@ def analyze_dataset_training():
     # 6. Text Cleaning Analysis
     print(f"\n6. TEXT CLEANING ANALYSIS:")
     
-    # Test text cleaning on sample problems
-    sample_problems = ai.full_dataset[:5]
+    # Test text cleaning on raw sample problems (the bank itself is already cleaned)
+    sample_problems = load_raw_datasets()[:5]
     for i, problem in enumerate(sample_problems):
         original = problem.get('Problem', '')
         cleaned = ai._clean_text(original)
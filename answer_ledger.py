@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import sqlite3
+from session_store import SESSION_MAX_AGE
+
+ANSWER_LEDGER_PATH = os.getenv('ANSWER_LEDGER_PATH', 'answers.db')
+# A quiz with no new answer for this long has its answers flushed without completing it
+LEDGER_IDLE_SECONDS = float(os.getenv('LEDGER_IDLE_SECONDS', '600'))
+
+class AnswerLedger:
+    """Append-only on-disk log of quiz answers, flushed to the Quizzes table in batches.
+
+    Each answer tap is one local SQLite insert. A session's answers are sent as one
+    batched update when it completes (together with the final score) or after it has
+    been idle for LEDGER_IDLE_SECONDS; a session is dropped from the ledger once its
+    completion has been stored, so answers survive restarts and Airtable outages. Any
+    session is dropped SESSION_MAX_AGE after its last answer, as by then the quiz session
+    itself has expired, so abandoned quizzes do not pile up.
+    """
+
+    def __init__(self, path=None, idle_seconds=LEDGER_IDLE_SECONDS, max_age=SESSION_MAX_AGE):
+        self.idle_seconds = idle_seconds
+        self.max_age = max_age
+        self.conn = sqlite3.connect(path or ANSWER_LEDGER_PATH, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                question_number INTEGER NOT NULL,
+                record_id TEXT,
+                answer TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                feedback TEXT,
+                answered_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS answers_session ON answers (session_id, seq);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                flushed_seq INTEGER NOT NULL DEFAULT 0,
+                final_score REAL,
+                updated_at REAL
+            );
+        """)
+        self._task = None
+        self._db = None
+
+        self.appended = 0
+        self.flushes = 0
+        self.flushed_answers = 0
+        self.failed_flushes = 0
+
+    def record(self, session_id, question_number, answer, score, feedback='', record_id=None):
+        """Durably log one answer; nothing is sent to storage"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO answers (session_id, question_number, record_id, answer, score, feedback, answered_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, question_number, record_id, answer, score, feedback, now)
+            )
+            self.conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+            self.conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = ?", (now, session_id))
+        self.appended += 1
+
+    async def complete(self, db, session_id, final_score, record_ids=None):
+        """Store the session's answers and final score in one batched update"""
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+            self.conn.execute("UPDATE sessions SET final_score = ?, updated_at = ? WHERE session_id = ?",
+                              (final_score, time.time(), session_id))
+        return await self.flush(db, session_id, record_ids)
+
+    async def flush(self, db, session_id, record_ids=None):
+        """Send the session's unflushed answers (and its final score once completed); returns True on success"""
+        row = self.conn.execute("SELECT flushed_seq, final_score FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return True
+        flushed_seq, final_score = row
+        rows = self.conn.execute(
+            "SELECT seq, question_number, record_id, answer, score, feedback FROM answers WHERE session_id = ? AND seq > ? ORDER BY seq",
+            (session_id, flushed_seq)
+        ).fetchall()
+        if not rows and final_score is None:
+            return True
+
+        answers = {}  # a later answer to the same question wins
+        for _, question_number, record_id, answer, score, feedback in rows:
+            answers[question_number] = {'record_id': record_id, 'answer': answer, 'score': score, 'feedback': feedback}
+        try:
+            ok = await db.record_quiz_answers(session_id, answers, final_score, record_ids)
+        except Exception as e:
+            print(f"[ERROR] Answer ledger flush for {session_id} failed: {e!r}")
+            ok = False
+        if not ok:
+            self.failed_flushes += 1
+            return False
+
+        with self.conn:
+            if final_score is not None:
+                self.conn.execute("DELETE FROM answers WHERE session_id = ?", (session_id,))
+                self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            elif rows:
+                # Stored answers are not needed again; a later answer to the same question is a new row
+                self.conn.execute("UPDATE sessions SET flushed_seq = ? WHERE session_id = ?", (rows[-1][0], session_id))
+                self.conn.execute("DELETE FROM answers WHERE session_id = ? AND seq <= ?", (session_id, rows[-1][0]))
+        self.flushes += 1
+        self.flushed_answers += len(answers)
+        return True
+
+    async def flush_idle(self, db, idle_seconds=None):
+        """Flush every session idle for idle_seconds, retry completions that failed and
+        drop sessions older than max_age"""
+        cutoff = time.time() - (self.idle_seconds if idle_seconds is None else idle_seconds)
+        session_ids = [row[0] for row in self.conn.execute("""
+            SELECT s.session_id FROM sessions s
+            WHERE s.final_score IS NOT NULL
+               OR (SELECT MAX(answered_at) FROM answers a WHERE a.session_id = s.session_id AND a.seq > s.flushed_seq) < ?
+        """, (cutoff,))]
+        for session_id in session_ids:
+            await self.flush(db, session_id)
+
+        expired = [row[0] for row in self.conn.execute(
+            "SELECT session_id FROM sessions WHERE COALESCE(updated_at, 0) < ?", (time.time() - self.max_age,)
+        )]
+        if expired:
+            with self.conn:
+                lost = 0
+                for session_id in expired:
+                    lost += self.conn.execute("DELETE FROM answers WHERE session_id = ?", (session_id,)).rowcount
+                    self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            print(f"[INFO] Answer ledger dropped {len(expired)} expired sessions ({lost} answers never stored)")
+
+    def start(self, db):
+        if self._task is None:
+            self._db = db
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the idle loop and flush everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.flush_idle(self._db, idle_seconds=0)
+        print(f"[INFO] Answer ledger stats: {self.stats()}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.idle_seconds / 4)
+            try:
+                await self.flush_idle(self._db)
+            except Exception as e:
+                print(f"[ERROR] Answer ledger idle flush failed: {e!r}")
+
+    def stats(self):
+        pending = self.conn.execute(
+            "SELECT COUNT(*) FROM answers a JOIN sessions s ON a.session_id = s.session_id WHERE a.seq > s.flushed_seq"
+        ).fetchone()[0]
+        return {
+            'pending_answers': pending,
+            'open_sessions': self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            'appended': self.appended,
+            'flushes': self.flushes,
+            'flushed_answers': self.flushed_answers,
+            'failed_flushes': self.failed_flushes
+        }
+
+    def close(self):
+        self.conn.close()
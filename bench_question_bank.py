@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import random
+import subprocess
+import tempfile
+
+def _memory_mb():
+    """(RSS, private memory) of this process in MB from /proc"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values['Rss:'], values['Private_Clean:'] + values['Private_Dirty:']
+
+def synthetic_dataset(count):
+    """Raw problems shaped like the real dataset, for hosts without the dataset files"""
+    rng = random.Random(7)
+    categories = ['general', 'gain', 'geometry', 'physics', 'probability']
+    words = ['find the sum of', 'calculate the area of a triangle with', 'solve for x quadratic', 'a train covers', 'determine the probability']
+    problems = []
+    for i in range(count):
+        length = rng.randint(40, 320)
+        problems.append({
+            'Problem': f"{rng.choice(words)} {i} " + ' '.join(str(rng.randint(1, 999)) for _ in range(length // 4)),
+            'options': ' , '.join(f"{letter} ) {rng.randint(1, 10 ** 6)}" for letter in 'abcde'),
+            'correct': rng.choice('abcd'),
+            'Rationale': ' '.join(str(rng.randint(1, 999)) for _ in range(rng.randint(10, 60))),
+            'category': rng.choice(categories)
+        })
+    return problems
+
+def measure(path, mode):
+    """Child process: load the bank in `mode` and report memory growth as JSON"""
+    from question_bank import QuestionBank
+    rss_before, private_before = _memory_mb()
+    if mode == 'dicts':
+        # The layout before the columnar store: every question as a Python dict
+        bank = tuple(QuestionBank.load(path, use_mmap=False))
+    else:
+        bank = QuestionBank.load(path, use_mmap=(mode == 'mmap'))
+        # Touch every column and string once, as sampling and serving eventually do
+        for i in range(len(bank)):
+            bank[i]
+    rss_after, private_after = _memory_mb()
+    print(json.dumps({'rss_mb': rss_after - rss_before, 'private_mb': private_after - private_before, 'questions': len(bank)}))
+
+def run_benchmark():
+    print("=== QUESTION BANK MEMORY BENCHMARK ===\n")
+    from question_bank import QuestionBank, load_raw_datasets
+
+    raw = load_raw_datasets()
+    if not raw:
+        print("Dataset files not found, using 40000 synthetic problems")
+        raw = synthetic_dataset(40000)
+    bank = QuestionBank.from_raw(raw)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'question_bank.bin')
+        bank.save(path)
+        print(f"Bank: {len(bank)} questions, file {os.path.getsize(path) / 1024 / 1024:.1f} MB\n")
+
+        # This process plays the first bot worker: it maps the bank and touches every page,
+        # so the measured child is a second worker on the same host
+        first_worker = QuestionBank.load(path, use_mmap=True)
+        for i in range(len(first_worker)):
+            first_worker[i]
+
+        for mode, label in [('dicts', 'Python dicts (before)'), ('columnar', 'Columnar, read into memory'), ('mmap', 'Columnar, memory-mapped')]:
+            output = subprocess.run([sys.executable, __file__, '--measure', path, mode], capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            print(f"{label:30} RSS +{result['rss_mb']:6.1f} MB   private +{result['private_mb']:6.1f} MB")
+
+    print("\nPrivate memory is what each additional worker costs; memory-mapped pages are")
+    print("file-backed and shared with the worker that is already running.")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        run_benchmark()
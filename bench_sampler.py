@@ -0,0 +1,70 @@
+import time
+import random
+from array import array
+
+from bench_question_bank import synthetic_dataset
+
+POOL_SIZES = [100, 1000, 5000, 20000]
+COUNT = 12
+# Share of the pool the simulated student has already been served
+SEEN_FRACTIONS = [0.0, 0.9]
+
+def retry_loop_sample(ai, valid_questions, count):
+    """The sampling loop _get_dataset_questions used before (quadratic in the pool size)"""
+    questions = []
+    attempts = 0
+    max_attempts = len(valid_questions) if valid_questions else 0
+    while len(questions) < count and attempts < max_attempts:
+        remaining_questions = [q for q in valid_questions if q not in [item['_source'] for item in questions if '_source' in item]]
+        if not remaining_questions:
+            remaining_questions = valid_questions
+        item = random.choice(remaining_questions)
+        attempts += 1
+        questions.append({**ai._serve_question(item), '_source': item})
+    for q in questions:
+        q.pop('_source', None)
+    return questions[:count]
+
+def index_sample(ai, bank, pool, count, seen):
+    """The current sampler, as _get_dataset_questions uses it: unseen unique indices first"""
+    from question_bank import sample_unseen
+    return [ai._serve_question(bank[i]) for i in sample_unseen(pool, count, seen)]
+
+def seen_questions(bank, pool, fraction):
+    """A student's SeenQuestions covering `fraction` of the pool"""
+    from question_bank import SeenQuestions
+    seen = SeenQuestions(bank)
+    for i in random.sample(pool, int(len(pool) * fraction)):
+        seen.add(i)
+    return seen
+
+def _time_ms(call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def run_benchmark():
+    print("=== QUESTION SAMPLER BENCHMARK ===\n")
+    from question_bank import QuestionBank
+    from ai_content import AIContentGenerator
+
+    bank = QuestionBank.from_raw(synthetic_dataset(max(POOL_SIZES)))
+    ai = AIContentGenerator.__new__(AIContentGenerator)  # only the sampling helpers are needed
+    print(f"Sampling {COUNT} questions per call from a {len(bank)}-question synthetic bank\n")
+    print(f"{'pool':>8} {'seen':>6} {'retry loop':>14} {'sample_unseen':>14} {'speedup':>10}")
+
+    for size in POOL_SIZES:
+        # Pools are index arrays, like the bank's level and category index returns
+        pool = array('I', range(size))
+        # The old loop filtered a list of question dicts built for every call
+        questions = [bank[i] for i in pool]
+        old_ms = _time_ms(lambda: retry_loop_sample(ai, questions, COUNT), 3 if size > 1000 else 20)
+        for fraction in SEEN_FRACTIONS:
+            seen = seen_questions(bank, pool, fraction)
+            new_ms = _time_ms(lambda: index_sample(ai, bank, pool, COUNT, seen), 2000)
+            assert len(index_sample(ai, bank, pool, COUNT, seen)) == COUNT
+            print(f"{size:>8} {fraction:>6.0%} {old_ms:>11.3f} ms {new_ms:>11.3f} ms {old_ms / new_ms:>9.0f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,7 +1,12 @@
 import os
 from dotenv import load_dotenv
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from airtable_db import AirtableDB
+from storage import create_db, STORAGE_BACKEND
+from ai_content import get_content_generator
+from session_store import SessionStore
+from write_queue import UserWriteQueue
+from answer_ledger import AnswerLedger
+from start_bot import CONCURRENT_UPDATES, post_init, shutdown
 
 # Import handlers
 from handlers.start import start
@@ -17,13 +22,16 @@ load_dotenv()
 
 def main():
     token = os.getenv('BOT_TOKEN')
-    app = Application.builder().token(token).build()
+    app = Application.builder().token(token).concurrent_updates(CONCURRENT_UPDATES).post_init(post_init).post_shutdown(shutdown).build()
     
     # Initialize bot data
-    app.bot_data['db'] = AirtableDB()
-    app.bot_data['user_sessions'] = {}
+    app.bot_data['db'] = create_db()
+    app.bot_data['user_sessions'] = SessionStore()
     app.bot_data['processing'] = set()
-    print("Bot initialized with Airtable database")
+    app.bot_data['write_queue'] = UserWriteQueue()
+    app.bot_data['answer_ledger'] = AnswerLedger()
+    app.bot_data['ai'] = get_content_generator()
+    print(f"Bot initialized with {STORAGE_BACKEND} database")
     
     # Command handlers
     app.add_handler(CommandHandler('start', start))
@@ -0,0 +1,121 @@
+import re
+import json
+import asyncio
+import inspect
+import itertools
+import httpx
+import pytest
+
+def pytest_pyfunc_call(pyfuncitem):
+    """Run `async def test_*` functions in a fresh event loop, like the bot's scripts do"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    names = pyfuncitem._fixtureinfo.argnames
+    asyncio.run(pyfuncitem.obj(**{name: pyfuncitem.funcargs[name] for name in names}))
+    return True
+
+FORMULA_TERM = re.compile(r"""\{([^}]+)\}\s*=\s*(?:"([^"]*)"|'([^']*)'|([\d.]+))""")
+
+class FakeAirtable:
+    """Airtable's REST API over in-memory tables, for an httpx.MockTransport.
+
+    Understands the requests AirtableDB sends: filterByFormula made of {Field}=value terms,
+    pagination, single and batched creates and updates, PUT and performUpsert. fail() queues
+    status codes or exceptions for the next requests; requests logs (method, table, record ID)
+    and every answer takes `latency` seconds.
+    """
+
+    def __init__(self, tables):
+        self.table_names = {table_id: name for name, table_id in tables.items()}
+        self.records = {name: {} for name in tables}  # table -> record ID -> fields
+        self.requests = []
+        self.page_size = 100
+        self.latency = 0
+        self._failures = []
+        self._ids = itertools.count(1)
+
+    def add(self, table, fields):
+        record_id = f"rec{next(self._ids):014d}"
+        self.records[table][record_id] = dict(fields)
+        return {'id': record_id, 'fields': dict(fields)}
+
+    def fail(self, *outcomes):
+        """Answer the next requests with these status codes or responses, or raise these exceptions"""
+        self._failures.extend(outcomes)
+
+    async def handle(self, request):
+        parts = request.url.path.split('/')[3:]
+        table = self.table_names[parts[0]]
+        record_id = parts[1] if len(parts) > 1 else None
+        self.requests.append((request.method, table, record_id))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self._failures:
+            outcome = self._failures.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            if isinstance(outcome, httpx.Response):
+                return outcome
+            return httpx.Response(outcome, json={'error': {'type': 'INJECTED', 'message': str(outcome)}})
+
+        body = json.loads(request.content) if request.content else {}
+        if request.method == 'GET':
+            return self._get(table, record_id, request.url.params)
+        if request.method == 'POST':
+            if 'records' in body:
+                return httpx.Response(200, json={'records': [self.add(table, r['fields']) for r in body['records']]})
+            return httpx.Response(200, json=self.add(table, body['fields']))
+        replace = request.method == 'PUT'
+        if record_id:
+            return self._update(table, record_id, body['fields'], replace)
+        merge_on = body.get('performUpsert', {}).get('fieldsToMergeOn')
+        records = []
+        for record in body['records']:
+            if merge_on:
+                match = [rid for rid, fields in self.records[table].items()
+                         if all(fields.get(name) == record['fields'].get(name) for name in merge_on)]
+                if not match:
+                    records.append(self.add(table, record['fields']))
+                    continue
+                record = {**record, 'id': match[0]}
+            response = self._update(table, record['id'], record['fields'], replace)
+            if response.status_code != 200:
+                return response
+            records.append(response.json())
+        return httpx.Response(200, json={'records': records})
+
+    def _get(self, table, record_id, params):
+        if record_id:
+            if record_id not in self.records[table]:
+                return httpx.Response(404, json={'error': 'NOT_FOUND'})
+            return httpx.Response(200, json={'id': record_id, 'fields': self.records[table][record_id]})
+        terms = [(m.group(1), next(value for value in m.groups()[1:] if value is not None))
+                 for m in FORMULA_TERM.finditer(params.get('filterByFormula', ''))]
+        matches = [{'id': rid, 'fields': dict(fields)} for rid, fields in self.records[table].items()
+                   if all(str(fields.get(name, '')) == value for name, value in terms)]
+        start = int(params.get('offset', 0))
+        page = {'records': matches[start:start + self.page_size]}
+        if start + self.page_size < len(matches):
+            page['offset'] = str(start + self.page_size)
+        return httpx.Response(200, json=page)
+
+    def _update(self, table, record_id, fields, replace):
+        if record_id not in self.records[table]:
+            return httpx.Response(404, json={'error': 'NOT_FOUND'})
+        stored = self.records[table][record_id]
+        if replace:
+            stored.clear()
+        stored.update(fields)
+        return httpx.Response(200, json={'id': record_id, 'fields': dict(stored)})
+
+@pytest.fixture
+def airtable():
+    """(AirtableDB, FakeAirtable) with the client pointed at the fake and no rate limit in the way"""
+    from airtable_db import AirtableDB
+    from rate_limiter import RateLimiter
+    db = AirtableDB()
+    fake = FakeAirtable(db.tables)
+    db.rate_limiter = RateLimiter(rate=1000, burst=1000)
+    db._client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle), base_url=f'https://api.airtable.com/v0/{db.base_id}')
+    return db, fake
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTENT_PACK_PATH = os.getenv('CONTENT_PACK_PATH', 'content_pack.json')
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Room left for the "📚 Day N: Topic" header sent in the same message
+THEORY_MAX_CHARS = TELEGRAM_MESSAGE_LIMIT - 100
+# Attempts per lesson when the model fails or writes too much
+BUILD_ATTEMPTS = 3
+# Seconds before the first retry of a lesson; doubled for each later one
+BUILD_RETRY_DELAY = 5.0
+
+def load_content_pack(path=None):
+    """Theory lessons from a built content pack keyed by theory_key(), or {} if there is none
+    or it was built for another theory prompt"""
+    path = path or CONTENT_PACK_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            pack = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not read content pack {path}: {e}")
+        return {}
+
+    from ai_content import THEORY_PROMPT_VERSION
+    if pack.get('prompt_version') != THEORY_PROMPT_VERSION:
+        print(f"[ERROR] Content pack {path} was built for theory prompt v{pack.get('prompt_version')} (current v{THEORY_PROMPT_VERSION}), not loaded; rebuild it with python content_pack.py")
+        return {}
+    theory = pack.get('theory', {})
+    print(f"[OK] Content pack {pack.get('version')} loaded: {len(theory)} lessons")
+    return theory
+
+async def _build_lesson(ai, slots, topic, language, level):
+    for attempt in range(1, BUILD_ATTEMPTS + 1):
+        if attempt > 1:
+            await asyncio.sleep(BUILD_RETRY_DELAY * 2 ** (attempt - 2))
+        try:
+            # Never more callers than the gateway has slots, so none are rejected as saturated
+            async with slots:
+                text = await ai.write_theory(topic, language, level)
+        except Exception as e:
+            print(f"  {topic}/{language}/{level}: attempt {attempt} failed: {e}")
+            continue
+        if not text.strip():
+            print(f"  {topic}/{language}/{level}: attempt {attempt} returned nothing")
+        elif len(text) > THEORY_MAX_CHARS:
+            print(f"  {topic}/{language}/{level}: attempt {attempt} too long ({len(text)} > {THEORY_MAX_CHARS} chars)")
+        else:
+            return text
+    return None
+
+def lesson_topics(categories=()):
+    """Every topic a daily lesson can teach: the curriculum, then the dataset categories that
+    the diagnostic reports as weak topics for days 1-3"""
+    from ai_content import CURRICULUM_TOPICS
+    from question_bank import LEVEL_CATEGORIES
+    topics = list(CURRICULUM_TOPICS)
+    known = {topic.lower() for topic in topics}
+    for category in sorted({*categories, *(c for level in LEVEL_CATEGORIES.values() for c in level)}):
+        if category.lower() not in known:
+            topics.append(category)
+            known.add(category.lower())
+    return topics
+
+async def build_content_pack(path=None, version=None):
+    """Generate, clean and validate theory for every lesson topic, language and level.
+
+    The pack is written only if every lesson passed; returns True on success.
+    """
+    from ai_content import get_content_generator, THEORY_PROMPT_VERSION, LEVELS
+    from theory_cache import theory_key
+    from llm_gateway import LLM_MAX_CONCURRENCY
+
+    path = path or CONTENT_PACK_PATH
+    version = version or datetime.now().strftime('%Y%m%d%H%M%S')
+    ai = get_content_generator()
+    topics = lesson_topics(ai.full_dataset.categories if ai.full_dataset else ())
+    keys = [(topic, language, level) for topic in topics for language in ('en', 'uz') for level in LEVELS]
+
+    print(f"Building content pack {version}: {len(keys)} lessons")
+    slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    lessons = await asyncio.gather(*(_build_lesson(ai, slots, *key) for key in keys))
+    missing = [key for key, text in zip(keys, lessons) if text is None]
+    if missing:
+        print(f"[ERROR] {len(missing)} lessons failed, content pack not written:")
+        for topic, language, level in missing:
+            print(f"  {topic}/{language}/{level}")
+        return False
+
+    pack = {
+        'version': version,
+        'prompt_version': THEORY_PROMPT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'theory': {theory_key(*key): text for key, text in zip(keys, lessons)}
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pack, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    print(f"[OK] Content pack {version} written to {path}: {len(lessons)} lessons, longest {max(map(len, lessons))} chars")
+    return True
+
+if __name__ == "__main__":
+    # Usage: python content_pack.py [output_path] [version]
+    ok = asyncio.run(build_content_pack(*sys.argv[1:3]))
+    sys.exit(0 if ok else 1)
@@ -1,3 +1,4 @@
+import asyncio
 import requests
 import os
 from dotenv import load_dotenv
@@ -12,18 +13,22 @@ response = requests.post(webhook_url)
 print(f"Webhook cleared: {response.json()}")
 
 # Check user status
-db = AirtableDB()
-user_id = "2067281193"  # Moha's user ID from conversation
+async def main():
+    db = AirtableDB()
+    user_id = "2067281193"  # Moha's user ID from conversation
 
-user = db.get_user(user_id)
-if user:
-    user_data = user.get('fields', {})
-    print(f"\nUser Status:")
-    print(f"Learning Status: {user_data.get('Learning Status', 'N/A')}")
-    print(f"Current Day: {user_data.get('Current Day', 'N/A')}")
-    print(f"Language: {user_data.get('Language', 'N/A')}")
-    print(f"Active Lesson ID: {user_data.get('Active Lesson ID', 'N/A')}")
-    print(f"Mode: {user_data.get('Mode', 'N/A')}")
-    print(f"Expected: {user_data.get('Expected', 'N/A')}")
-else:
-    print("User not found")
\ No newline at end of file
+    user = await db.get_user(user_id)
+    if user:
+        user_data = user.get('fields', {})
+        print(f"\nUser Status:")
+        print(f"Learning Status: {user_data.get('Learning Status', 'N/A')}")
+        print(f"Current Day: {user_data.get('Current Day', 'N/A')}")
+        print(f"Language: {user_data.get('Language', 'N/A')}")
+        print(f"Active Lesson ID: {user_data.get('Active Lesson ID', 'N/A')}")
+        print(f"Mode: {user_data.get('Mode', 'N/A')}")
+        print(f"Expected: {user_data.get('Expected', 'N/A')}")
+    else:
+        print("User not found")
+    await db.close()
+
+asyncio.run(main())
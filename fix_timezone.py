@@ -1,20 +1,25 @@
+import asyncio
 from airtable_db import AirtableDB
 
-db = AirtableDB()
-user_id = "2067281193"
+async def main():
+    db = AirtableDB()
+    user_id = "2067281193"
 
-user = db.get_user(user_id)
-if user:
-    # Update timezone to the time user set earlier
-    result = db.update_user(user['id'], {
-        'Timezone': '12:00',  # Set to the time user mentioned earlier
-        'Mode': 'idle',
-        'Expected': 'none'
-    })
+    user = await db.get_user(user_id)
+    if user:
+        # Update timezone to the time user set earlier
+        result = await db.update_user(user['id'], {
+            'Timezone': '12:00',  # Set to the time user mentioned earlier
+            'Mode': 'idle',
+            'Expected': 'none'
+        })
     
-    if result:
-        print("Timezone updated successfully to 12:00")
+        if result:
+            print("Timezone updated successfully to 12:00")
+        else:
+            print("Failed to update timezone")
     else:
-        print("Failed to update timezone")
-else:
-    print("User not found")
\ No newline at end of file
+        print("User not found")
+    await db.close()
+
+asyncio.run(main())
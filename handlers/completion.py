@@ -7,7 +7,7 @@ async def handle_program_completion(update: Update, context: ContextTypes.DEFAUL
     db = context.bot_data['db']
     user_id = update.effective_user.id
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if not user:
         return
     
@@ -81,7 +81,7 @@ async def handle_extra_practice(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if not user:
         return
@@ -120,7 +120,7 @@ async def handle_view_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if not user:
         return
@@ -128,18 +128,8 @@ async def handle_view_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = user.get('fields', {})
     lang = user_data.get('Language', 'en')
     
-    # Get detailed stats from database
-    import requests
-    
     # Get all learning records
-    learning_filter = f"{{User ID}}='{user_id}'"
-    response = requests.get(
-        f"https://api.airtable.com/v0/{db.base_id}/tblInFtIh5fZt59g4",
-        headers=db.headers,
-        params={'filterByFormula': learning_filter}
-    )
-    
-    learning_records = response.json().get('records', []) if response.status_code == 200 else []
+    learning_records = await db.get_learning_records(user_id) or []
     
     # Calculate stats
     total_lessons = len(learning_records)
@@ -191,7 +181,7 @@ async def handle_restart_program(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if not user:
         return
@@ -222,11 +212,11 @@ async def handle_confirm_restart(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if user:
         # Reset user progress
-        db.update_user(user['id'], {
+        await db.update_user(user['id'], {
             'Learning Status': 'Test Completed',
             'Current Day': '1',
             'Lessons Completed': '0',
@@ -1,23 +1,20 @@
+import time
 import asyncio
-import requests
-import openai
-import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime
+from llm_gateway import get_llm_gateway
+from ai_content import CURRICULUM_TOPICS
+from progressive_message import ProgressiveMessage
 
-async def resume_lesson(message, user_id, lesson_record_id, user_sessions, db, lang):
+async def resume_lesson(message, user_id, lesson_record_id, user_sessions, db, lang, ai):
     """Resume incomplete lesson from database"""
     try:
-        response = requests.get(
-            f"https://api.airtable.com/v0/{db.base_id}/tblInFtIh5fZt59g4/{lesson_record_id}",
-            headers=db.headers
-        )
-        
-        if response.status_code != 200:
+        record = await db.get_learning_record(lesson_record_id)
+        if not record:
             return False
         
-        lesson = response.json().get('fields', {})
+        lesson = record.get('fields', {})
         
         if lesson.get('Lesson Status') == 'Completed':
             return False
@@ -27,17 +24,7 @@ async def resume_lesson(message, user_id, lesson_record_id, user_sessions, db, l
         current_task_index = int(lesson.get('Current Task Index', '1'))
         
         # Get quiz session to retrieve questions
-        quiz_filter = f"AND({{User ID}}='{user_id}', {{Lesson Day}}={day})"
-        quiz_response = requests.get(
-            f"https://api.airtable.com/v0/{db.base_id}/tblQuizzes",
-            headers=db.headers,
-            params={'filterByFormula': quiz_filter}
-        )
-        
-        if quiz_response.status_code != 200:
-            return False
-        
-        quiz_records = quiz_response.json().get('records', [])
+        quiz_records = await db.get_lesson_quiz_records(user_id, day)
         if not quiz_records:
             return False
         
@@ -80,13 +67,14 @@ async def resume_lesson(message, user_id, lesson_record_id, user_sessions, db, l
             'current_task': current_task_index - 1,
             'answers': answers,
             'lang': lang,
-            'practice_session_id': practice_session_id
+            'practice_session_id': practice_session_id,
+            'quiz_record_ids': db.quiz_record_ids(quiz_records)
         }
         
         resume_msg = f"🔄 Resuming Day {day}: {topic}\n\nYou were on Task {current_task_index}/5" if lang == 'en' else f"🔄 {day}-kun davom ettirilmoqda: {topic}\n\nSiz {current_task_index}/5 topshiriqda edingiz"
         await message.reply_text(resume_msg)
         
-        await show_task(message, user_id, user_sessions)
+        await show_task(message, user_id, user_sessions, db, ai)
         return True
         
     except Exception as e:
@@ -99,12 +87,16 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_sessions = context.bot_data['user_sessions']
     user_id = update.effective_user.id
     
-    # Prevent duplicate lesson generation
+    # Prevent duplicate lesson generation; show the lesson or quiz under way instead
     if user_id in user_sessions:
-        print(f"User {user_id} already has active session, skipping")
-        return
+        from handlers.resume import reshow_session
+        if await reshow_session(update, context):
+            return
+        # Nothing to show (a reminder-time prompt, a finished quiz): start the lesson afresh
+        print(f"User {user_id} has a session with nothing to resume, starting a new lesson")
+        user_sessions.pop(user_id, None)
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if not user:
         await update.message.reply_text("Please /start first.")
@@ -138,7 +130,7 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
     active_lesson_id = user_data.get('Active Lesson ID', '')
     if active_lesson_id:
         print(f"Found incomplete lesson: {active_lesson_id}")
-        resumed = await resume_lesson(update.message, user_id, active_lesson_id, user_sessions, db, lang)
+        resumed = await resume_lesson(update.message, user_id, active_lesson_id, user_sessions, db, lang, context.bot_data['ai'])
         if resumed:
             return
     
@@ -154,26 +146,49 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
     
     weak_topics = user_data.get('Weak Topics', '').split(', ') if user_data.get('Weak Topics') else []
     
-    all_topics = weak_topics + ['Algebra', 'Geometry', 'Arithmetic', 'Percentages', 'Fractions', 'Ratios', 'Equations', 'Inequalities', 'Functions', 'Graphs', 'Probability', 'Statistics', 'Number Theory', 'Combinatorics']
+    all_topics = weak_topics + list(CURRICULUM_TOPICS)
     topic = all_topics[current_day - 1] if current_day <= len(all_topics) else 'Review'
     
-    # Show current level in generation message
     current_level = user_data.get('Level', 'Beginner')
     
-    # Send initial waiting message
-    wait_msg = f"⏳ Please wait...\n\nGenerating Day {current_day} lesson: {topic} ({current_level} level)\n\nThis may take a moment..." if lang == 'en' else f"⏳ Iltimos kuting...\n\n{current_day}-kun darsi tayyorlanmoqda: {topic} ({current_level} daraja)\n\nBir oz vaqt ketishi mumkin..."
-    await update.message.reply_text(wait_msg)
-    
-    from ai_content import AIContentGenerator
-    ai = AIContentGenerator()
+    ai = context.bot_data['ai']
+    started = time.perf_counter()
+    timings = {}
+    
+    async def timed(stage, coro):
+        stage_started = time.perf_counter()
+        result = await coro
+        timings[stage] = time.perf_counter() - stage_started
+        return result
+    
+    # Send full theory content (Telegram supports up to 4096 characters) first. A lesson that
+    # has to be written is streamed into its message while the questions are sampled and persisted
+    header = f"📚 Day {current_day}: {topic}" if lang == 'en' else f"📚 {current_day}-kun: {topic}"
+    theory = ai.ready_theory(topic, lang, level=current_level)
+    theory_task = None
+    handed_off = False
+    if theory:
+        stream = None
+        await update.message.reply_text(f"{header}\n\n{theory}", parse_mode=None)
+    else:
+        writing = f"✍️ Writing your {current_level} lesson..." if lang == 'en' else f"✍️ {current_level} darajadagi dars yozilmoqda..."
+        stream = ProgressiveMessage(await update.message.reply_text(f"{header}\n\n{writing}", parse_mode=None), header, ai._clean_text)
+        
+        async def write_theory():
+            stage_started = time.perf_counter()
+            theory = await ai.write_lesson_theory(topic, lang, level=current_level, on_progress=stream.update)
+            timings['theory'] = time.perf_counter() - stage_started
+            return theory
+        
+        theory_task = asyncio.ensure_future(write_theory())
     
     try:
         user_level = user_data.get('Level', 'Beginner')
         
-        # Generate theory using AI and dataset
-        theory = ai.generate_theory_explanation(topic, lang)
-        
-        questions = ai.generate_practice_questions(topic, lang, count=5, user_level=user_level)
+        stage_started = time.perf_counter()
+        seen = user_sessions.load_seen(user_id, ai.full_dataset)
+        questions = ai.generate_practice_questions(topic, lang, count=5, user_level=user_level, seen=seen)
+        timings['questions'] = time.perf_counter() - stage_started
         
         # Validate questions before proceeding
         if not questions:
@@ -195,19 +210,11 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
         
         tasks = [f"{q['text']}\nA) {q['options'][0]}\nB) {q['options'][1]}\nC) {q['options'][2]}\nD) {q['options'][3]}" for q in questions]
         
-        # Save practice questions to Quizzes table AFTER validation
-        practice_session_id = db.create_quiz_session(user_id, questions, lesson_day=current_day)
-        
-        if not practice_session_id:
-            await update.message.reply_text("Error: Could not create quiz session. Please try again.")
-            return
-        
         lesson_data = {
             "fields": {
                 "User ID": str(user_id),
                 "Day": str(current_day),
                 "Topic": topic,
-                "Theory Summary": theory[:2000],
                 "Task 1": tasks[0][:1000] if len(tasks) > 0 else "",
                 "Task 2": tasks[1][:1000] if len(tasks) > 1 else "",
                 "Task 3": tasks[2][:1000] if len(tasks) > 2 else "",
@@ -223,18 +230,21 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
         # Set lesson ID
         lesson_data["fields"]["Lesson ID"] = f"lesson_day{current_day}_user{user_id}_{topic.lower()}"
         
-        response = requests.post(
-            f"https://api.airtable.com/v0/{db.base_id}/tblInFtIh5fZt59g4",
-            headers=db.headers,
-            json=lesson_data
-        )
+        # Save practice questions to Quizzes table AFTER validation, alongside the lesson record;
+        # the theory summary is added to the lesson record once it is written
+        (practice_session_id, quiz_record_ids), lesson_record_id = await timed('persist', asyncio.gather(
+            db.create_quiz_session(user_id, questions, lesson_day=current_day),
+            db.create_lesson_record(lesson_data["fields"])
+        ))
         
-        created_record = response.json()
-        lesson_record_id = created_record.get('id')
+        if not practice_session_id:
+            await update.message.reply_text("Error: Could not create quiz session. Please try again.")
+            return
+        user_sessions.save_seen(user_id, seen)
         
         # Update Users table with Active Lesson ID
         if user:
-            db.update_user(user['id'], {
+            await db.update_user(user['id'], {
                 'Active Lesson ID': lesson_record_id,
                 'Mode': 'lesson_task',
                 'Expected': 'lesson_task'
@@ -248,20 +258,41 @@ async def daily_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYP
             'current_task': 0,
             'answers': [],
             'lang': lang,
-            'practice_session_id': practice_session_id
+            'practice_session_id': practice_session_id,
+            'quiz_record_ids': quiz_record_ids
         }
         
-        # Send full theory content (Telegram supports up to 4096 characters)
-        theory_msg = f"📚 Day {current_day}: {topic}\n\n{theory}" if lang == 'en' else f"📚 {current_day}-kun: {topic}\n\n{theory}"
-        await update.message.reply_text(theory_msg, parse_mode=None)
-        
-        await show_task(update.message, user_id, user_sessions)
+        await show_task(update.message, user_id, user_sessions, db, ai)
+        timings['first_task'] = time.perf_counter() - started
+        
+        async def finish_theory(theory):
+            try:
+                if stream is not None:
+                    theory = await theory_task
+                    await stream.finish(theory)
+                    if stream.first_edit_at is not None:
+                        timings['first_text'] = stream.first_edit_at - started
+                await db.update_learning_record(lesson_record_id, {"Theory Summary": theory[:2000]})
+            except Exception as e:
+                print(f"Error finishing lesson theory: {e}")
+            timings['total'] = time.perf_counter() - started
+            print(f"[INFO] Day {current_day} lesson for user {user_id}: " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+        
+        # The student can answer the first task while the rest of the theory streams in
+        context.application.create_task(finish_theory(theory))
+        handed_off = True
         
     except Exception as e:
         print(f"Error generating lesson: {e}")
         await update.message.reply_text(f"Error: {str(e)}")
+    finally:
+        # An abandoned lesson must not keep streaming into its message or hold a gateway slot
+        if theory_task is not None and not handed_off:
+            # Another student may still be sharing the generation, so stop the edits here too
+            stream.close()
+            theory_task.cancel()
 
-async def show_task(message, user_id, user_sessions):
+async def show_task(message, user_id, user_sessions, db, ai):
     session = user_sessions.get(user_id)
     if not session:
         return
@@ -271,9 +302,7 @@ async def show_task(message, user_id, user_sessions):
     lang = session.get('lang', 'en')
     
     if current_task >= len(questions):
-        from airtable_db import AirtableDB
-        db = AirtableDB()
-        await complete_lesson(message, user_id, user_sessions, db)
+        await complete_lesson(message, user_id, user_sessions, db, ai)
         return
     
     question = questions[current_task]
@@ -297,85 +326,90 @@ async def handle_task_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     answer = parts[2]
     user_id = int(parts[3])
     
-    session = user_sessions.get(user_id)
-    if not session:
+    # One answer at a time per user, now that updates are handled concurrently
+    processing = context.bot_data['processing']
+    key = f"task_ans_{user_id}"
+    if key in processing:
         return
+    processing.add(key)
     
-    current_task = session['current_task']
-    question = session['questions'][current_task]
-    
-    # Disable buttons by editing message
-    task_num = current_task + 1
-    text = f"✍️ Task {task_num}/5:\n\n{question['text']}\n\nA) {question['options'][0]}\nB) {question['options'][1]}\nC) {question['options'][2]}\nD) {question['options'][3]}\n\n✅ Your answer: {answer}"
     try:
-        await query.edit_message_text(text)
-    except:
-        pass
-    is_correct = answer == question['correct']
-    
-    session['answers'].append({
-        'answer': answer,
-        'correct': question['correct'],
-        'is_correct': is_correct,
-        'question': question['text']
-    })
-    
-    # Update Quizzes table
-    practice_session_id = session.get('practice_session_id', f"quiz_{user_id}_{session['day']}")
-    quiz_id = f"{practice_session_id}_q{current_task + 1}"
-    is_last = (current_task + 1) >= len(session['questions'])
-    correct_option_text = question['options'][ord(question['correct']) - ord('A')] if question['correct'] in ['A', 'B', 'C', 'D'] else ""
-    feedback_text = f"Correct: {question['correct']}) {correct_option_text}" if not is_correct else "Correct!"
-    db.update_quiz_answer(quiz_id, answer, 1 if is_correct else 0, feedback_text, is_last)
-    
-    task_num = current_task + 1
-    task_field = f"Task {task_num} Answer"
+        session = user_sessions.get(user_id)
+        if not session:
+            return
     
-    record_id = session.get('lesson_record_id')
-    if record_id:
-        update_data = {
-            "fields": {
+        current_task = session['current_task']
+        question = session['questions'][current_task]
+    
+        # Disable buttons by editing message
+        task_num = current_task + 1
+        text = f"✍️ Task {task_num}/5:\n\n{question['text']}\n\nA) {question['options'][0]}\nB) {question['options'][1]}\nC) {question['options'][2]}\nD) {question['options'][3]}\n\n✅ Your answer: {answer}"
+        try:
+            await query.edit_message_text(text)
+        except:
+            pass
+        is_correct = answer == question['correct']
+    
+        session['answers'].append({
+            'answer': answer,
+            'correct': question['correct'],
+            'is_correct': is_correct,
+            'question': question['text']
+        })
+    
+        # Update Quizzes table
+        practice_session_id = session.get('practice_session_id', f"quiz_{user_id}_{session['day']}")
+        quiz_id = f"{practice_session_id}_q{current_task + 1}"
+        is_last = (current_task + 1) >= len(session['questions'])
+        correct_option_text = question['options'][ord(question['correct']) - ord('A')] if question['correct'] in ['A', 'B', 'C', 'D'] else ""
+        feedback_text = f"Correct: {question['correct']}) {correct_option_text}" if not is_correct else "Correct!"
+        quiz_record_id = session.get('quiz_record_ids', {}).get(current_task + 1)
+        # Written in the background, in order, so the reply below does not wait on storage
+        write_queue = context.bot_data['write_queue']
+        write_queue.submit(user_id, 'quiz answer', db.update_quiz_answer,
+                           quiz_id, answer, 1 if is_correct else 0, feedback_text, is_last, record_id=quiz_record_id)
+    
+        task_num = current_task + 1
+        task_field = f"Task {task_num} Answer"
+    
+        record_id = session.get('lesson_record_id')
+        if record_id:
+            write_queue.submit(user_id, 'lesson progress', db.update_learning_record, record_id, {
                 task_field: answer,
                 "Current Task Index": str(task_num + 1),
                 "Expected Task": f"task_{task_num + 1}"
-            }
-        }
-        
-        requests.patch(
-            f"https://api.airtable.com/v0/{db.base_id}/tblInFtIh5fZt59g4/{record_id}",
-            headers=db.headers,
-            json=update_data
-        )
+            })
     
-    if is_correct:
-        feedback = "✅ Correct!" if session.get('lang') == 'en' else "✅ To'g'ri!"
-        await query.message.reply_text(feedback)
-    else:
-        correct_option = question['options'][ord(question['correct']) - ord('A')] if question['correct'] in ['A', 'B', 'C', 'D'] else ""
-        feedback = f"❌ Wrong!\n\n✅ Correct answer: {question['correct']}) {correct_option}" if session.get('lang') == 'en' else f"❌ Noto'g'ri!\n\n✅ To'g'ri javob: {question['correct']}) {correct_option}"
-        await query.message.reply_text(feedback)
-    
-    session['current_task'] += 1
-    
-    print(f"Task completed. Current task now: {session['current_task']}/{len(session['questions'])}")
-    
-    # Check if this was the last task
-    if session['current_task'] >= len(session['questions']):
-        print("ALL TASKS COMPLETED! Calling complete_lesson...")
-        # Show waiting message
-        lang = session.get('lang', 'en')
-        wait_msg = "⏳ Analyzing your answers..." if lang == 'en' else "⏳ Javoblaringiz tahlil qilinmoqda..."
-        await query.message.reply_text(wait_msg)
-        await asyncio.sleep(0.5)
-        from airtable_db import AirtableDB
-        db = AirtableDB()
-        await complete_lesson(query.message, user_id, user_sessions, db)
-    else:
-        print(f"Showing next task: {session['current_task'] + 1}")
-        await asyncio.sleep(0.5)
-        await show_task(query.message, user_id, user_sessions)
+        if is_correct:
+            feedback = "✅ Correct!" if session.get('lang') == 'en' else "✅ To'g'ri!"
+            await query.message.reply_text(feedback)
+        else:
+            correct_option = question['options'][ord(question['correct']) - ord('A')] if question['correct'] in ['A', 'B', 'C', 'D'] else ""
+            feedback = f"❌ Wrong!\n\n✅ Correct answer: {question['correct']}) {correct_option}" if session.get('lang') == 'en' else f"❌ Noto'g'ri!\n\n✅ To'g'ri javob: {question['correct']}) {correct_option}"
+            await query.message.reply_text(feedback)
+    
+        session['current_task'] += 1
+        user_sessions.save(user_id)
+    
+        print(f"Task completed. Current task now: {session['current_task']}/{len(session['questions'])}")
+    
+        # Check if this was the last task
+        if session['current_task'] >= len(session['questions']):
+            print("ALL TASKS COMPLETED! Calling complete_lesson...")
+            # Show waiting message
+            lang = session.get('lang', 'en')
+            wait_msg = "⏳ Analyzing your answers..." if lang == 'en' else "⏳ Javoblaringiz tahlil qilinmoqda..."
+            await query.message.reply_text(wait_msg)
+            # Scoring and level checks read the stored answers
+            await write_queue.flush(user_id)
+            await complete_lesson(query.message, user_id, user_sessions, db, context.bot_data['ai'])
+        else:
+            print(f"Showing next task: {session['current_task'] + 1}")
+            await show_task(query.message, user_id, user_sessions, db, context.bot_data['ai'])
+    finally:
+        processing.discard(key)
 
-async def complete_lesson(message, user_id, user_sessions, db):
+async def complete_lesson(message, user_id, user_sessions, db, ai):
     print(f"\n=== COMPLETE_LESSON CALLED for user {user_id} ===")
     session = user_sessions.get(user_id)
     if not session:
@@ -384,6 +418,8 @@ async def complete_lesson(message, user_id, user_sessions, db):
     
     # Don't pop session yet if it's not extra practice
     is_extra = session.get('is_extra_practice', False)
+    session['completed'] = True
+    user_sessions.save(user_id)
     print(f"Is extra practice: {is_extra}")
     
     answers = session['answers']
@@ -393,19 +429,10 @@ async def complete_lesson(message, user_id, user_sessions, db):
     lang = session.get('lang', 'en')
     
     # Generate personalized AI feedback
-    from ai_content import AIContentGenerator
-    ai = AIContentGenerator()
-    openai.api_key = os.getenv('OPENAI_API_KEY')
-    
     feedback_prompt = f"Student completed {session['topic']} lesson. Score: {correct}/{total} ({score:.0f}%). Provide motivational feedback and study tips in {'Uzbek' if lang == 'uz' else 'English'}. Keep concise."
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": feedback_prompt}],
-            max_tokens=300
-        )
-        ai_feedback = ai._clean_text(response.choices[0].message.content)
+        ai_feedback = ai._clean_text(await get_llm_gateway().chat(feedback_prompt, key=('feedback', feedback_prompt), max_tokens=300))
     except:
         if score >= 80:
             ai_feedback = "Excellent work! Keep it up!" if lang == 'en' else "Ajoyib! Davom eting!"
@@ -416,28 +443,20 @@ async def complete_lesson(message, user_id, user_sessions, db):
     
     record_id = session.get('lesson_record_id')
     if record_id:
-        update_data = {
-            "fields": {
-                "Lesson Status": "Completed",
-                "Lesson Score": str(correct),
-                "AI Feedback (Per Task)": ai_feedback[:1000],
-                "Lesson End Time": datetime.now().isoformat()
-            }
-        }
-        
-        requests.patch(
-            f"https://api.airtable.com/v0/{db.base_id}/tblInFtIh5fZt59g4/{record_id}",
-            headers=db.headers,
-            json=update_data
-        )
+        await db.update_learning_record(record_id, {
+            "Lesson Status": "Completed",
+            "Lesson Score": str(correct),
+            "AI Feedback (Per Task)": ai_feedback[:1000],
+            "Lesson End Time": datetime.now().isoformat()
+        })
     
     # Complete quiz session for practice questions
     if 'practice_session_id' in session:
-        db.complete_quiz_session(session['practice_session_id'], score)
+        await db.complete_quiz_session(session['practice_session_id'], score, session.get('quiz_record_ids'))
     
     # Only update lesson completion, NOT day progression (day moves forward when user clicks Next Day)
     if not is_extra:
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
             lessons_completed = int(user.get('fields', {}).get('Lessons Completed', '0') or 0) + 1
             
@@ -449,15 +468,15 @@ async def complete_lesson(message, user_id, user_sessions, db):
                 'Last Active': datetime.now().isoformat()
             }
             
-            db.update_user(user['id'], update_fields)
+            await db.update_user(user['id'], update_fields)
             
             # Check for level progression after lesson completion
             from level_progression import LevelProgression
             level_system = LevelProgression(db)
             
-            if level_system.should_level_up(user_id):
-                new_level = level_system.calculate_user_level(user_id)
-                level_system.level_up_user(user_id)
+            if await level_system.should_level_up(user_id):
+                new_level = await level_system.calculate_user_level(user_id)
+                await level_system.level_up_user(user_id)
                 
                 # Send level up message
                 level_up_msg = level_system.get_level_up_message(user_id, new_level, lang)
@@ -478,6 +497,11 @@ async def complete_lesson(message, user_id, user_sessions, db):
     
     # Always show buttons after completion (both main lesson and extra practice)
     print("Sending buttons")
+    await send_next_steps(message, user_id, lang)
+    print("Messages sent successfully!")
+
+async def send_next_steps(message, user_id, lang):
+    """Buttons offered once a lesson is completed"""
     more_btn = "📝 More Practice" if lang == 'en' else "📝 Ko'proq mashq"
     next_btn = "➡️ Next Day" if lang == 'en' else "➡️ Keyingi kun"
     remind_btn = "⏰ Remind Me Tomorrow" if lang == 'en' else "⏰ Ertaga eslatma"
@@ -489,9 +513,7 @@ async def complete_lesson(message, user_id, user_sessions, db):
     ]
     
     action_msg = "What's next?" if lang == 'en' else "Keyingi qadam?"
-    print(f"Keyboard created with {len(keyboard)} rows")
     await message.reply_text(action_msg, reply_markup=InlineKeyboardMarkup(keyboard))
-    print("Messages sent successfully!")
 
 async def daily_lesson_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -516,7 +538,7 @@ async def handle_more_practice(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     
     user_id = int(query.data.split('_')[2])
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     if not user:
         return
@@ -526,25 +548,26 @@ async def handle_more_practice(update: Update, context: ContextTypes.DEFAULT_TYP
     lang = user_data.get('Language', 'en')
     weak_topics = user_data.get('Weak Topics', '').split(', ') if user_data.get('Weak Topics') else []
     
-    all_topics = weak_topics + ['Algebra', 'Geometry', 'Arithmetic', 'Percentages', 'Fractions', 'Ratios', 'Equations', 'Inequalities', 'Functions', 'Graphs', 'Probability', 'Statistics', 'Number Theory', 'Combinatorics']
+    all_topics = weak_topics + list(CURRICULUM_TOPICS)
     topic = all_topics[current_day - 2] if current_day > 1 else all_topics[0]
     
     msg = "⏳ Generating more practice questions..." if lang == 'en' else "⏳ Ko'proq savollar tayyorlanmoqda..."
     await query.message.reply_text(msg)
     
-    from ai_content import AIContentGenerator
-    ai = AIContentGenerator()
+    ai = context.bot_data['ai']
     
     try:
         # Get user level for difficulty adaptation
         user_level = user_data.get('Level', 'Intermediate')
-        questions = ai.generate_practice_questions(topic, lang, count=5, user_level=user_level)
+        seen = user_sessions.load_seen(user_id, ai.full_dataset)
+        questions = ai.generate_practice_questions(topic, lang, count=5, user_level=user_level, seen=seen)
         
         if not questions or len(questions) < 5:
             await query.message.reply_text("Error generating questions. Please try again.")
             return
         
-        practice_session_id = db.create_quiz_session(user_id, questions, lesson_day=current_day-1)
+        practice_session_id, quiz_record_ids = await db.create_quiz_session(user_id, questions, lesson_day=current_day-1)
+        user_sessions.save_seen(user_id, seen)
         
         user_sessions[user_id] = {
             'day': current_day - 1,
@@ -554,10 +577,11 @@ async def handle_more_practice(update: Update, context: ContextTypes.DEFAULT_TYP
             'answers': [],
             'lang': lang,
             'practice_session_id': practice_session_id,
+            'quiz_record_ids': quiz_record_ids,
             'is_extra_practice': True
         }
         
-        await show_task(query.message, user_id, user_sessions)
+        await show_task(query.message, user_id, user_sessions, db, ai)
         
     except Exception as e:
         print(f"Error generating practice: {e}")
@@ -583,7 +607,7 @@ async def handle_next_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer()
         user_sessions.pop(user_id, None)
         
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
             lang = user.get('fields', {}).get('Language', 'en')
             current_day = int(user.get('fields', {}).get('Current Day', '1'))
@@ -605,7 +629,7 @@ async def handle_next_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 keyboard = [[InlineKeyboardButton("🎯 Take Final Test" if lang == 'en' else "🎯 Yakuniy Test", callback_data="final_test")]]
                 
-                db.update_user(user['id'], update_fields)
+                await db.update_user(user['id'], update_fields)
                 await query.message.reply_text(final_msg, reply_markup=InlineKeyboardMarkup(keyboard))
                 return
             elif current_day > 14:
@@ -615,7 +639,7 @@ async def handle_next_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.message.reply_text(final_msg, reply_markup=InlineKeyboardMarkup(keyboard))
                 return
             
-            db.update_user(user['id'], update_fields)
+            await db.update_user(user['id'], update_fields)
             
             msg = f"✅ Great! Ready for Day {next_day}?\n\nUse /daily_lesson anytime to start!" if lang == 'en' else f"✅ Ajoyib! {next_day}-kun uchun tayyormisiz?\n\nIstalgan vaqt /daily_lesson buyrug'ini yuboring!"
             await query.message.reply_text(msg)
@@ -631,12 +655,12 @@ async def handle_wait_reminder(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = int(query.data.split('_')[2])
     user_sessions.pop(user_id, None)
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
         lang = user.get('fields', {}).get('Language', 'en')
         reminder_time = user.get('fields', {}).get('Timezone', '')
         
-        db.update_user(user['id'], {'Last Active': datetime.now().isoformat()})
+        await db.update_user(user['id'], {'Last Active': datetime.now().isoformat()})
         
         if reminder_time:
             if lang == 'en':
@@ -649,6 +673,6 @@ async def handle_wait_reminder(update: Update, context: ContextTypes.DEFAULT_TYP
             else:
                 msg = "⏰ Ertaga qaysi vaqtda eslatma yuboray?\n\n24 soatlik formatda yuboring (masalan: 09:00 yoki 18:30)\n\n💡 Yoki /daily_lesson yuboring!"
             
-            db.update_user(user['id'], {'Mode': 'set_reminder_time', 'Expected': 'reminder_time'})
+            await db.update_user(user['id'], {'Mode': 'set_reminder_time', 'Expected': 'reminder_time'})
         
         await query.message.reply_text(msg)
@@ -1,4 +1,3 @@
-import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime
@@ -13,9 +12,20 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
     key = f"test_{user_id}"
     
     # Prevent duplicate processing
-    if key in processing or user_id in user_sessions:
+    if key in processing:
         await query.answer("Already processing...")
         return
+    if user_id in user_sessions:
+        # A test or lesson is under way, maybe restored after a restart: show where it stands
+        from handlers.resume import reshow_session
+        if await reshow_session(update, context):
+            try:
+                await query.answer()
+            except Exception:
+                pass
+            return
+        # Nothing to show (a reminder-time prompt, a finished quiz): start the test afresh
+        user_sessions.pop(user_id, None)
     
     try:
         await query.answer()
@@ -24,9 +34,9 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
     processing.add(key)
     
     try:
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
-            db.update_user(user['id'], {'Mode': 'quiz_answer', 'Expected': 'quiz_answer', 'Last Active': datetime.now().isoformat()})
+            await db.update_user(user['id'], {'Mode': 'quiz_answer', 'Expected': 'quiz_answer', 'Last Active': datetime.now().isoformat()})
             user_data = user.get('fields', {})
             level = user_data.get('Level', 'Beginner')
             lang = user_data.get('Language', 'en')
@@ -34,8 +44,8 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
             level = 'Beginner'
             lang = 'en'
         
-        from ai_content import AIContentGenerator
-        ai = AIContentGenerator()
+        ai = context.bot_data['ai']
+        seen = user_sessions.load_seen(user_id, ai.full_dataset)
         
         await query.message.reply_text("⏳ Generating questions... Please wait.")
         
@@ -54,7 +64,7 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 else:
                     adjusted_level = level
                 
-                questions = ai.generate_diagnostic_questions_structured(level=adjusted_level, language=lang, count=12)
+                questions = ai.generate_diagnostic_questions_structured(level=adjusted_level, language=lang, count=12, seen=seen)
                 print(f"AI generation attempt {attempt + 1} completed for {adjusted_level} level (target: {target_score})")
                 
                 # Validate we have exactly 12 questions
@@ -74,7 +84,7 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not questions or len(questions) != 12:
             print(f"Failed to generate exactly 12 questions after 3 attempts, using dataset directly")
             try:
-                questions = ai._get_dataset_questions(12, language=lang, level=level)
+                questions = ai._get_dataset_questions(12, language=lang, level=level, seen=seen)
                 if len(questions) != 12:
                     await query.message.reply_text("Unable to generate complete test. Please try again in a moment.")
                     processing.discard(key)
@@ -86,26 +96,28 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
         
         print(f"Successfully generated {len(questions)} questions for level {level} in {lang}")
+        user_sessions.save_seen(user_id, seen)
         
-        session_id = db.create_quiz_session(user_id, questions)
+        session_id, quiz_record_ids = await db.create_quiz_session(user_id, questions)
         print(f"Created quiz session: {session_id}")
         
         # Save active quiz session ID to database
         if user:
-            db.update_user(user['id'], {'Active Quiz Session ID': session_id})
+            await db.update_user(user['id'], {'Active Quiz Session ID': session_id})
         
         user_sessions[user_id] = {
             'current_question': 0,
             'answers': [],
             'questions': questions,
-            'session_id': session_id
+            'session_id': session_id,
+            'quiz_record_ids': quiz_record_ids
         }
         
-        await show_question(query, user_id, user_sessions, db)
+        await show_question(query, user_id, user_sessions, db, context.bot_data['answer_ledger'])
     finally:
         processing.discard(key)
 
-async def show_question(query, user_id, user_sessions, db):
+async def show_question(query, user_id, user_sessions, db, ledger):
     session = user_sessions.get(user_id)
     if not session:
         return
@@ -115,7 +127,7 @@ async def show_question(query, user_id, user_sessions, db):
     
     if current_q >= len(questions):
         await query.message.reply_text("⏳ Analyzing your answers... Please wait.")
-        await show_results(query, user_id, user_sessions, db)
+        await show_results(query, user_id, user_sessions, db, ledger)
         return
     
     question = questions[current_q]
@@ -138,7 +150,8 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answer = parts[1]
     user_id = int(parts[2])
     
-    key = f"ans_{user_id}_{answer}"
+    # One answer at a time per user: a second tap must not answer the same question again
+    key = f"ans_{user_id}"
     if key in processing:
         return
     processing.add(key)
@@ -161,16 +174,9 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
         is_correct = answer == question['correct']
         
-        # Generate AI feedback for wrong answers
-        ai_feedback = ""
-        if not is_correct:
-            from ai_content import AIContentGenerator
-            ai = AIContentGenerator()
-            feedback_prompt = f"Explain why {question['correct']} is correct for: {question['text']}"
-            try:
-                ai_feedback = ai.generate_theory_explanation(feedback_prompt, 'en')[:300]
-            except:
-                ai_feedback = f"Correct answer is {question['correct']}"
+        # Feedback for wrong answers: the dataset rationale, known without waiting on GPT-4o
+        ai = context.bot_data['ai']
+        ai_feedback = "" if is_correct else ai.explain_answer(question)
         
         session['answers'].append({
             'answer': answer,
@@ -179,21 +185,31 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'topic': question.get('topic', 'general')
         })
         
-        question = session['questions'][current_q]
-        
-        quiz_id = f"{session['session_id']}_q{current_q + 1}"
-        is_last = (current_q + 1) >= len(session['questions'])
-        print(f"Updating quiz answer: {quiz_id}, answer: {answer}, correct: {is_correct}")
-        db.update_quiz_answer(quiz_id, answer, 1 if is_correct else 0, ai_feedback, is_last)
+        # Logged locally; the whole quiz reaches the Quizzes table in one batch at the end
+        ledger = context.bot_data['answer_ledger']
+        quiz_record_id = session.get('quiz_record_ids', {}).get(current_q + 1)
+        ledger.record(session['session_id'], current_q + 1, answer, 1 if is_correct else 0, ai_feedback, quiz_record_id)
+        if not is_correct and not ai_feedback and quiz_record_id:
+            # No rationale (AI-generated question): explain it in the background and attach it later
+            context.application.create_task(attach_ai_feedback(ai, db, question, quiz_record_id))
         
         session['current_question'] += 1
+        user_sessions.save(user_id)
         
-        await asyncio.sleep(0.3)
-        await show_question(query, user_id, user_sessions, db)
+        await show_question(query, user_id, user_sessions, db, ledger)
     finally:
         processing.discard(key)
 
-async def show_results(query, user_id, user_sessions, db):
+async def attach_ai_feedback(ai, db, question, record_id):
+    """Store a GPT-4o explanation on the question's record; runs off the answer path"""
+    try:
+        feedback = await ai.write_answer_explanation(question)
+    except Exception as e:
+        print(f"AI feedback failed: {e}")
+        feedback = f"Correct answer is {question['correct']}"
+    await db.update_quiz_feedback(record_id, feedback)
+
+async def show_results(query, user_id, user_sessions, db, ledger):
     session = user_sessions.get(user_id)
     if not session:
         return
@@ -224,16 +240,16 @@ async def show_results(query, user_id, user_sessions, db):
     else:
         target = "120-140"
     
-    # Complete quiz session in Quizzes table
-    db.complete_quiz_session(session['session_id'], percentage)
+    # Store the answers and complete the session in the Quizzes table
+    await ledger.complete(db, session['session_id'], percentage, session.get('quiz_record_ids'))
     
     # Create learning record for diagnostic test
-    db.create_learning_record(user_id, 0, "Diagnostic Test", "Assessment")
+    await db.create_learning_record(user_id, 0, "Diagnostic Test", "Assessment")
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
         user_data = user.get('fields', {})
-        db.update_user(user['id'], {
+        await db.update_user(user['id'], {
             'Test Score': str(percentage),
             'Strong Topics': ', '.join(strongest),
             'Weak Topics': ', '.join(weakest),
@@ -251,9 +267,4 @@ async def show_results(query, user_id, user_sessions, db):
     keyboard = [[InlineKeyboardButton("📅 Get Plan", callback_data="get_plan")]]
     await query.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     
-    # Clear active quiz session ID
-    user = db.get_user(user_id)
-    if user:
-        db.update_user(user['id'], {'Active Quiz Session ID': ''})
-    
     user_sessions.pop(user_id, None)
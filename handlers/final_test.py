@@ -1,6 +1,6 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from ai_content import AIContentGenerator
 import json
+from ai_content import FEEDBACK_MAX_CHARS
 
 async def start_final_test(update, context):
     """Start the final assessment test"""
@@ -8,27 +8,41 @@ async def start_final_test(update, context):
     db = context.bot_data['db']
     
     # Get user data
-    user_data = db.get_user(user_id)
+    user_data = await db.get_user(user_id)
     if not user_data:
         await update.callback_query.answer("❌ User data not found")
         return
     
     # Initialize final test session
-    ai_generator = AIContentGenerator()
+    ai_generator = context.bot_data['ai']
+    seen = context.bot_data['user_sessions'].load_seen(user_id, ai_generator.full_dataset)
     
     # Generate 12 challenging questions based on user's level and target score
     questions = ai_generator.generate_final_test_questions(
         user_level=user_data.get('Level', 'Beginner'),
-        target_score=user_data.get('Target Score', 150)
+        target_score=user_data.get('Target Score', 150),
+        seen=seen
     )
     
     if len(questions) != 12:
         await update.callback_query.answer("❌ Error generating test questions")
         return
     
+    context.bot_data['user_sessions'].save_seen(user_id, seen)
+    
+    # One Quizzes row per question; the answers are stored there in one batch at the end
+    session_id, quiz_record_ids = await db.create_quiz_session(user_id, [{
+        'text': q['question'],
+        'options': q['options'],
+        'correct': q['correct_answer'],
+        'topic': 'final_test'
+    } for q in questions])
+    
     # Store test session
     context.bot_data['user_sessions'][user_id] = {
         'type': 'final_test',
+        'session_id': session_id,
+        'quiz_record_ids': quiz_record_ids,
         'questions': questions,
         'current_question': 0,
         'correct_answers': 0,
@@ -102,9 +116,16 @@ async def handle_final_test_answer(update, context):
         'correct': question['correct_answer'],
         'is_correct': is_correct
     })
+    if session.get('session_id'):
+        feedback = "" if is_correct else question.get('explanation', '')[:FEEDBACK_MAX_CHARS]
+        context.bot_data['answer_ledger'].record(
+            session['session_id'], current_q + 1, selected_answer, 1 if is_correct else 0, feedback,
+            session.get('quiz_record_ids', {}).get(current_q + 1)
+        )
     
     # Move to next question or show results
     session['current_question'] += 1
+    context.bot_data['user_sessions'].save(user_id)
     
     if session['current_question'] < 12:
         try:
@@ -154,9 +175,12 @@ async def show_final_test_results(update, context):
         knowledge_level = "Beginner+"
         message = "Keep studying! Consider reviewing the fundamentals."
     
+    if session.get('session_id'):
+        await context.bot_data['answer_ledger'].complete(db, session['session_id'], percentage, session.get('quiz_record_ids'))
+    
     # Update user's final assessment in database
     try:
-        db.update_user(user_id, {
+        await db.update_user(user_id, {
             'Final Test Score': f"{correct}/{total}",
             'Final Test Percentage': f"{percentage:.1f}%",
             'Knowledge Level': knowledge_level,
@@ -200,7 +224,7 @@ async def show_final_test_details(update, context):
     user_id = update.effective_user.id
     db = context.bot_data['db']
     
-    user_data = db.get_user(user_id)
+    user_data = await db.get_user(user_id)
     if not user_data:
         await update.callback_query.answer("❌ No test data found")
         return
@@ -15,9 +15,9 @@ async def language_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     lang = query.data.split('_')[1]
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
-        db.update_user(user['id'], {'Language': lang, 'Last Active': datetime.now().isoformat()})
+        await db.update_user(user['id'], {'Language': lang, 'Last Active': datetime.now().isoformat()})
     
     if lang == 'uz':
         text = "👋 Assalomu alaykum, BOMI_bot ga xush kelibsiz!🇺🇿\n\n📘 Bu bot sizga imtihonlarga tayyorgarlik ko'rishda yordam beradi:\n\n🧩 Sizning kuchli va zaif tomonlaringizni aniqlaydi\n📅 Shaxsiy 2 haftalik o'quv reja tuzadi\n✍️ Har kuni nazariy tushuntirishlar + 5–10 ta test savoli\n🚀 Motivatsiya va natijalarni kuzatib boradi\n\n👉 Keling, tanishaylik! Ismingizni yozing:"
@@ -35,7 +35,7 @@ async def level_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     
     # Check if already processed
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user and user.get('fields', {}).get('Learning Status') == 'Onboarded':
         return
     
@@ -44,9 +44,9 @@ async def level_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session = user_sessions.get(user_id, {})
     lang = session.get('lang', 'en')
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
-        db.update_user(user['id'], {'Level': level, 'Learning Status': 'Onboarded', 'Last Active': datetime.now().isoformat()})
+        await db.update_user(user['id'], {'Level': level, 'Learning Status': 'Onboarded', 'Last Active': datetime.now().isoformat()})
     
     if lang == 'uz':
         msg = f"✅ Ajoyib! Endi diagnostik testni boshlaylik.\n\n📝 12 ta savol, taxminan 10 daqiqa."
@@ -67,7 +67,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     
     # Check user mode from database
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     user_mode = user.get('fields', {}).get('Mode', '') if user else ''
     lang = session.get('lang', user.get('fields', {}).get('Language', 'en') if user else 'en')
     
@@ -75,13 +75,15 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_mode == 'set_reminder_time':
         import re
         if re.match(r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$', text):
-            db.update_user(user['id'], {
+            await db.update_user(user['id'], {
                 'Timezone': text,
                 'Mode': 'idle',
                 'Expected': 'none',
                 'Last Active': datetime.now().isoformat()
             })
             
+            if not session.get('questions'):
+                user_sessions.pop(user_id, None)  # the reminder prompt's stub
             msg = f"✅ Reminder set for {text}!\n\n👋 See you tomorrow at {text}!\n\n💡 Want to continue now? Send /daily_lesson" if lang == 'en' else f"✅ {text} uchun eslatma o'rnatildi!\n\n👋 Ertaga {text} da ko'rishguncha!\n\n💡 Hozir davom etmoqchimisiz? /daily_lesson yuboring"
             await update.message.reply_text(msg)
         else:
@@ -90,13 +92,14 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     if session.get('step') == 'waiting_name':
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
-            db.update_user(user['id'], {'Full Name': text, 'Last Active': datetime.now().isoformat()})
+            await db.update_user(user['id'], {'Full Name': text, 'Last Active': datetime.now().isoformat()})
         msg = "📧 Emailingizni yozing:" if lang == 'uz' else "📧 Enter your email:"
         await update.message.reply_text(msg)
         session['step'] = 'waiting_email'
         session['name'] = text
+        user_sessions.save(user_id)
     
     elif session.get('step') == 'waiting_email':
         # Validate email
@@ -105,18 +108,19 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(msg)
             return
         
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
-            db.update_user(user['id'], {'Username': text, 'Last Active': datetime.now().isoformat()})
+            await db.update_user(user['id'], {'Username': text, 'Last Active': datetime.now().isoformat()})
         msg = "🎯 Maqsadingiz necha ball? (masalan: 180)" if lang == 'uz' else "🎯 What's your target score? (e.g., 180)"
         await update.message.reply_text(msg)
         session['step'] = 'waiting_target'
         session['email'] = text
+        user_sessions.save(user_id)
     
     elif session.get('step') == 'waiting_target':
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         if user:
-            db.update_user(user['id'], {'Expected': text, 'Last Active': datetime.now().isoformat()})
+            await db.update_user(user['id'], {'Expected': text, 'Last Active': datetime.now().isoformat()})
         
         if lang == 'uz':
             msg = "📊 Sizning hozirgi darajangiz qanday?"
@@ -136,18 +140,19 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard))
         session['step'] = 'waiting_level'
         session['target'] = text
+        user_sessions.save(user_id)
     
     elif session.get('step') == 'set_reminder_time' or session.get('waiting_for_time'):
         import re
         if re.match(r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$', text):
-            user = db.get_user(user_id)
+            user = await db.get_user(user_id)
             if user:
                 user_data = user.get('fields', {})
                 chat_id = user_data.get('Telegram Chat ID')
                 current_day = user_data.get('Current Day', '1')
                 
                 # Save reminder time to Timezone field
-                db.update_user(user['id'], {
+                await db.update_user(user['id'], {
                     'Timezone': text,
                     'Mode': 'idle',
                     'Expected': 'none',
@@ -13,7 +13,7 @@ async def check_and_resume_user(update: Update, context: ContextTypes.DEFAULT_TY
         return False
     
     state_manager = StateManager(db)
-    state = state_manager.get_user_state(user_id)
+    state = await state_manager.get_user_state(user_id)
     
     if not state:
         return False
@@ -83,6 +83,46 @@ async def resume_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE,
     else:
         await update.message.reply_text(text)
 
+async def reshow_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the question or task the user's live session stands at.
+
+    Sessions survive restarts, so one may be left from before. Returns False when the
+    session has no question or task to show.
+    """
+    user_sessions = context.bot_data['user_sessions']
+    user_id = update.effective_user.id
+    session = user_sessions.get(user_id)
+    if not session or not session.get('questions'):
+        return False
+    questions = session['questions']
+    
+    if session.get('type') == 'final_test':
+        if session['current_question'] >= len(questions):
+            return False
+        from handlers.final_test import show_final_test_question
+        await show_final_test_question(update, context, session['current_question'])
+        return True
+    
+    if 'current_task' in session:
+        if session.get('completed') or session['current_task'] >= len(questions):
+            from handlers.daily_lesson import send_next_steps
+            await send_next_steps(update.message or update.callback_query.message, user_id, session.get('lang', 'en'))
+            return True
+        quiz_type, current = 'lesson', session['current_task']
+    else:
+        if session['current_question'] >= len(questions):
+            return False
+        quiz_type, current = 'diagnostic', session['current_question']
+    
+    await resume_quiz(update, context, {
+        'quiz_type': quiz_type,
+        'language': session.get('lang', 'en'),
+        'next_question': questions[current],
+        'current_question': current,
+        'total_questions': len(questions)
+    })
+    return True
+
 async def resume_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE, state):
     """Resume incomplete quiz"""
     user_sessions = context.bot_data['user_sessions']
@@ -106,7 +146,8 @@ async def resume_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE, state)
     else:
         keyboard = [[InlineKeyboardButton(opt, callback_data=f"task_ans_{opt}_{user_id}")] for opt in ['A', 'B', 'C', 'D']]
     
-    await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    message = update.message or update.callback_query.message
+    await message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def resume_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, state):
     """Resume incomplete lesson"""
@@ -122,7 +163,8 @@ async def resume_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, stat
         state['lesson_id'], 
         user_sessions, 
         db, 
-        state['language']
+        state['language'],
+        context.bot_data['ai']
     )
     
     if not resumed:
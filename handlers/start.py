@@ -11,7 +11,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id in user_sessions:
         user_sessions.pop(user_id)
     
-    existing_user = db.get_user(user_id)
+    existing_user = await db.get_user(user_id)
     
     if existing_user:
         # Check if user has incomplete state to resume
@@ -22,7 +22,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         user_data = existing_user.get('fields', {})
-        db.update_user(existing_user['id'], {'Last Active': datetime.now().isoformat()})
+        await db.update_user(existing_user['id'], {'Last Active': datetime.now().isoformat()})
         
         learning_status = user_data.get('Learning Status', 'Not Started')
         lang = user_data.get('Language', 'en')
@@ -97,7 +97,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         username = update.effective_user.username or "no_username"
         print(f"Creating new user: {user_id}, username: {username}")
-        result = db.create_user(user_id=user_id, full_name="", username=username, chat_id=update.effective_chat.id)
+        result = await db.create_user(user_id=user_id, full_name="", username=username, chat_id=update.effective_chat.id)
         if result:
             print(f"User created successfully: {result['id']}")
         else:
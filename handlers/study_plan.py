@@ -8,7 +8,7 @@ async def get_study_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = query.from_user.id
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     user_data = user.get('fields', {}) if user else {}
     weak = user_data.get('Weak Topics', '').split(', ') if user_data.get('Weak Topics') else []
     lang = user_data.get('Language', 'en')
@@ -40,10 +40,10 @@ async def start_now(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
         lang = user.get('fields', {}).get('Language', 'en')
-        db.update_user(user['id'], {'Learning Status': 'In Progress', 'Timezone': 'Not Set', 'Last Active': datetime.now().isoformat()})
+        await db.update_user(user['id'], {'Learning Status': 'In Progress', 'Timezone': 'Not Set', 'Last Active': datetime.now().isoformat()})
         
         if lang == 'uz':
             msg = "✅ Boshlandi! /daily_lesson buyrug'i bilan 1-kunni boshlang."
@@ -59,12 +59,12 @@ async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     user_id = query.from_user.id
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     lang = user.get('fields', {}).get('Language', 'en') if user else 'en'
     
     # Set Mode in database so onboarding.py can handle the time input
     if user:
-        db.update_user(user['id'], {
+        await db.update_user(user['id'], {
             'Mode': 'set_reminder_time', 
             'Expected': 'reminder_time',
             'Learning Status': 'In Progress'  # Set to In Progress so /daily_lesson works
@@ -77,3 +77,4 @@ async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_sessions[user_id] = {}
     user_sessions[user_id]['waiting_for_time'] = True
     user_sessions[user_id]['lang'] = lang
+    user_sessions.save(user_id)
@@ -4,9 +4,9 @@ class LevelProgression:
     def __init__(self, db):
         self.db = db
     
-    def calculate_user_level(self, user_id):
+    async def calculate_user_level(self, user_id):
         """Calculate user's current level based on performance"""
-        user = self.db.get_user(user_id)
+        user = await self.db.get_user(user_id)
         if not user:
             return 'Beginner'
         
@@ -24,7 +24,7 @@ class LevelProgression:
             target_score = 160
         
         # Calculate average lesson performance
-        avg_lesson_score = self._get_average_lesson_score(user_id)
+        avg_lesson_score = await self._get_average_lesson_score(user_id)
         
         # Level progression logic
         level_score = 0
@@ -54,22 +54,10 @@ class LevelProgression:
         else:
             return 'Beginner'
     
-    def _get_average_lesson_score(self, user_id):
+    async def _get_average_lesson_score(self, user_id):
         """Get average score from completed lessons"""
-        import requests
-        
         # Get learning records
-        learning_filter = f"{{User ID}}='{user_id}'"
-        response = requests.get(
-            f"https://api.airtable.com/v0/{self.db.base_id}/tblInFtIh5fZt59g4",
-            headers=self.db.headers,
-            params={'filterByFormula': learning_filter}
-        )
-        
-        if response.status_code != 200:
-            return 0
-        
-        records = response.json().get('records', [])
+        records = await self.db.get_learning_records(user_id)
         if not records:
             return 0
         
@@ -89,15 +77,15 @@ class LevelProgression:
         
         return total_score / max(count, 1)
     
-    def should_level_up(self, user_id):
+    async def should_level_up(self, user_id):
         """Check if user should level up"""
-        user = self.db.get_user(user_id)
+        user = await self.db.get_user(user_id)
         if not user:
             return False
         
         user_data = user.get('fields', {})
         current_level = user_data.get('Level', 'Beginner')
-        calculated_level = self.calculate_user_level(user_id)
+        calculated_level = await self.calculate_user_level(user_id)
         
         # Check if calculated level is higher than current
         level_hierarchy = {'Beginner': 1, 'Intermediate': 2, 'Advanced': 3}
@@ -107,16 +95,16 @@ class LevelProgression:
         
         return calculated_rank > current_rank
     
-    def level_up_user(self, user_id):
+    async def level_up_user(self, user_id):
         """Level up the user"""
-        user = self.db.get_user(user_id)
+        user = await self.db.get_user(user_id)
         if not user:
             return False
         
-        new_level = self.calculate_user_level(user_id)
+        new_level = await self.calculate_user_level(user_id)
         
         # Update user level
-        result = self.db.update_user(user['id'], {
+        result = await self.db.update_user(user['id'], {
             'Level': new_level,
             'Last Level Up': datetime.now().isoformat()
         })
@@ -138,9 +126,9 @@ class LevelProgression:
         
         return messages.get(new_level, "🎉 Level up!")
     
-    def get_adaptive_difficulty(self, user_id, base_level):
+    async def get_adaptive_difficulty(self, user_id, base_level):
         """Get adaptive difficulty based on recent performance"""
-        avg_score = self._get_average_lesson_score(user_id)
+        avg_score = await self._get_average_lesson_score(user_id)
         
         # Adjust difficulty based on performance
         if avg_score >= 4.5:  # Excellent performance
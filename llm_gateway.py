@@ -0,0 +1,200 @@
+import os
+import time
+import asyncio
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# GPT-4o calls allowed in flight at once across the whole bot
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+# Calls allowed to wait for a slot; beyond this new calls are rejected straight away
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '20'))
+# Default deadline (seconds) for one call, including time spent waiting for a slot
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+
+_shared_gateway = None
+
+class LLMUnavailable(Exception):
+    """The gateway is saturated, the deadline passed or the API call failed; callers use their fallback text."""
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one in-flight call."""
+
+    def __init__(self):
+        self._in_flight = {}  # key -> [future of the running call, callers awaiting it]
+        self.calls = 0
+        self.saved = 0
+
+    async def do(self, key, make_call):
+        """Await make_call() once per key at a time; later callers get the same result or exception.
+
+        The call is cancelled when the last caller awaiting it is cancelled.
+        """
+        entry = self._in_flight.get(key)
+        if entry is not None:
+            self.saved += 1
+        else:
+            self.calls += 1
+            entry = [asyncio.ensure_future(make_call()), 0]
+            self._in_flight[key] = entry
+            entry[0].add_done_callback(lambda done: self._forget(key, done))
+        future = entry[0]
+        entry[1] += 1
+        try:
+            # One caller giving up must not cancel the call for everyone else
+            return await asyncio.shield(future)
+        finally:
+            entry[1] -= 1
+            # ...but nobody left waiting means nobody wants the answer or its gateway slot
+            if not entry[1] and not future.done():
+                future.cancel()
+
+    def _forget(self, key, future):
+        entry = self._in_flight.get(key)
+        if entry is not None and entry[0] is future:
+            del self._in_flight[key]
+
+class LLMGateway:
+    """Async access to the OpenAI chat API with a global concurrency cap.
+
+    Handlers await chat() instead of calling openai.ChatCompletion.create, so a slow
+    completion only delays the user who asked for it.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, timeout=LLM_TIMEOUT):
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = None
+        self._loop = None
+        self.single_flight = SingleFlight()
+        self.waiting = 0
+        self.in_flight = 0
+
+        self.calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    def _get_semaphore(self):
+        # Scripts call asyncio.run() more than once; a semaphore belongs to one loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def chat(self, prompt, model="gpt-4o", deadline=None, key=None, **params):
+        """Return the completion text for a single user prompt.
+
+        Concurrent calls with the same `key` share one request. Raises LLMUnavailable when
+        the wait queue is full, the deadline (seconds, default LLM_TIMEOUT) runs out, or the
+        API call fails.
+        """
+        if key is not None:
+            return await self.single_flight.do(key, lambda: self._chat(prompt, model, deadline, params))
+        return await self._chat(prompt, model, deadline, params)
+
+    async def _chat(self, prompt, model, deadline, params):
+        timeout = deadline or self.timeout
+        started = time.monotonic()
+        semaphore = await self._acquire(timeout)
+        try:
+            remaining = max(0.1, timeout - (time.monotonic() - started))
+            response = await asyncio.wait_for(openai.ChatCompletion.acreate(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                request_timeout=remaining,
+                **params
+            ), remaining)
+            return response.choices[0].message.content
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMUnavailable(f"LLM call exceeded {timeout:g}s")
+        except openai.error.OpenAIError as e:
+            self.errors += 1
+            raise LLMUnavailable(str(e))
+        finally:
+            self._release(semaphore, started)
+
+    async def stream_chat(self, prompt, model="gpt-4o", deadline=None, **params):
+        """Yield the completion text in pieces as the model writes it.
+
+        Same slot, queue and deadline rules as chat(); the deadline covers the whole stream.
+        """
+        timeout = deadline or self.timeout
+        started = time.monotonic()
+        semaphore = await self._acquire(timeout)
+        try:
+            remaining = max(0.1, timeout - (time.monotonic() - started))
+            response = await asyncio.wait_for(openai.ChatCompletion.acreate(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                request_timeout=remaining,
+                stream=True,
+                **params
+            ), remaining)
+            chunks = response.__aiter__()
+            while True:
+                remaining = max(0.1, timeout - (time.monotonic() - started))
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                text = chunk.choices[0].delta.get('content')
+                if text:
+                    yield text
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMUnavailable(f"LLM stream exceeded {timeout:g}s")
+        except openai.error.OpenAIError as e:
+            self.errors += 1
+            raise LLMUnavailable(str(e))
+        finally:
+            self._release(semaphore, started)
+
+    async def _acquire(self, timeout):
+        """Wait for a call slot; raises LLMUnavailable when the queue is full or no slot frees up in time"""
+        semaphore = self._get_semaphore()
+        if self.waiting + self.in_flight >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise LLMUnavailable(f"LLM queue full ({self.waiting} waiting)")
+
+        self.calls += 1
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMUnavailable(f"No LLM slot free within {timeout:g}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return semaphore
+
+    def _release(self, semaphore, started):
+        self.in_flight -= 1
+        semaphore.release()
+        self.total_latency += time.monotonic() - started
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'calls': self.calls,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'coalesced': self.single_flight.saved,
+            'avg_latency_s': round(self.total_latency / self.calls, 2) if self.calls else 0.0
+        }
+
+def get_llm_gateway():
+    """Return the process-wide LLMGateway"""
+    global _shared_gateway
+    if _shared_gateway is None:
+        _shared_gateway = LLMGateway()
+    return _shared_gateway
@@ -0,0 +1,66 @@
+import os
+import time
+import asyncio
+
+# Seconds between edits of a streamed message; Telegram throttles faster edits of one chat
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+class ProgressiveMessage:
+    """A sent Telegram message that is edited in place while its text streams in.
+
+    update() may be called for every received piece; it edits at most once per
+    interval, with only whole words cleaned for display. finish() shows the final text;
+    after close() the message is left as it is.
+    """
+
+    def __init__(self, message, header, clean, interval=STREAM_EDIT_INTERVAL):
+        self.message = message
+        self.header = header
+        self.clean = clean
+        self.interval = interval
+        self.shown = ''
+        self.edits = 0
+        self.first_edit_at = None
+        self.closed = False
+        self._last_edit = 0.0
+
+    def close(self):
+        """Stop editing, e.g. when the lesson is abandoned while its text still streams in"""
+        self.closed = True
+
+    async def update(self, raw_text):
+        if self.closed or time.perf_counter() - self._last_edit < self.interval:
+            return
+        # A half-received word may be the start of a LaTeX command or markdown marker
+        cut = max(raw_text.rfind(' '), raw_text.rfind('\n'))
+        if cut <= 0:
+            return
+        text = self.clean(raw_text[:cut])
+        if any(c.isalnum() for c in text) and text + ' ...' != self.shown:
+            await self._edit(text, ' ...')
+
+    async def finish(self, text):
+        """Show the final text; sent as a new message if the edit keeps failing"""
+        if self.closed or text == self.shown:
+            return
+        if await self._edit(text):
+            return
+        await asyncio.sleep(self.interval)
+        if not await self._edit(text):
+            await self.message.reply_text(f"{self.header}\n\n{text}"[:TELEGRAM_MESSAGE_LIMIT], parse_mode=None)
+
+    async def _edit(self, text, suffix=''):
+        self._last_edit = time.perf_counter()
+        body = f"{self.header}\n\n{text}"[:TELEGRAM_MESSAGE_LIMIT - len(suffix)] + suffix
+        try:
+            await self.message.edit_text(body, parse_mode=None)
+        except Exception as e:
+            # Flood control or an unchanged text; the next edit or finish() catches up
+            print(f"Could not edit streamed message: {e}")
+            return False
+        self.shown = text + suffix
+        self.edits += 1
+        if self.first_edit_at is None:
+            self.first_edit_at = time.perf_counter()
+        return True
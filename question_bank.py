@@ -0,0 +1,461 @@
+import os
+import sys
+import json
+import time
+import mmap
+import zlib
+import random
+import struct
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # optional: the sampling index is then built in pure Python
+    np = None
+
+QUESTION_BANK_PATH = os.getenv('QUESTION_BANK_PATH', 'question_bank.bin')
+DATASET_FILES = ['train.json', 'dev.json', 'test.json', 'challenge_test.json']
+DATASET_PATHS = ['/root/aymen/math', '../aymen/math', 'c:/Users/Ahmed/Desktop/aymen/math']
+
+# File header; bump FORMAT_VERSION whenever the record layout or cleaning rules change
+MAGIC = b'BOMIQB'
+FORMAT_VERSION = 3
+# Map the compiled bank read-only so all bot processes on a host share its pages
+QUESTION_BANK_MMAP = os.getenv('QUESTION_BANK_MMAP', '1') == '1'
+
+# Bit per level in a question's 'levels' mask (questions passing that level's filter)
+LEVEL_BITS = {'Beginner': 1, 'Intermediate': 2, 'Advanced': 4}
+# Categories a level falls back to when its filter matches too few questions
+LEVEL_CATEGORIES = {
+    'Beginner': ('general', 'gain'),
+    'Intermediate': ('general', 'geometry', 'gain'),
+    'Advanced': ('physics', 'geometry', 'probability')
+}
+
+ADVANCED_SYMBOLS = ['²', '³', '^', '√', 'log', 'sin', 'cos', 'tan']
+ADVANCED_TERMS = ['quadratic', 'polynomial', 'derivative', 'integral', 'matrix', 'vector', 'trigonometric', 'logarithmic', 'exponential', 'parabola', 'hyperbola', 'ellipse']
+MULTI_STEP = ['system of equations', 'solve for', 'find the value', 'determine', 'calculate', 'given that', 'if and only if']
+
+def load_raw_datasets():
+    """Parse the raw dataset JSON files (the slow path the compiled bank replaces)"""
+    datasets = []
+    for file in DATASET_FILES:
+        loaded = False
+        for base_path in DATASET_PATHS:
+            try:
+                with open(f"{base_path}/{file}", 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                datasets.extend(data)
+                print(f"Loaded {len(data)} problems from {file}")
+                loaded = True
+                break
+            except Exception:
+                continue
+        if not loaded:
+            print(f"Failed to load {file} from any path")
+    return datasets
+
+def dataset_signature():
+    """Checksum of the size and mtime of the raw dataset files, or None if none are present.
+
+    Stored in a compiled bank so it is rebuilt when the datasets change.
+    """
+    found = []
+    for file in DATASET_FILES:
+        for base_path in DATASET_PATHS:
+            try:
+                stat = os.stat(f"{base_path}/{file}")
+            except OSError:
+                continue
+            found.append([file, stat.st_size, stat.st_mtime_ns])
+            break
+    return zlib.crc32(json.dumps(found).encode()) if found else None
+
+def complexity_score(problem, category):
+    """Difficulty score of a raw problem (higher is harder)"""
+    text = problem.lower()
+    score = 0
+
+    # Length factor (longer = more complex)
+    if len(text) > 200: score += 3
+    elif len(text) > 150: score += 2
+    elif len(text) > 100: score += 1
+
+    if any(symbol in problem for symbol in ADVANCED_SYMBOLS):
+        score += 3
+    score += sum(2 for term in ADVANCED_TERMS if term in text)
+    score += sum(1 for indicator in MULTI_STEP if indicator in text)
+
+    if category in ['physics', 'probability']:
+        score += 2
+    elif category == 'geometry':
+        score += 1
+    return score
+
+def level_mask(problem, category, score):
+    """LEVEL_BITS of every level whose filter the raw problem passes"""
+    text = problem.lower()
+    mask = 0
+    # Beginner: short problems, basic operations
+    if (len(text) < 150 and
+            category in ['general', 'gain'] and
+            any(word in text for word in ['add', 'subtract', 'multiply', 'divide', 'sum', 'difference', 'simple']) and
+            not any(word in text for word in ['equation', 'formula', 'complex', 'derivative', 'integral'])):
+        mask |= LEVEL_BITS['Beginner']
+    # Intermediate: moderate length and complexity
+    if (50 < len(text) < 200 and
+            category in ['general', 'geometry', 'gain'] and
+            any(word in text for word in ['find', 'solve', 'calculate']) and
+            not any(word in text for word in ['complex', 'advanced', 'derivative'])):
+        mask |= LEVEL_BITS['Intermediate']
+    # Advanced: high complexity in the harder categories
+    if score >= 5 and category in ['physics', 'geometry', 'probability']:
+        mask |= LEVEL_BITS['Advanced']
+    return mask
+
+def compile_questions(raw_problems):
+    """Normalise, clean, validate, dedupe and score raw dataset problems.
+
+    Returns (questions, report). Each question is served as is:
+    {'text', 'options', 'correct', 'topic', 'rationale', 'complexity', 'levels'}.
+    """
+    from ai_content import clean_text, clean_option
+
+    questions = []
+    seen = set()
+    report = {'source': len(raw_problems), 'invalid': 0, 'duplicates': 0}
+    for problem in raw_problems:
+        correct = str(problem.get('correct', '')).strip().upper()
+        options = str(problem.get('options', '')).split(' , ')
+        if correct not in ('A', 'B', 'C', 'D') or len(options) < 4:
+            report['invalid'] += 1
+            continue
+
+        clean_options = tuple(clean_option(option.strip()) for option in options[:4])
+        text = clean_text(problem.get('Problem', ''))
+        if not text or len(set(clean_options)) != 4 or not all(clean_options):
+            report['invalid'] += 1
+            continue
+
+        key = (text.lower(), clean_options)
+        if key in seen:
+            report['duplicates'] += 1
+            continue
+        seen.add(key)
+
+        category = problem.get('category', 'general')
+        score = complexity_score(problem.get('Problem', ''), category)
+        questions.append({
+            'text': text,
+            'options': clean_options,
+            'correct': correct,
+            'topic': category,
+            'rationale': clean_text(problem.get('Rationale', '')),
+            'complexity': score,
+            'levels': level_mask(problem.get('Problem', ''), category, score)
+        })
+    report['questions'] = len(questions)
+    return questions, report
+
+def encode_bank(questions, meta):
+    """Serialise questions into the columnar bank layout (see QuestionBank)"""
+    categories = sorted({question['topic'] for question in questions})
+    category_ids = {category: i for i, category in enumerate(categories)}
+
+    blob = bytearray()
+    offsets = array('I', [0])
+    for question in questions:
+        for value in (question['text'], *question['options'], question['rationale']):
+            blob += value.encode('utf-8')
+            offsets.append(len(blob))
+
+    columns = {
+        'topic': array('B', (category_ids[question['topic']] for question in questions)),
+        'correct': array('B', ('ABCD'.index(question['correct']) for question in questions)),
+        'levels': array('B', (question['levels'] for question in questions)),
+        'complexity': array('H', (min(question['complexity'], 0xFFFF) for question in questions)),
+        'offsets': offsets,
+        'blob': array('B', bytes(blob))
+    }
+
+    # Column offsets are relative to the (8-byte aligned) end of the header
+    body = bytearray()
+    layout = {}
+    for name, column in columns.items():
+        body += b'\0' * (-len(body) % 8)  # keep every column 8-byte aligned
+        layout[name] = [len(body), column.typecode, len(column)]
+        body += column.tobytes()
+
+    header = json.dumps({
+        'meta': meta,
+        # Identifies the question order, so per-student seen sets survive rebuilding the same bank
+        'checksum': zlib.crc32(body),
+        'count': len(questions),
+        'categories': categories,
+        'byteorder': sys.byteorder,
+        'columns': layout
+    }).encode('utf-8')
+    prefix = MAGIC + bytes([FORMAT_VERSION]) + struct.pack('<I', len(header)) + header
+    prefix += b'\0' * (-len(prefix) % 8)
+    return prefix + body
+
+class QuestionBank(Sequence):
+    """Read-only, columnar bank of pre-cleaned, validated dataset questions.
+
+    Layout: a JSON header, then one array per column: interned topic IDs, correct answer,
+    level mask, complexity score, and offsets into a UTF-8 blob holding each question's
+    text, four options and rationale. Columns are memoryviews over the file, so with
+    mmap every bot process on a host shares the same read-only pages; a question dict
+    is only built when it is served.
+    """
+
+    def __init__(self, buffer, mapping=None):
+        self._buffer = memoryview(buffer)
+        self._mapping = mapping  # keeps the mmap open for the views below
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a question bank file")
+        version = self._buffer[len(MAGIC)]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"question bank format v{version}, expected v{FORMAT_VERSION}")
+
+        start = len(MAGIC) + 1
+        header_len = struct.unpack('<I', self._buffer[start:start + 4])[0]
+        header = json.loads(bytes(self._buffer[start + 4:start + 4 + header_len]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"question bank built on a {header['byteorder']}-endian host")
+        body_start = start + 4 + header_len
+        body_start += -body_start % 8
+
+        self.meta = header['meta']
+        self.checksum = header['checksum']
+        self.categories = tuple(header['categories'])
+        self._count = header['count']
+        columns = {}
+        for name, (offset, typecode, length) in header['columns'].items():
+            size = array(typecode).itemsize
+            view = self._buffer[body_start + offset:body_start + offset + length * size]
+            columns[name] = view if typecode == 'B' else view.cast(typecode)
+        self.topic_ids = columns['topic']
+        self.correct = columns['correct']
+        self.levels = columns['levels']
+        self.complexity = columns['complexity']
+        self._offsets = columns['offsets']
+        self._blob = columns['blob']
+
+        self._index = self._build_index()
+        self._unions = {}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("question index out of range")
+        base = index * 6
+        offsets, blob = self._offsets, self._blob
+        text, option_a, option_b, option_c, option_d, rationale = (
+            str(blob[offsets[base + k]:offsets[base + k + 1]], 'utf-8') for k in range(6)
+        )
+        return {
+            'text': text,
+            'options': (option_a, option_b, option_c, option_d),
+            'correct': 'ABCD'[self.correct[index]],
+            'topic': self.categories[self.topic_ids[index]],
+            'rationale': rationale,
+            'complexity': self.complexity[index],
+            'levels': self.levels[index]
+        }
+
+    def topic(self, index):
+        return self.categories[self.topic_ids[index]]
+
+    def _build_index(self):
+        """Question indices per (level bit, topic id); level bit 0 holds the whole topic"""
+        bits = (0, *LEVEL_BITS.values())
+        if np is not None:
+            levels = np.frombuffer(self.levels, dtype=np.uint8)
+            topic_ids = np.frombuffer(self.topic_ids, dtype=np.uint8)
+            index = {}
+            for topic_id in range(len(self.categories)):
+                in_topic = np.flatnonzero(topic_ids == topic_id).astype(np.uint32)
+                topic_levels = levels[in_topic]
+                for bit in bits:
+                    selected = in_topic[topic_levels & bit != 0] if bit else in_topic
+                    index[bit, topic_id] = array('I', selected.tobytes())
+            return index
+
+        index = {(bit, topic_id): array('I') for bit in bits for topic_id in range(len(self.categories))}
+        for i, (topic_id, mask) in enumerate(zip(self.topic_ids, self.levels)):
+            index[0, topic_id].append(i)
+            for bit in bits[1:]:
+                if mask & bit:
+                    index[bit, topic_id].append(i)
+        return index
+
+    def indices(self, level_bit=0, categories=None):
+        """Indices of questions passing the level filter for `level_bit` (0: any level) in any
+        of `categories` (None: all). Built once per combination, so sampling k questions
+        from the result costs O(k).
+        """
+        topic_ids = tuple(i for i, category in enumerate(self.categories) if categories is None or category in categories)
+        key = (level_bit, topic_ids)
+        if key not in self._unions:
+            if len(topic_ids) == 1:
+                self._unions[key] = self._index[level_bit, topic_ids[0]]
+            else:
+                merged = array('I')
+                for topic_id in topic_ids:
+                    merged += self._index[level_bit, topic_id]
+                self._unions[key] = merged
+        return self._unions[key]
+
+    def level_indices(self, level_bit):
+        """Indices of questions that pass the filter of the level with this LEVEL_BITS bit"""
+        return self.indices(level_bit)
+
+    def category_indices(self, categories):
+        """Indices of questions in any of the given categories"""
+        return self.indices(0, categories)
+
+    def topic_counts(self):
+        return {category: len(self._index[0, topic_id]) for topic_id, category in enumerate(self.categories)}
+
+    def save(self, path=None):
+        path = path or QUESTION_BANK_PATH
+        # Unique per process, so bot processes starting together never write the same file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._buffer)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None, use_mmap=QUESTION_BANK_MMAP):
+        """Open a compiled bank, memory-mapped read-only unless use_mmap is False.
+
+        Raises ValueError if the file is not a current-format bank.
+        """
+        with open(path or QUESTION_BANK_PATH, 'rb') as f:
+            if use_mmap:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return cls(mapping, mapping)
+            return cls(f.read())
+
+    @classmethod
+    def from_questions(cls, questions, meta=None):
+        return cls(encode_bank(questions, meta or {}))
+
+    @classmethod
+    def from_raw(cls, raw_problems=None):
+        if raw_problems is None:
+            sources = dataset_signature()
+            raw_problems = load_raw_datasets()
+        else:
+            sources = None
+        questions, report = compile_questions(raw_problems)
+        return cls.from_questions(questions, {'format': FORMAT_VERSION, 'built_at': datetime.now().isoformat(),
+                                              'sources': sources, **report})
+
+class SeenQuestions:
+    """Bitset over bank indices of the questions a student has been served.
+
+    One bit per bank question, so membership is O(1) and the full set is a few KB
+    (much less once compressed for storage). Bound to a bank by its checksum.
+    """
+
+    def __init__(self, bank, bits=None):
+        self.checksum = bank.checksum
+        self.bits = bytearray((len(bank) + 7) // 8)
+        if bits:
+            self.bits[:] = bits[:len(self.bits)].ljust(len(self.bits), b'\0')
+
+    def __contains__(self, index):
+        return self.bits[index >> 3] >> (index & 7) & 1
+
+    def add(self, index):
+        self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.bits))
+
+    @classmethod
+    def from_bytes(cls, bank, data, checksum):
+        """Restore a stored set; a set saved for another bank starts empty"""
+        if checksum != bank.checksum or not data:
+            return cls(bank)
+        return cls(bank, zlib.decompress(data))
+
+def sample_unseen(pool, count, seen):
+    """Up to `count` unique indices from `pool`, taking ones not in `seen` first.
+
+    A lazy Fisher-Yates shuffle of the pool positions: every candidate costs O(1), and
+    the scan stops as soon as `count` unseen questions are found. Once the student has
+    seen the whole pool, the rest is filled with questions they saw before.
+    """
+    picked = []
+    repeats = []
+    swapped = {}  # position -> pool position moved there by the shuffle
+    size = len(pool)
+    for position in range(size):
+        j = random.randrange(position, size)
+        candidate = swapped.get(j, j)
+        swapped[j] = swapped.get(position, position)
+        index = pool[candidate]
+        if index not in seen:
+            picked.append(index)
+            if len(picked) == count:
+                return picked
+        elif len(repeats) < count:
+            repeats.append(index)
+    return picked + repeats[:count - len(picked)]
+
+def load_question_bank(path=None):
+    """The compiled bank, rebuilt from the raw datasets and saved when it is missing or stale"""
+    path = path or QUESTION_BANK_PATH
+    sources = dataset_signature()
+    if os.path.exists(path):
+        try:
+            bank = QuestionBank.load(path)
+            # Without the raw datasets on this host there is nothing to rebuild from
+            if sources is None or bank.meta.get('sources') == sources:
+                return bank
+            print(f"[INFO] Raw datasets changed since {path} was built, recompiling")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[ERROR] Could not load question bank {path}: {e}")
+    else:
+        print(f"[INFO] No compiled question bank at {path}, compiling raw datasets")
+
+    bank = QuestionBank.from_raw()
+    if not len(bank):
+        return bank
+    try:
+        bank.save(path)
+    except OSError as e:
+        print(f"[ERROR] Could not save question bank {path}: {e}")
+        return bank
+    print(f"[OK] Question bank saved to {path}; later starts load it directly")
+    # Mapped from the file like any later start, so processes share its pages
+    return QuestionBank.load(path)
+
+if __name__ == "__main__":
+    # Usage: python question_bank.py [output_path]
+    output = sys.argv[1] if len(sys.argv) > 1 else QUESTION_BANK_PATH
+    started = time.perf_counter()
+    bank = QuestionBank.from_raw()
+    if not len(bank):
+        print("[ERROR] No valid questions found, question bank not written")
+        sys.exit(1)
+    bank.save(output)
+    print(f"[OK] Question bank written to {output} in {time.perf_counter() - started:.1f}s: {bank.meta}")
+
+    started = time.perf_counter()
+    QuestionBank.load(output)
+    print(f"[OK] Reload takes {(time.perf_counter() - started) * 1000:.0f} ms, file is {os.path.getsize(output) / 1024:.0f} KB")
@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+from collections import deque
+from llm_gateway import get_llm_gateway
+
+# Set to 0 to serve dataset questions only
+AI_QUESTION_POOL = os.getenv('AI_QUESTION_POOL', '1') == '1'
+# Ready questions kept per (kind, topic, level, language)
+QUESTION_POOL_SIZE = int(os.getenv('QUESTION_POOL_SIZE', '20'))
+# Questions asked of the model per background call
+QUESTION_POOL_BATCH = int(os.getenv('QUESTION_POOL_BATCH', '5'))
+# Pools requested longer ago than this are no longer refilled
+POOL_IDLE_TIME = 24 * 3600
+# Longest pause between attempts while the model keeps failing
+MAX_BACKOFF = 300.0
+
+class QuestionPool:
+    """Bounded pools of AI-generated questions, filled in the background.
+
+    Handlers take() ready questions without waiting on the model; whatever a pool cannot
+    supply is served from the dataset. Taking from a pool marks it as wanted, and the
+    producer keeps the emptiest wanted pool topped up, one small batch at a time, only
+    while the LLM gateway has a slot to spare for users.
+    """
+
+    def __init__(self, ai, size=QUESTION_POOL_SIZE, batch=QUESTION_POOL_BATCH):
+        self.ai = ai
+        self.size = size
+        self.batch = batch
+        self.pools = {}  # (kind, topic, level, language) -> deque of questions
+        self.wanted = {}  # key -> last time a handler asked for it
+        self._task = None
+        self._wakeup = None
+
+        self.requested = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.served = 0
+        self.fallbacks = 0
+        self.failed_calls = 0
+
+    def start(self):
+        if self._task is None and AI_QUESTION_POOL and os.getenv('OPENAI_API_KEY'):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            print(f"[OK] AI question pool started ({self.size} per topic, level and language)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        print(f"[INFO] AI question pool stats: {self.stats()}")
+
+    def take(self, kind, topic, level, language, count):
+        """Up to `count` ready questions for the key; never waits for the model"""
+        key = (kind, topic.lower(), level, language)
+        self.wanted[key] = time.monotonic()
+        pool = self.pools.setdefault(key, deque())
+        questions = [pool.popleft() for _ in range(min(count, len(pool)))]
+        self.served += len(questions)
+        self.fallbacks += count - len(questions)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return questions
+
+    def _next_key(self):
+        """The emptiest pool asked for recently that is not full, or None"""
+        now = time.monotonic()
+        candidates = [key for key, last in self.wanted.items()
+                      if now - last < POOL_IDLE_TIME and len(self.pools[key]) < self.size]
+        return min(candidates, key=lambda key: len(self.pools[key]), default=None)
+
+    def _gateway_busy(self):
+        # Keep one slot free so background work never makes a student wait
+        gateway = get_llm_gateway()
+        return gateway.in_flight + gateway.waiting >= gateway.max_concurrency - 1
+
+    async def _run(self):
+        delay = 0.0
+        while True:
+            key = self._next_key()
+            if key is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self._gateway_busy():
+                await asyncio.sleep(1)
+                continue
+
+            try:
+                await self.fill(key)
+                delay = 0.0
+            except Exception as e:
+                self.failed_calls += 1
+                delay = min(MAX_BACKOFF, delay * 2 or 5.0)
+                print(f"[ERROR] AI question pool fill failed for {key}, retrying in {delay:.0f}s: {e!r}")
+                await asyncio.sleep(delay)
+
+    async def fill(self, key):
+        """Generate one batch for the key and keep the questions that pass validation"""
+        kind, topic, level, language = key
+        questions = await self.ai.generate_ai_questions(kind, topic, level, language, self.batch)
+        pool = self.pools[key]
+        texts = {question['text'] for question in pool}
+        added = 0
+        for question in questions:
+            if question['text'] not in texts and len(pool) < self.size:
+                texts.add(question['text'])
+                pool.append(question)
+                added += 1
+        self.requested += self.batch
+        self.accepted += added
+        self.rejected += self.batch - added
+
+    def stats(self):
+        return {
+            'pools': len(self.pools),
+            'ready': sum(len(pool) for pool in self.pools.values()),
+            'fill': {'|'.join(key): f"{len(pool)}/{self.size}" for key, pool in self.pools.items()},
+            'requested': self.requested,
+            'accepted': self.accepted,
+            'rejection_rate': round(self.rejected / self.requested, 2) if self.requested else 0.0,
+            'served': self.served,
+            'dataset_fallbacks': self.fallbacks,
+            'failed_calls': self.failed_calls
+        }
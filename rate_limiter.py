@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# Priority classes: lower value is served first when requests queue up
+PRIORITY_READ = 0        # user-facing reads (get_user, resume lookups)
+PRIORITY_WRITE = 1       # writes the user is waiting on (quiz creation, lesson records)
+PRIORITY_BACKGROUND = 2  # deferred work (write-behind flushes)
+
+class RateLimiter:
+    """Token bucket shared by every Airtable request of the process.
+
+    Requests that cannot get a token right away wait in a priority queue; a 429 from
+    Airtable pauses the whole bucket so no other request makes it worse.
+    """
+
+    def __init__(self, rate=5.0, burst=5):
+        # With no token ever available every request would wait forever
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"rate limiter needs rate > 0 and burst >= 1, got rate={rate}, burst={burst}")
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._dispatcher = None
+
+        self.requests = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self):
+        if time.monotonic() < self._blocked_until:
+            return False
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority=PRIORITY_READ):
+        """Wait for a request slot; higher-priority waiters are released first"""
+        started = time.monotonic()
+        self.requests += 1
+        if not self._waiters and self._try_take():
+            return
+
+        self.queued += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await future
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    async def _dispatch(self):
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)  # caller was cancelled
+                continue
+            blocked_for = self._blocked_until - time.monotonic()
+            if blocked_for > 0:
+                await asyncio.sleep(blocked_for)
+                continue
+            if not self._try_take():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def pause(self, seconds):
+        """Stop releasing requests for `seconds` (after Airtable answered 429)"""
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'requests': self.requests,
+            'queued': self.queued,
+            'avg_wait_ms': round(self.total_wait / self.queued * 1000, 1) if self.queued else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+            'throttled_429': self.throttled,
+            'retries': self.retries
+        }
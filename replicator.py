@@ -0,0 +1,227 @@
+import os
+import time
+import asyncio
+from collections import namedtuple
+from rate_limiter import PRIORITY_BACKGROUND
+
+# With STORAGE_BACKEND=sqlite, local writes are copied to Airtable in the background
+# (set AIRTABLE_MIRROR=0 to keep everything local)
+AIRTABLE_MIRROR = os.getenv('AIRTABLE_MIRROR', '1') == '1'
+REPLICATION_INTERVAL = float(os.getenv('REPLICATION_INTERVAL', '5'))
+REPLICATION_BATCH = 100
+# Longest pause between attempts while Airtable is unreachable
+MAX_BACKOFF = 300.0
+
+# Local table -> Airtable table, in push order: records that others refer to go first
+AIRTABLE_TABLES = {'learning': 'Learning', 'quizzes': 'Quizzes', 'users': 'Users'}
+# Fields holding the record ID of another table; translated between local and Airtable IDs
+RECORD_ID_FIELDS = {'users': {'Active Lesson ID': 'learning'}}
+# Learning rows have no natural key, so each carries its local record ID in this field
+LOCAL_ID_FIELD = 'Local Record ID'
+# Fields that identify a record in Airtable. New records are upserted on them, so a create
+# whose reply was lost updates the record it made when the pass is retried instead of duplicating it
+MERGE_FIELDS = {'learning': [LOCAL_ID_FIELD], 'quizzes': ['Session ID', 'Question Number'], 'users': ['User ID']}
+
+# A record Airtable refused for good (bad field value, deleted record)
+Rejected = namedtuple('Rejected', 'status error')
+
+def _rejected(response):
+    # Auth and rate-limit errors concern every record, so they stall the mirror instead
+    return response is not None and 400 <= response.status_code < 500 and response.status_code not in (401, 403, 429)
+
+class AirtableReplicator:
+    """Streams SQLiteDB changes to Airtable so it stays an eventually consistent mirror.
+
+    Handlers only touch local storage. Each pass reads the change feed after the durable
+    cursor, upserts the latest state of every changed record in batches (on MERGE_FIELDS for
+    records not mirrored yet), and advances the cursor only when the whole pass landed, so an
+    outage just delays the mirror and a retried pass never creates a record twice. A record
+    Airtable rejects with a 4xx is dead-lettered and skipped rather than retried forever.
+    Before the first pass, existing Airtable Users are imported so returning students are
+    recognised instead of being created again.
+    """
+
+    def __init__(self, local_db, airtable_db, interval=REPLICATION_INTERVAL):
+        self.local = local_db
+        self.airtable = airtable_db
+        self.interval = interval
+        self._task = None
+
+        self.replicated = 0
+        self.failures = 0
+        self.last_success = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            print(f"[OK] Airtable mirror started (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        """Stop the loop, make one last pass and close the Airtable client"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            # Until the import has landed, local users may be fresh copies of Airtable ones
+            await self.import_users() and await self.sync_once()
+        except Exception as e:
+            print(f"[ERROR] Final Airtable mirror pass failed: {e!r}")
+        print(f"[INFO] Airtable mirror stats: {self.stats()}")
+        await self.airtable.close()
+
+    async def import_users(self):
+        """Adopt the Users already in Airtable, once per local database; returns True when done"""
+        if self.local.users_imported():
+            return True
+        records = await self.airtable._list_all_records('Users', priority=PRIORITY_BACKGROUND)
+        if records is None:
+            return False
+        for record in records:
+            record['fields'] = self._translate(record.get('fields', {}), 'users', self.local.get_local_ids)
+        added = self.local.import_users(records)
+        self.local.mark_users_imported()
+        print(f"[OK] Imported {added} of {len(records)} Airtable users into local storage")
+        return True
+
+    def _translate(self, fields, table, lookup):
+        """Map record ID fields through lookup; IDs without a counterpart are left out"""
+        id_fields = RECORD_ID_FIELDS.get(table, {})
+        ids = [fields[name] for name in id_fields if fields.get(name)]
+        if not ids:
+            return fields
+        mapped = lookup(ids)
+        fields = dict(fields)
+        for name in id_fields:
+            if fields.get(name):
+                if fields[name] in mapped:
+                    fields[name] = mapped[fields[name]]
+                else:
+                    del fields[name]
+        return fields
+
+    async def _run(self):
+        delay = self.interval
+        while True:
+            try:
+                ok = await self.import_users() and await self.sync_once()
+            except Exception as e:
+                print(f"[ERROR] Airtable mirror pass failed: {e!r}")
+                ok = False
+
+            if ok:
+                delay = self.interval
+                pending, _ = self.local.change_backlog(self.local.get_replication_cursor())
+                if pending:
+                    continue  # more than one batch was waiting
+            else:
+                self.failures += 1
+                delay = min(MAX_BACKOFF, delay * 2)
+                print(f"[INFO] Airtable mirror behind ({self.stats()}), retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    async def sync_once(self):
+        """Replicate up to REPLICATION_BATCH changes; returns True when all of them landed"""
+        cursor = self.local.get_replication_cursor()
+        changes = self.local.changes_since(cursor, REPLICATION_BATCH)
+        if not changes:
+            return True
+
+        changed = {}
+        for _, table, record_id, _ in changes:
+            changed.setdefault(table, set()).add(record_id)
+
+        ok = True
+        for table in AIRTABLE_TABLES:
+            if table in changed:
+                ok = await self._push(table, changed[table]) and ok
+
+        if ok:
+            self.local.set_replication_cursor(changes[-1][0])
+            self.replicated += len(changes)
+            self.last_success = time.time()
+        return ok
+
+    async def _push(self, table, record_ids):
+        """Upsert the current state of the given local records into Airtable.
+
+        Returns False if any record should be retried; rejected records count as done.
+        """
+        records = self.local.get_records(table, record_ids)
+        mirror_ids = self.local.get_mirror_ids(list(records))
+        airtable_table = AIRTABLE_TABLES[table]
+        fields = {record_id: self._translate(record['fields'], table, self.local.get_mirror_ids)
+                  for record_id, record in records.items()}
+        if LOCAL_ID_FIELD in MERGE_FIELDS[table]:
+            for record_id in fields:
+                fields[record_id] = {**fields[record_id], LOCAL_ID_FIELD: record_id}
+
+        new = [record_id for record_id in records if record_id not in mirror_ids]
+        existing = [record_id for record_id in records if record_id in mirror_ids]
+        created = await self._send(airtable_table, 'PATCH', [{'fields': fields[record_id]} for record_id in new],
+                                   merge_on=MERGE_FIELDS[table])
+        # PUT so fields cleared locally are cleared in Airtable too
+        updated = await self._send(airtable_table, 'PUT', [{'id': mirror_ids[record_id], 'fields': fields[record_id]}
+                                                           for record_id in existing])
+
+        ok = True
+        mapping = {}
+        for record_id, result in zip(new + existing, created + updated):
+            if isinstance(result, Rejected):
+                print(f"[ERROR] Airtable rejected {table} record {record_id} ({result.status}), skipped: {result.error}")
+                self.local.save_dead_letter(table, record_id, result.status, result.error)
+            elif result is None:
+                ok = False
+            elif record_id not in mirror_ids:
+                mapping[record_id] = result['id']
+        self.local.save_mirror_ids(mapping)
+        return ok
+
+    async def _send(self, airtable_table, method, payloads, merge_on=None):
+        """Send records in batches, as upserts on the merge_on fields when given. One result
+        per record: the Airtable record, a Rejected when Airtable refused it for good, or None
+        when it should be retried."""
+        from airtable_db import BATCH_SIZE, _error_text
+        chunks = [payloads[i:i + BATCH_SIZE] for i in range(0, len(payloads), BATCH_SIZE)]
+        upsert = {'performUpsert': {'fieldsToMergeOn': merge_on}} if merge_on else {}
+        responses = await asyncio.gather(*(
+            self.airtable._request(method, airtable_table, json={'records': chunk, **upsert}, priority=PRIORITY_BACKGROUND)
+            for chunk in chunks
+        ))
+
+        results = []
+        for chunk, response in zip(chunks, responses):
+            if response is not None and response.status_code == 200:
+                results.extend(response.json().get('records', []))
+            elif not _rejected(response):
+                print(f"Error sending {len(chunk)} {airtable_table} records: {_error_text(response)}")
+                results.extend([None] * len(chunk))
+            elif len(chunk) > 1:
+                # One bad record fails its whole batch; send them one at a time to find it
+                for payload in chunk:
+                    results.extend(await self._send(airtable_table, method, [payload], merge_on))
+            else:
+                results.append(Rejected(response.status_code, _error_text(response)))
+        return results
+
+    def stats(self):
+        pending, oldest = self.local.change_backlog(self.local.get_replication_cursor())
+        return {
+            'pending_changes': pending,
+            'lag_seconds': round(time.time() - oldest, 1) if oldest else 0.0,
+            'replicated': self.replicated,
+            'failed_passes': self.failures,
+            'dead_letters': self.local.dead_letter_count(),
+            'last_success_age': round(time.time() - self.last_success, 1) if self.last_success else None
+        }
+
+def create_replicator(db):
+    """Airtable mirror for a SQLiteDB, or None when the bot runs on Airtable or mirroring is off"""
+    from sqlite_db import SQLiteDB
+    if not isinstance(db, SQLiteDB) or not AIRTABLE_MIRROR or not os.getenv('AIRTABLE_API_KEY'):
+        return None
+    from airtable_db import AirtableDB
+    return AirtableReplicator(db, AirtableDB())
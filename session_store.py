@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import sqlite3
+
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+# Sessions untouched for this long are not restored after a restart
+SESSION_MAX_AGE = int(os.getenv('SESSION_MAX_AGE', str(7 * 24 * 3600)))
+
+def _restorable(session):
+    # Only a quiz or lesson under way can be shown again after a restart. Question-less stubs
+    # (onboarding steps, a pending reminder time) and a completed lesson, which stays in memory
+    # until the student picks what comes next, are not worth keeping
+    if not session.get('questions') or session.get('completed'):
+        return False
+    return not ('current_task' in session and session['current_task'] >= len(session['questions']))
+
+def _decode(data):
+    session = json.loads(data)
+    # JSON object keys are strings; handlers look question record IDs up by int
+    if 'quiz_record_ids' in session:
+        session['quiz_record_ids'] = {int(number): record_id for number, record_id in session['quiz_record_ids'].items()}
+    return session
+
+class SessionStore(dict):
+    """The bot_data['user_sessions'] dict, persisted to SQLite so a restart keeps live quizzes and lessons.
+
+    Assigning or removing a session is written through immediately. Handlers that change a
+    session in place call save(user_id) afterwards to snapshot it.
+    """
+
+    def __init__(self, path=None, max_age=SESSION_MAX_AGE):
+        super().__init__()
+        started = time.perf_counter()
+        self.conn = sqlite3.connect(path or SESSION_DB_PATH, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Kept for the whole program, unlike sessions, so questions are not repeated across days
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_questions (user_id TEXT PRIMARY KEY, checksum INTEGER NOT NULL, bits BLOB NOT NULL)"
+        )
+        with self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+
+        for user_id, data in self.conn.execute("SELECT user_id, data FROM sessions"):
+            try:
+                session = _decode(data)
+            except (ValueError, json.JSONDecodeError) as e:
+                print(f"Skipping unreadable session for {user_id}: {e}")
+                continue
+            if _restorable(session):
+                super().__setitem__(int(user_id), session)
+        print(f"[OK] Restored {len(self)} sessions in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def __setitem__(self, user_id, session):
+        super().__setitem__(user_id, session)
+        self.save(user_id)
+
+    def __delitem__(self, user_id):
+        super().__delitem__(user_id)
+        self._delete(user_id)
+
+    def pop(self, user_id, *default):
+        session = super().pop(user_id, *default)
+        self._delete(user_id)
+        return session
+
+    def save(self, user_id):
+        """Snapshot a session after it was changed in place; ones not worth restoring are dropped from disk"""
+        session = self.get(user_id)
+        if session is None:
+            return
+        if not _restorable(session):
+            self._delete(user_id)
+            return
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (str(user_id), json.dumps(session), time.time())
+            )
+
+    def load_seen(self, user_id, bank):
+        """The student's SeenQuestions for this question bank (empty if none were stored)"""
+        from question_bank import SeenQuestions
+        row = self.conn.execute("SELECT checksum, bits FROM seen_questions WHERE user_id = ?", (str(user_id),)).fetchone()
+        if row is None:
+            return SeenQuestions(bank)
+        return SeenQuestions.from_bytes(bank, row[1], row[0])
+
+    def save_seen(self, user_id, seen):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO seen_questions (user_id, checksum, bits) VALUES (?, ?, ?)",
+                (str(user_id), seen.checksum, seen.to_bytes())
+            )
+
+    def _delete(self, user_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE user_id = ?", (str(user_id),))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+from storage import Storage
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'bomi.db')
+
+# One table per Airtable table. Each row keeps the Airtable-style record ID and the full
+# fields dict as JSON; the columns the bot filters on are copied out so lookups use an index.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    user_id TEXT UNIQUE,
+    fields TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS learning (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS learning_user ON learning (user_id);
+CREATE TABLE IF NOT EXISTS quizzes (
+    id TEXT PRIMARY KEY,
+    session_id TEXT,
+    user_id TEXT,
+    question_number INTEGER,
+    lesson_day TEXT,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quizzes_session ON quizzes (session_id, question_number);
+CREATE INDEX IF NOT EXISTS quizzes_lesson ON quizzes (user_id, lesson_day);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mirror_ids (
+    record_id TEXT PRIMARY KEY,
+    airtable_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS replication (
+    name TEXT PRIMARY KEY,
+    cursor INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    status INTEGER,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+# Table -> indexed column -> Airtable field it mirrors
+INDEXED_FIELDS = {
+    'users': {'user_id': 'User ID'},
+    'learning': {'user_id': 'User ID'},
+    'quizzes': {
+        'session_id': 'Session ID',
+        'user_id': 'User ID',
+        'question_number': 'Question Number',
+        'lesson_day': 'Lesson Day'
+    }
+}
+
+def _new_record_id():
+    """Record IDs shaped like Airtable's ('rec' + 14 characters)"""
+    return 'rec' + uuid.uuid4().hex[:14]
+
+def _clean_fields(fields):
+    """Airtable drops empty values from records; do the same so callers see identical shapes"""
+    return {name: value for name, value in fields.items() if value not in ('', None)}
+
+class SQLiteDB(Storage):
+    """Embedded storage with the AirtableDB interface, for running the bot without Airtable.
+
+    Reads and writes are local and take well under a millisecond, so they run inline on the
+    event loop. WAL mode lets scripts read the file while the bot writes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        print(f"[OK] SQLite storage ready at {self.path}")
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _row_to_record(self, row):
+        return {'id': row[0], 'fields': json.loads(row[1])} if row else None
+
+    def _select(self, table, where='', params=(), order='rowid'):
+        rows = self.conn.execute(
+            f"SELECT id, fields FROM {table} {('WHERE ' + where) if where else ''} ORDER BY {order}",
+            params
+        ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def _get(self, table, record_id):
+        row = self.conn.execute(f"SELECT id, fields FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        return self._row_to_record(row)
+
+    def _write(self, table, record_id, fields, insert=False, log=True):
+        columns = INDEXED_FIELDS[table]
+        names = ['fields', *columns]
+        values = [json.dumps(fields), *(fields.get(field) for field in columns.values())]
+        if insert:
+            self.conn.execute(
+                f"INSERT INTO {table} (id, {', '.join(names)}) VALUES (?, {', '.join('?' * len(names))})",
+                [record_id, *values]
+            )
+        else:
+            self.conn.execute(
+                f"UPDATE {table} SET {', '.join(name + ' = ?' for name in names)} WHERE id = ?",
+                [*values, record_id]
+            )
+        # Same transaction as the write, so the Airtable mirror never misses a change
+        if log:
+            self.conn.execute("INSERT INTO changes (tbl, record_id, changed_at) VALUES (?, ?, ?)",
+                              (table, record_id, time.time()))
+
+    def _insert_many(self, table, fields_list):
+        records = [{'id': _new_record_id(), 'fields': _clean_fields(fields)} for fields in fields_list]
+        with self.conn:
+            for record in records:
+                self._write(table, record['id'], record['fields'], insert=True)
+        return records
+
+    def _update_many(self, table, updates):
+        """Merge fields into existing records in one transaction; returns the updated records"""
+        updated = []
+        with self.conn:
+            for record_id, fields in updates:
+                record = self._get(table, record_id)
+                if not record:
+                    print(f"No {table} record {record_id} to update")
+                    continue
+                merged = {**record['fields'], **fields}
+                record['fields'] = _clean_fields(merged)
+                self._write(table, record_id, record['fields'])
+                updated.append(record)
+        return updated
+
+    async def get_user(self, user_id):
+        records = self._select('users', 'user_id = ?', (str(user_id),))
+        return records[0] if records else None
+
+    async def create_user(self, user_id, full_name, username, chat_id):
+        fields = {
+            "User ID": str(user_id),
+            "Full Name": full_name,
+            "Username": username,
+            "Telegram Chat ID": str(chat_id),
+            "Learning Status": "Not Started",
+            "Last Active": datetime.now().isoformat()
+        }
+        try:
+            return self._insert_many('users', [fields])[0]
+        except sqlite3.IntegrityError:
+            print(f"User {user_id} already exists")
+            return await self.get_user(user_id)
+
+    async def update_user(self, record_id, fields):
+        updated = self._update_many('users', [(record_id, fields)])
+        return updated[0] if updated else None
+
+    async def create_quiz_session(self, user_id, questions, lesson_day=None):
+        session_id = self.new_quiz_session_id(user_id)
+        created = self._insert_many('quizzes', self.quiz_question_fields(session_id, user_id, questions, lesson_day))
+        record_ids = {i + 1: record['id'] for i, record in enumerate(created)}
+        print(f"Created {len(record_ids)}/{len(questions)} questions for {session_id}")
+        return session_id, record_ids
+
+    async def update_quiz_answer(self, quiz_id, user_answer, score, feedback, is_last=False, record_id=None):
+        session_id = quiz_id.split('_q')[0]
+        question_num = int(quiz_id.split('_q')[1])
+
+        if not record_id:
+            records = self._select('quizzes', 'session_id = ? AND question_number = ?', (session_id, question_num))
+            if not records:
+                print(f"No record found for quiz_id: {quiz_id}")
+                return
+            record_id = records[0]['id']
+
+        fields = {
+            "User Answer": user_answer,
+            "Score": score,
+            "AI Feedback": feedback,
+            "Last Updated": datetime.now().isoformat()
+        }
+        if is_last:
+            fields["Session Status"] = "Completed"
+        self._update_many('quizzes', [(record_id, fields)])
+
+    async def update_quiz_feedback(self, record_id, feedback):
+        self._update_many('quizzes', [(record_id, {"AI Feedback": feedback, "Last Updated": datetime.now().isoformat()})])
+
+    async def complete_quiz_session(self, session_id, final_score, record_ids=None):
+        if record_ids:
+            ids = list(record_ids.values())
+        else:
+            ids = [record['id'] for record in self._select('quizzes', 'session_id = ?', (session_id,))]
+
+        now = datetime.now().isoformat()
+        self._update_many('quizzes', [
+            (record_id, {"Session Status": "Completed", "Final Score": final_score, "Last Updated": now})
+            for record_id in ids
+        ])
+        print(f"Quiz session completed with score: {final_score}%")
+
+    async def record_quiz_answers(self, session_id, answers, final_score=None, record_ids=None):
+        known = record_ids or {}
+        missing = any(not answer.get('record_id') and number not in known for number, answer in answers.items())
+        if missing or (final_score is not None and not known):
+            known = {**self.quiz_record_ids(self._select('quizzes', 'session_id = ?', (session_id,))), **known}
+
+        updates = self.quiz_answer_updates(answers, known, final_score)
+        self._update_many('quizzes', list(updates.items()))
+        if final_score is not None:
+            print(f"Quiz session completed with score: {final_score}%")
+        return True
+
+    async def get_quiz_records(self, session_id):
+        return self._select('quizzes', 'session_id = ?', (session_id,), order='question_number')
+
+    async def get_lesson_quiz_records(self, user_id, day):
+        return self._select('quizzes', 'user_id = ? AND lesson_day = ?', (str(user_id), str(day)), order='question_number')
+
+    async def create_learning_record(self, user_id, day, topic, theory_summary=""):
+        record = self._insert_many('learning', [{
+            "User ID": str(user_id),
+            "Day": str(day),
+            "Topic": topic,
+            "Theory Summary": theory_summary,
+            "Lesson Score": "0",
+            "Last Updated": datetime.now().isoformat()
+        }])[0]
+        return record['id']
+
+    async def create_lesson_record(self, fields):
+        return self._insert_many('learning', [fields])[0]['id']
+
+    async def get_learning_record(self, record_id):
+        return self._get('learning', record_id)
+
+    async def get_learning_records(self, user_id):
+        return self._select('learning', 'user_id = ?', (str(user_id),))
+
+    async def update_learning_record(self, record_id, fields):
+        updated = self._update_many('learning', [(record_id, fields)])
+        return updated[0] if updated else None
+
+    # Change feed for the Airtable mirror (replicator.py)
+
+    def get_replication_cursor(self, name='airtable'):
+        row = self.conn.execute("SELECT cursor FROM replication WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def set_replication_cursor(self, seq, name='airtable'):
+        """Persist the cursor and forget the changes it has passed"""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO replication (name, cursor) VALUES (?, ?)", (name, seq))
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq,))
+
+    def changes_since(self, seq, limit=100):
+        """[(seq, table, record_id, changed_at)] logged after seq, oldest first"""
+        return self.conn.execute(
+            "SELECT seq, tbl, record_id, changed_at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, limit)
+        ).fetchall()
+
+    def change_backlog(self, seq):
+        """(pending change count, oldest pending change time or None) after seq"""
+        return self.conn.execute("SELECT COUNT(*), MIN(changed_at) FROM changes WHERE seq > ?", (seq,)).fetchone()
+
+    def get_records(self, table, record_ids):
+        """Current state of several records of one table, keyed by record ID"""
+        if not record_ids:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT id, fields FROM {table} WHERE id IN ({', '.join('?' * len(record_ids))})", list(record_ids)
+        ).fetchall()
+        return {row[0]: self._row_to_record(row) for row in rows}
+
+    def get_mirror_ids(self, record_ids):
+        """Local record ID -> Airtable record ID for records already copied to Airtable"""
+        if not record_ids:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT record_id, airtable_id FROM mirror_ids WHERE record_id IN ({', '.join('?' * len(record_ids))})",
+            list(record_ids)
+        ).fetchall()
+        return dict(rows)
+
+    def save_mirror_ids(self, mapping):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO mirror_ids (record_id, airtable_id) VALUES (?, ?)",
+                                  list(mapping.items()))
+
+    def get_local_ids(self, airtable_ids):
+        """Airtable record ID -> local record ID for records that are mirrored"""
+        if not airtable_ids:
+            return {}
+        rows = self.conn.execute(
+            f"SELECT airtable_id, record_id FROM mirror_ids WHERE airtable_id IN ({', '.join('?' * len(airtable_ids))})",
+            list(airtable_ids)
+        ).fetchall()
+        return dict(rows)
+
+    def users_imported(self):
+        return self.conn.execute("SELECT 1 FROM replication WHERE name = 'users_import'").fetchone() is not None
+
+    def mark_users_imported(self):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO replication (name, cursor) VALUES ('users_import', 1)")
+
+    def import_users(self, records):
+        """Adopt Airtable Users records as already-mirrored local users, without logging changes.
+
+        A student who already has a local record (created while the import was still failing)
+        keeps it, linked to the Airtable one and merged with the Airtable fields, which win;
+        the merged record is logged so the mirror writes it back. Returns the number of users added.
+        """
+        added = 0
+        mapping = {}
+        with self.conn:
+            for record in records:
+                fields = _clean_fields(record.get('fields', {}))
+                if not fields.get('User ID'):
+                    continue
+                row = self.conn.execute("SELECT id, fields FROM users WHERE user_id = ?", (str(fields['User ID']),)).fetchone()
+                if row:
+                    # The local record only holds what happened since; the Airtable one has the progress
+                    self._write('users', row[0], _clean_fields({**json.loads(row[1]), **fields}))
+                    mapping[row[0]] = record['id']
+                    continue
+                record_id = _new_record_id()
+                self._write('users', record_id, fields, insert=True, log=False)
+                mapping[record_id] = record['id']
+                added += 1
+            self.conn.executemany("INSERT OR REPLACE INTO mirror_ids (record_id, airtable_id) VALUES (?, ?)",
+                                  list(mapping.items()))
+        return added
+
+    def save_dead_letter(self, table, record_id, status, error):
+        """Keep a change Airtable refused for good, so the mirror can move past it"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO dead_letters (tbl, record_id, status, error, failed_at) VALUES (?, ?, ?, ?, ?)",
+                (table, record_id, status, error, time.time())
+            )
+
+    def dead_letter_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
@@ -2,7 +2,13 @@ import os
 import requests
 from dotenv import load_dotenv
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from airtable_db import AirtableDB
+from storage import create_db, STORAGE_BACKEND
+from replicator import create_replicator
+from ai_content import get_content_generator
+from session_store import SessionStore
+from write_queue import UserWriteQueue
+from answer_ledger import AnswerLedger
+from llm_gateway import get_llm_gateway
 
 # Import handlers
 from handlers.start import start
@@ -16,6 +22,9 @@ from handlers.completion import handle_extra_practice, handle_view_stats, handle
 
 load_dotenv()
 
+# Updates handled at the same time; per-user guards (processing, user_sessions) stop re-entry
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
 def clear_webhook():
     """Clear any existing webhook"""
     token = os.getenv('BOT_TOKEN')
@@ -26,6 +35,32 @@ def clear_webhook():
     except:
         pass
 
+async def post_init(app):
+    """Start mirroring local storage to Airtable when running on SQLite, the AI question pool and idle quiz flushes"""
+    replicator = create_replicator(app.bot_data['db'])
+    if replicator:
+        # Before serving anyone, so returning students are found locally; retried by the loop on failure
+        await replicator.import_users()
+        replicator.start()
+        app.bot_data['replicator'] = replicator
+    app.bot_data['ai'].question_pool.start()
+    app.bot_data['answer_ledger'].start(app.bot_data['db'])
+
+async def shutdown(app):
+    """Release pooled Airtable connections when polling stops"""
+    replicator = app.bot_data.get('replicator')
+    if replicator:
+        await replicator.stop()
+    await app.bot_data['ai'].question_pool.stop()
+    await app.bot_data['write_queue'].flush()
+    print(f"[INFO] Write queue stats: {app.bot_data['write_queue'].stats()}")
+    await app.bot_data['answer_ledger'].stop()
+    app.bot_data['answer_ledger'].close()
+    await app.bot_data['db'].close()
+    app.bot_data['user_sessions'].close()
+    print(f"[INFO] LLM gateway stats: {get_llm_gateway().stats()}")
+    print(f"[INFO] Theory cache stats: {app.bot_data['ai'].theory_cache.stats()}")
+
 def main():
     print("[INFO] Starting BOMI DTM Bot...")
     
@@ -33,13 +68,16 @@ def main():
     clear_webhook()
     
     token = os.getenv('BOT_TOKEN')
-    app = Application.builder().token(token).build()
+    app = Application.builder().token(token).concurrent_updates(CONCURRENT_UPDATES).post_init(post_init).post_shutdown(shutdown).build()
     
     # Initialize bot data
-    app.bot_data['db'] = AirtableDB()
-    app.bot_data['user_sessions'] = {}
+    app.bot_data['db'] = create_db()
+    app.bot_data['user_sessions'] = SessionStore()
     app.bot_data['processing'] = set()
-    print("[OK] Bot initialized with Airtable database")
+    app.bot_data['write_queue'] = UserWriteQueue()
+    app.bot_data['answer_ledger'] = AnswerLedger()
+    app.bot_data['ai'] = get_content_generator()
+    print(f"[OK] Bot initialized with {STORAGE_BACKEND} database")
     
     # Command handlers
     app.add_handler(CommandHandler('start', start))
@@ -1,13 +1,10 @@
-from airtable_db import AirtableDB
-import requests
-
 class StateManager:
     def __init__(self, db):
         self.db = db
     
-    def get_user_state(self, user_id):
+    async def get_user_state(self, user_id):
         """Get user's current state and resume point"""
-        user = self.db.get_user(user_id)
+        user = await self.db.get_user(user_id)
         if not user:
             return None
         
@@ -18,14 +15,14 @@ class StateManager:
         # Check for incomplete quiz (diagnostic or lesson)
         active_quiz_id = user_data.get('Active Quiz Session ID', '')
         if active_quiz_id:
-            quiz_state = self._get_quiz_state(user_id, active_quiz_id)
+            quiz_state = await self._get_quiz_state(user_id, active_quiz_id, user_data)
             if quiz_state:
                 return quiz_state
         
         # Check for incomplete lesson
         active_lesson_id = user_data.get('Active Lesson ID', '')
         if active_lesson_id:
-            lesson_state = self._get_lesson_state(user_id, active_lesson_id)
+            lesson_state = await self._get_lesson_state(user_id, active_lesson_id, user_data)
             if lesson_state:
                 return lesson_state
         
@@ -55,20 +52,10 @@ class StateManager:
             'data': user_data
         }
     
-    def _get_quiz_state(self, user_id, session_id):
+    async def _get_quiz_state(self, user_id, session_id, user_data):
         """Check incomplete quiz state"""
         # Get quiz questions
-        quiz_filter = f"{{Session ID}}='{session_id}'"
-        response = requests.get(
-            f"https://api.airtable.com/v0/{self.db.base_id}/tblQuizzes",
-            headers=self.db.headers,
-            params={'filterByFormula': quiz_filter}
-        )
-        
-        if response.status_code != 200:
-            return None
-        
-        records = response.json().get('records', [])
+        records = await self.db.get_quiz_records(session_id)
         if not records:
             return None
         
@@ -107,20 +94,16 @@ class StateManager:
             'current_question': answered_count,
             'total_questions': len(records),
             'next_question': unanswered_questions[0],
-            'language': self.db.get_user(user_id).get('fields', {}).get('Language', 'en')
+            'language': user_data.get('Language', 'en')
         }
     
-    def _get_lesson_state(self, user_id, lesson_id):
+    async def _get_lesson_state(self, user_id, lesson_id, user_data):
         """Check incomplete lesson state"""
-        response = requests.get(
-            f"https://api.airtable.com/v0/{self.db.base_id}/tblInFtIh5fZt59g4/{lesson_id}",
-            headers=self.db.headers
-        )
-        
-        if response.status_code != 200:
+        record = await self.db.get_learning_record(lesson_id)
+        if not record:
             return None
         
-        lesson = response.json().get('fields', {})
+        lesson = record.get('fields', {})
         if lesson.get('Lesson Status') == 'Completed':
             return None
         
@@ -130,15 +113,9 @@ class StateManager:
         topic = lesson.get('Topic', '')
         
         # Get associated quiz questions
-        quiz_filter = f"AND({{User ID}}='{user_id}', {{Lesson Day}}={day})"
-        quiz_response = requests.get(
-            f"https://api.airtable.com/v0/{self.db.base_id}/tblQuizzes",
-            headers=self.db.headers,
-            params={'filterByFormula': quiz_filter}
-        )
-        
-        if quiz_response.status_code == 200:
-            quiz_records = quiz_response.json().get('records', [])
+        quiz_records = await self.db.get_lesson_quiz_records(user_id, day)
+        
+        if quiz_records is not None:
             if quiz_records:
                 session_id = quiz_records[0].get('fields', {}).get('Session ID', '')
                 
@@ -149,7 +126,7 @@ class StateManager:
                     'topic': topic,
                     'current_task': current_task_index - 1,
                     'session_id': session_id,
-                    'language': self.db.get_user(user_id).get('fields', {}).get('Language', 'en')
+                    'language': user_data.get('Language', 'en')
                 }
         
         return None
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Which datastore the bot runs on: 'airtable' (default) or 'sqlite'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'airtable')
+
+class Storage(ABC):
+    """Users / Learning / Quizzes operations used by the handlers, StateManager and LevelProgression.
+
+    Every backend returns Airtable-shaped records, {'id': record_id, 'fields': {...}},
+    so callers do not care where the data lives. A backend missing one of these methods
+    cannot be instantiated.
+    """
+
+    @abstractmethod
+    async def get_user(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_user(self, user_id, full_name, username, chat_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_user(self, record_id, fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_quiz_session(self, user_id, questions, lesson_day=None):
+        """Returns (session_id, record_ids) where record_ids maps question number to record ID"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_quiz_answer(self, quiz_id, user_answer, score, feedback, is_last=False, record_id=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_quiz_feedback(self, record_id, feedback):
+        """Attach feedback to an answered question after the fact"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def complete_quiz_session(self, session_id, final_score, record_ids=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def record_quiz_answers(self, session_id, answers, final_score=None, record_ids=None):
+        """Store many answers of one session in one batched update; returns True on success.
+
+        answers maps question number -> {'record_id', 'answer', 'score', 'feedback'}. With
+        final_score every question of the session is also marked completed.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_quiz_records(self, session_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_lesson_quiz_records(self, user_id, day):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_learning_record(self, user_id, day, topic, theory_summary=""):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_lesson_record(self, fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_learning_record(self, record_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_learning_records(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_learning_record(self, record_id, fields):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def quiz_record_ids(records):
+        """Question number -> record ID map rebuilt from stored quiz records"""
+        return {record['fields']['Question Number']: record['id']
+                for record in records if 'Question Number' in record.get('fields', {})}
+
+    @staticmethod
+    def quiz_answer_updates(answers, record_ids, final_score=None, now=None):
+        """Record ID -> fields for record_quiz_answers, merging answers and completion"""
+        now = now or datetime.now().isoformat()
+        updates = {}
+        if final_score is not None:
+            for record_id in record_ids.values():
+                updates[record_id] = {"Session Status": "Completed", "Final Score": final_score, "Last Updated": now}
+        for question_number, answer in answers.items():
+            record_id = answer.get('record_id') or record_ids.get(question_number)
+            if record_id is None:
+                continue
+            fields = updates.setdefault(record_id, {"Last Updated": now})
+            fields["User Answer"] = answer['answer']
+            fields["Score"] = answer['score']
+            # Left out when empty so feedback attached separately is not cleared
+            if answer.get('feedback'):
+                fields["AI Feedback"] = answer['feedback']
+        return updates
+
+    @staticmethod
+    def new_quiz_session_id(user_id):
+        return f"quiz_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    @staticmethod
+    def quiz_question_fields(session_id, user_id, questions, lesson_day=None):
+        """Quizzes rows for a new session, one per question"""
+        now = datetime.now().isoformat()
+        fields_list = []
+        for i, question in enumerate(questions):
+            fields = {
+                "Session ID": session_id,
+                "User ID": str(user_id),
+                "Question Number": i + 1,
+                "Question Text": question['text'],
+                "Option A": question['options'][0],
+                "Option B": question['options'][1],
+                "Option C": question['options'][2],
+                "Option D": question['options'][3],
+                "Correct Answer": question['correct'],
+                "Question Topic": question.get('topic', 'general'),
+                "Last Updated": now
+            }
+
+            if lesson_day:
+                fields["Lesson Day"] = str(lesson_day)
+
+            fields_list.append(fields)
+        return fields_list
+
+def create_db(backend=None):
+    """Build the datastore selected by STORAGE_BACKEND"""
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == 'sqlite':
+        from sqlite_db import SQLiteDB
+        return SQLiteDB()
+    if backend == 'airtable':
+        from airtable_db import AirtableDB
+        return AirtableDB()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (expected 'airtable' or 'sqlite')")
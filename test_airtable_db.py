@@ -0,0 +1,160 @@
+import time
+import asyncio
+import httpx
+import airtable_db
+from airtable_db import UserCache
+
+QUESTIONS = [
+    {'text': f"Question {i}", 'options': ('1', '2', '3', '4'), 'correct': 'C', 'topic': 'geometry'}
+    for i in range(12)
+]
+
+async def test_quiz_session_batches(airtable):
+    """Quiz questions are created ten per request, with their record IDs returned by number"""
+    db, fake = airtable
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS, lesson_day=2)
+
+    assert fake.requests == [('POST', 'Quizzes', None)] * 2
+    assert list(record_ids) == list(range(1, 13))
+    for number, record_id in record_ids.items():
+        fields = fake.records['Quizzes'][record_id]
+        assert (fields['Session ID'], fields['Question Number'], fields['Lesson Day']) == (session_id, number, '2')
+    await db.close()
+
+async def test_quiz_session_failed_batch(airtable):
+    """A failed batch leaves its questions out of the record ID map instead of failing the quiz"""
+    db, fake = airtable
+    fake.fail(422)
+    _, record_ids = await db.create_quiz_session(42, QUESTIONS)
+    assert sorted(record_ids) in (list(range(1, 11)), [11, 12])
+    assert len(fake.records['Quizzes']) == len(record_ids)
+    await db.close()
+
+async def test_answer_by_record_id(airtable):
+    """With the record ID from create_quiz_session an answer is one PATCH, without it a lookup first"""
+    db, fake = airtable
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS[:3])
+    fake.requests.clear()
+
+    await db.update_quiz_answer(f"{session_id}_q1", 'C', 1, "Correct", record_id=record_ids[1])
+    assert fake.requests == [('PATCH', 'Quizzes', record_ids[1])]
+
+    fake.requests.clear()
+    await db.update_quiz_answer(f"{session_id}_q2", 'A', 0, "Check the sign", is_last=True)
+    assert fake.requests == [('GET', 'Quizzes', None), ('PATCH', 'Quizzes', record_ids[2])]
+    fields = fake.records['Quizzes'][record_ids[2]]
+    assert (fields['User Answer'], fields['Score'], fields['Session Status']) == ('A', 0, 'Completed')
+    await db.close()
+
+def test_user_cache_ttl_and_lru():
+    """Entries expire after the TTL and the least recently used one is evicted first"""
+    cache = UserCache(ttl=60, max_size=2)
+    for user_id in (1, 2):
+        cache.put({'id': f'rec{user_id}', 'fields': {'User ID': str(user_id)}})
+    assert cache.get(1)['id'] == 'rec1'  # 2 is now the least recently used
+    cache.put({'id': 'rec3', 'fields': {'User ID': '3'}})
+    assert cache.get(2) is None
+    assert cache.get('1')['id'] == 'rec1'
+
+    assert cache.merge_fields('rec3', {'Level': 'Advanced'})['fields'] == {'User ID': '3', 'Level': 'Advanced'}
+    assert cache.get(3)['fields']['Level'] == 'Advanced'
+    cache.invalidate_record('rec3')
+    assert cache.get(3) is None
+
+    cache.ttl = 0
+    cache.put({'id': 'rec4', 'fields': {'User ID': '4'}})
+    time.sleep(0.001)
+    assert cache.get(4) is None
+    assert cache.stats()['hits'] == 3
+
+async def test_get_user_cached(airtable):
+    """A user is read from Airtable once, and updates refresh the cached record"""
+    db, fake = airtable
+    created = await db.create_user(42, "Test Student", "student", 4242)
+    assert await db.get_user(42) == created
+    assert fake.requests == [('POST', 'Users', None)]
+
+    await db.update_user(created['id'], {'Level': 'Intermediate'})
+    assert (await db.get_user(42))['fields']['Level'] == 'Intermediate'
+    assert [request[0] for request in fake.requests] == ['POST', 'PATCH']
+
+    db.user_cache.invalidate_record(created['id'])
+    assert (await db.get_user(42))['fields']['Level'] == 'Intermediate'
+    assert fake.requests[-1] == ('GET', 'Users', None)
+    assert await db.get_user(43) is None
+    await db.close()
+
+async def test_write_behind_coalesces(airtable, monkeypatch):
+    """Trivial Users updates are buffered and sent together in one batched PATCH"""
+    monkeypatch.setattr(airtable_db, 'USER_WRITE_BEHIND_SECONDS', 0.01)
+    db, fake = airtable
+    first = await db.create_user(1, "First", "first", 1)
+    second = await db.create_user(2, "Second", "second", 2)
+    fake.requests.clear()
+
+    await db.update_user(first['id'], {'Last Active': 'monday'})
+    await db.update_user(first['id'], {'Mode': 'idle'})
+    await db.update_user(second['id'], {'Last Active': 'tuesday'})
+    assert fake.requests == []
+    assert (await db.get_user(1))['fields']['Mode'] == 'idle'
+
+    await asyncio.sleep(0.05)
+    assert fake.requests == [('PATCH', 'Users', None)]
+    assert fake.records['Users'][first['id']]['Mode'] == 'idle'
+    assert fake.records['Users'][second['id']]['Last Active'] == 'tuesday'
+    await db.close()
+
+async def test_write_behind_rides_along(airtable, monkeypatch):
+    """An update that must go out now carries the user's buffered fields in the same PATCH"""
+    monkeypatch.setattr(airtable_db, 'USER_WRITE_BEHIND_SECONDS', 0.01)
+    db, fake = airtable
+    user = await db.create_user(1, "First", "first", 1)
+    fake.requests.clear()
+
+    await db.update_user(user['id'], {'Last Active': 'monday'})
+    await db.update_user(user['id'], {'Level': 'Beginner'})
+    await asyncio.sleep(0.05)
+    assert fake.requests == [('PATCH', 'Users', user['id'])]
+    assert fake.records['Users'][user['id']]['Last Active'] == 'monday'
+    await db.close()
+
+async def test_write_behind_flushes_late_updates(airtable, monkeypatch):
+    """Updates buffered while a flush is in flight, or still waiting at close, are sent too"""
+    monkeypatch.setattr(airtable_db, 'USER_WRITE_BEHIND_SECONDS', 0.01)
+    db, fake = airtable
+    user = await db.create_user(1, "First", "first", 1)
+    fake.latency = 0.05
+
+    await db.update_user(user['id'], {'Last Active': 'monday'})
+    await asyncio.sleep(0.03)  # the first flush is waiting for Airtable
+    await db.update_user(user['id'], {'Mode': 'late'})
+    await asyncio.sleep(0.15)
+    assert fake.records['Users'][user['id']]['Mode'] == 'late'
+
+    fake.latency = 0
+    await db.update_user(user['id'], {'Expected': 'none'})
+    await db.close()
+    assert fake.records['Users'][user['id']]['Expected'] == 'none'
+
+async def test_retries(airtable):
+    """429s and 5xx are retried; a create is retried only when it never reached Airtable"""
+    db, fake = airtable
+    fake.fail(httpx.Response(429, headers={'Retry-After': '0'}))
+    assert (await db.create_user(1, "First", "first", 1))['fields']['User ID'] == '1'
+    fake.fail(503)
+    assert await db.create_user(4, "Fourth", "fourth", 4) is None  # a POST 5xx may have landed
+    assert [request[0] for request in fake.requests] == ['POST', 'POST', 'POST']
+
+    fake.records['Users'].clear()
+    fake.requests.clear()
+    fake.fail(httpx.ConnectError("refused"))
+    assert await db.create_user(2, "Second", "second", 2)
+    fake.fail(httpx.ReadTimeout("no answer"))
+    assert await db.create_user(3, "Third", "third", 3) is None
+    assert [request[0] for request in fake.requests] == ['POST', 'POST', 'POST']
+    assert len(fake.records['Users']) == 1
+
+    fake.fail(503, httpx.ReadTimeout("no answer"))
+    assert await db.get_user(2)
+    assert db.rate_limiter.stats()['throttled_429'] == 1
+    await db.close()
@@ -0,0 +1,91 @@
+from answer_ledger import AnswerLedger
+from sqlite_db import SQLiteDB
+
+QUESTIONS = [
+    {'text': f"Question {i}", 'options': ('1', '2', '3', '4'), 'correct': 'A', 'topic': 'general'}
+    for i in range(3)
+]
+
+class FlakyDB(SQLiteDB):
+    """SQLite storage whose first `failures` batched answer writes fail"""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+        self.batches = []
+
+    async def record_quiz_answers(self, session_id, answers, final_score=None, record_ids=None):
+        self.batches.append((dict(answers), final_score))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("storage unavailable")
+        return await super().record_quiz_answers(session_id, answers, final_score, record_ids)
+
+async def test_complete(tmp_path):
+    """Completing a quiz stores every answer and the final score in one batch"""
+    db = FlakyDB(str(tmp_path / 'bomi.db'), failures=0)
+    ledger = AnswerLedger(str(tmp_path / 'answers.db'))
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS)
+
+    ledger.record(session_id, 1, 'B', 0, 'Check the sign', record_ids[1])
+    ledger.record(session_id, 1, 'A', 1, '', record_ids[1])  # a later answer to the same question wins
+    ledger.record(session_id, 2, 'A', 1)
+    assert db.batches == []
+
+    assert await ledger.complete(db, session_id, 66.7, record_ids)
+    assert len(db.batches) == 1
+    fields = [record['fields'] for record in await db.get_quiz_records(session_id)]
+    assert (fields[0]['User Answer'], fields[0]['Score']) == ('A', 1)
+    assert (fields[1]['User Answer'], fields[1]['Score']) == ('A', 1)
+    assert all(f['Final Score'] == 66.7 and f['Session Status'] == 'Completed' for f in fields)
+
+    stats = ledger.stats()
+    assert (stats['open_sessions'], stats['pending_answers'], stats['flushed_answers']) == (0, 0, 2)
+    ledger.close()
+    await db.close()
+
+async def test_retry_after_failure(tmp_path):
+    """A failed completion stays in the ledger, survives a restart and is retried"""
+    db = FlakyDB(str(tmp_path / 'bomi.db'), failures=1)
+    ledger = AnswerLedger(str(tmp_path / 'answers.db'))
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS)
+    for number in (1, 2, 3):
+        ledger.record(session_id, number, 'A', 1, record_id=record_ids[number])
+
+    assert not await ledger.complete(db, session_id, 100.0, record_ids)
+    assert ledger.stats()['pending_answers'] == 3
+    ledger.close()
+
+    # The idle loop retries failed completions straight away, even before they go idle
+    ledger = AnswerLedger(str(tmp_path / 'answers.db'))
+    await ledger.flush_idle(db)
+    assert db.batches[-1] == (db.batches[0][0], 100.0)
+    fields = [record['fields'] for record in await db.get_quiz_records(session_id)]
+    assert all(f['User Answer'] == 'A' and f['Final Score'] == 100.0 for f in fields)
+    assert ledger.stats()['open_sessions'] == 0
+    ledger.close()
+    await db.close()
+
+async def test_idle_flush_and_expiry(tmp_path):
+    """Idle sessions are flushed without completing them; abandoned ones are dropped"""
+    db = FlakyDB(str(tmp_path / 'bomi.db'), failures=0)
+    ledger = AnswerLedger(str(tmp_path / 'answers.db'), idle_seconds=600, max_age=3600)
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS)
+    ledger.record(session_id, 1, 'C', 0)
+
+    await ledger.flush_idle(db)
+    assert db.batches == []  # not idle yet
+    await ledger.flush_idle(db, idle_seconds=0)
+    assert db.batches == [({1: {'record_id': None, 'answer': 'C', 'score': 0, 'feedback': ''}}, None)]
+    fields = (await db.get_quiz_records(session_id))[0]['fields']
+    assert fields['User Answer'] == 'C'
+    assert 'Final Score' not in fields
+    assert ledger.stats()['pending_answers'] == 0
+
+    ledger.record('quiz_abandoned', 1, 'D', 0)
+    ledger.max_age = -1
+    db.failures = 2
+    await ledger.flush_idle(db, idle_seconds=0)
+    assert ledger.stats()['open_sessions'] == 0
+    ledger.close()
+    await db.close()
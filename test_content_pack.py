@@ -0,0 +1,68 @@
+import json
+import ai_content
+import content_pack
+from ai_content import CURRICULUM_TOPICS, LEVELS, THEORY_PROMPT_VERSION
+from theory_cache import theory_key
+from content_pack import lesson_topics, build_content_pack, load_content_pack
+
+class FakeBank:
+    """A loaded question bank with these categories"""
+
+    def __init__(self, categories):
+        self.categories = categories
+
+    def __len__(self):
+        return 1
+
+class FakeGenerator:
+    """Writes a short lesson per call; the listed keys fail their first `failures` attempts"""
+
+    def __init__(self, categories, failures=0, failing=()):
+        self.full_dataset = FakeBank(categories)
+        self.failures = {key: failures for key in failing}
+        self.calls = 0
+
+    async def write_theory(self, topic, language, level=None):
+        self.calls += 1
+        key = (topic, language, level)
+        if self.failures.get(key):
+            self.failures[key] -= 1
+            raise TimeoutError("no completion")
+        return f"{topic} for {level} students ({language})"
+
+def test_lesson_topics():
+    """Weak-topic categories are taught too, without repeating a curriculum topic"""
+    topics = lesson_topics(('general', 'gain', 'geometry', 'other'))
+    assert topics[:len(CURRICULUM_TOPICS)] == list(CURRICULUM_TOPICS)
+    assert {'general', 'gain', 'other', 'physics'} <= set(topics)
+    assert len({topic.lower() for topic in topics}) == len(topics)
+
+async def test_build_covers_weak_topics(tmp_path, monkeypatch):
+    """The pack holds every curriculum topic and dataset category, and loads back"""
+    monkeypatch.setattr(content_pack, 'BUILD_RETRY_DELAY', 0)
+    ai = FakeGenerator(('gain', 'general'), failures=2, failing=[('gain', 'uz', 'Advanced')])
+    monkeypatch.setattr(ai_content, 'get_content_generator', lambda: ai)
+    path = str(tmp_path / 'pack.json')
+
+    assert await build_content_pack(path, 'test')
+    pack = load_content_pack(path)
+    assert len(pack) == len(lesson_topics(('gain', 'general'))) * 2 * len(LEVELS)
+    assert pack[theory_key('gain', 'uz', 'Advanced+')] == "gain for Advanced students (uz)"
+    assert theory_key('Fractions', 'en', 'Beginner') in pack
+
+async def test_failed_lesson_keeps_old_pack(tmp_path, monkeypatch):
+    """A lesson that fails every attempt leaves the pack unwritten"""
+    monkeypatch.setattr(content_pack, 'BUILD_RETRY_DELAY', 0)
+    ai = FakeGenerator(('general',), failures=content_pack.BUILD_ATTEMPTS, failing=[('Algebra', 'en', 'Beginner')])
+    monkeypatch.setattr(ai_content, 'get_content_generator', lambda: ai)
+    path = tmp_path / 'pack.json'
+
+    assert not await build_content_pack(str(path), 'test')
+    assert not path.exists()
+
+def test_stale_pack_not_loaded(tmp_path):
+    """A pack built for another theory prompt is ignored"""
+    path = tmp_path / 'pack.json'
+    path.write_text(json.dumps({'version': 'old', 'prompt_version': THEORY_PROMPT_VERSION - 1, 'theory': {'algebra|en|any': "Old"}}))
+    assert load_content_pack(str(path)) == {}
+    assert load_content_pack(str(tmp_path / 'missing.json')) == {}
@@ -1,3 +1,4 @@
+import asyncio
 from ai_content import AIContentGenerator
 
 # Test AI content generation
@@ -9,7 +10,7 @@ try:
     
     # Test theory generation
     print("\nTesting theory generation...")
-    theory = ai.generate_theory_explanation('algebra', 'en')
+    theory = asyncio.run(ai.generate_theory_explanation('algebra', 'en'))
     print(f"Theory generated: {len(theory)} characters")
     print(f"Sample: {theory[:100]}...")
     
@@ -1,3 +1,4 @@
+import asyncio
 from ai_content import AIContentGenerator
 import openai
 import os
@@ -19,8 +20,8 @@ def test_dtm_knowledge():
         print(f"\n   Testing {topic.title()}:")
         
         try:
-            theory_uz = ai.generate_theory_explanation(topic, 'uz')
-            theory_en = ai.generate_theory_explanation(topic, 'en')
+            theory_uz = asyncio.run(ai.generate_theory_explanation(topic, 'uz'))
+            theory_en = asyncio.run(ai.generate_theory_explanation(topic, 'en'))
             
             print(f"     Uzbek Theory: {len(theory_uz)} chars")
             print(f"     English Theory: {len(theory_en)} chars")
@@ -43,7 +44,7 @@ def test_dtm_knowledge():
     
     sample_size = 1000
     for problem in ai.full_dataset[:sample_size]:
-        text = problem.get('Problem', '').lower()
+        text = problem.get('text', '').lower()
         
         if any(word in text for word in ['find', 'calculate', 'determine', 'solve']):
             patterns['calculation_problems'] += 1
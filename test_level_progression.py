@@ -1,9 +1,12 @@
+import asyncio
 from level_progression import LevelProgression
 from airtable_db import AirtableDB
 
 def test_level_progression():
     """Test the level progression system"""
-    
+    asyncio.run(check_level_progression())
+
+async def check_level_progression():
     print("=== LEVEL PROGRESSION SYSTEM TEST ===\n")
     
     db = AirtableDB()
@@ -13,7 +16,7 @@ def test_level_progression():
     user_id = "2067281193"
     
     print("1. CURRENT USER STATUS:")
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     if user:
         user_data = user.get('fields', {})
         print(f"   Current Level: {user_data.get('Level', 'N/A')}")
@@ -22,14 +25,14 @@ def test_level_progression():
         print(f"   Target Score: {user_data.get('Expected', 'N/A')}")
     
     print("\n2. LEVEL CALCULATION:")
-    calculated_level = level_system.calculate_user_level(user_id)
+    calculated_level = await level_system.calculate_user_level(user_id)
     print(f"   Calculated Level: {calculated_level}")
     
-    avg_score = level_system._get_average_lesson_score(user_id)
+    avg_score = await level_system._get_average_lesson_score(user_id)
     print(f"   Average Lesson Score: {avg_score:.1f}/5")
     
     print("\n3. LEVEL UP CHECK:")
-    should_level_up = level_system.should_level_up(user_id)
+    should_level_up = await level_system.should_level_up(user_id)
     print(f"   Should Level Up: {should_level_up}")
     
     if should_level_up:
@@ -37,7 +40,7 @@ def test_level_progression():
     
     print("\n4. ADAPTIVE DIFFICULTY:")
     current_level = user_data.get('Level', 'Beginner') if user else 'Beginner'
-    adaptive_level = level_system.get_adaptive_difficulty(user_id, current_level)
+    adaptive_level = await level_system.get_adaptive_difficulty(user_id, current_level)
     print(f"   Base Level: {current_level}")
     print(f"   Adaptive Level: {adaptive_level}")
     
@@ -48,6 +51,7 @@ def test_level_progression():
         print(f"   {level} (EN): {msg_en[:50]}...")
         print(f"   {level} (UZ): {msg_uz[:50]}...")
     
+    await db.close()
     print("\n=== TEST COMPLETE ===")
 
 if __name__ == "__main__":
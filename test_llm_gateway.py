@@ -0,0 +1,76 @@
+import asyncio
+from llm_gateway import SingleFlight
+
+async def test_single_flight_shares_call():
+    """Concurrent callers with the same key share one call"""
+    flight = SingleFlight()
+    calls = []
+
+    async def make_call():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return 'answer'
+
+    results = await asyncio.gather(*(flight.do('key', make_call) for _ in range(3)))
+    assert results == ['answer'] * 3
+    assert len(calls) == 1
+    assert (flight.calls, flight.saved) == (1, 2)
+
+    # Finished calls are forgotten, so the next caller starts a fresh one
+    assert await flight.do('key', make_call) == 'answer'
+    assert len(calls) == 2
+
+async def test_single_flight_cancellation():
+    """One caller giving up does not cancel the call for the others"""
+    flight = SingleFlight()
+
+    async def make_call():
+        await asyncio.sleep(0.05)
+        return 'answer'
+
+    first = asyncio.ensure_future(flight.do('key', make_call))
+    second = asyncio.ensure_future(flight.do('key', make_call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == 'answer'
+    assert first.cancelled()
+    assert flight.calls == 1
+
+async def test_single_flight_shares_errors():
+    """Every caller of a failed call gets its exception"""
+    flight = SingleFlight()
+
+    async def make_call():
+        await asyncio.sleep(0.01)
+        raise TimeoutError("no completion")
+
+    results = await asyncio.gather(flight.do('key', make_call), flight.do('key', make_call), return_exceptions=True)
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert flight.calls == 1
+
+async def test_single_flight_last_caller_cancels():
+    """The call stops once every caller waiting for it has given up"""
+    flight = SingleFlight()
+    steps = []
+
+    async def make_call():
+        for step in range(10):
+            steps.append(step)
+            await asyncio.sleep(0.01)
+        return 'answer'
+
+    callers = [asyncio.ensure_future(flight.do('key', make_call)) for _ in range(2)]
+    await asyncio.sleep(0.025)
+    callers[0].cancel()
+    await asyncio.sleep(0.02)
+    assert len(steps) > 3  # still running for the second caller
+    callers[1].cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    taken = len(steps)
+    await asyncio.sleep(0.05)
+    assert len(steps) == taken < 10
+
+    # A cancelled call is forgotten, so the next caller starts a fresh one
+    assert await flight.do('key', make_call) == 'answer'
+    assert flight.calls == 2
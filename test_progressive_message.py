@@ -0,0 +1,108 @@
+import asyncio
+from ai_content import AIContentGenerator
+from theory_cache import TheoryCache
+from progressive_message import ProgressiveMessage, TELEGRAM_MESSAGE_LIMIT
+
+class FakeMessage:
+    """A sent Telegram message recording its edits and replies"""
+
+    def __init__(self):
+        self.edits = []
+        self.replies = []
+
+        self.failures = 0
+
+    async def edit_text(self, text, parse_mode=None):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Flood control exceeded")
+        self.edits.append(text)
+
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append(text)
+
+async def test_update_whole_words_throttled():
+    """Updates show whole, cleaned words with a marker, at most once per interval"""
+    message = FakeMessage()
+    stream = ProgressiveMessage(message, "Header", str.upper, interval=60)
+    await stream.update("Frac")
+    assert message.edits == []  # no whole word yet
+    await stream.update("Fractions are pa")
+    assert message.edits == ["Header\n\nFRACTIONS ARE ..."]
+    await stream.update("Fractions are parts of a whole ")
+    assert len(message.edits) == 1
+    assert stream.edits == 1 and stream.first_edit_at is not None
+
+    stream.interval = 0
+    await stream.update("Fractions are parts of a whole ")
+    assert message.edits[-1] == "Header\n\nFRACTIONS ARE PARTS OF A WHOLE ..."
+
+async def test_finish():
+    """finish() shows the final text, retries once, then sends it as a new message"""
+    message = FakeMessage()
+    stream = ProgressiveMessage(message, "Header", str.strip, interval=0)
+    await stream.finish("Done")
+    assert message.edits == ["Header\n\nDone"]
+    await stream.finish("Done")
+    assert len(message.edits) == 1  # unchanged text is not sent again
+
+    message.failures = 1
+    await stream.finish("Retried")
+    assert message.edits[-1] == "Header\n\nRetried"
+
+    message.failures = 2
+    await stream.finish("x" * 5000)
+    assert message.replies == [("Header\n\n" + "x" * 5000)[:TELEGRAM_MESSAGE_LIMIT]]
+
+def streaming_generator(tmp_path, pieces=50):
+    """An AIContentGenerator whose theory streams in one word every 10ms; returns (ai, words written)"""
+    ai = AIContentGenerator.__new__(AIContentGenerator)  # only the theory path is needed
+    ai.theory_cache = TheoryCache(1, str(tmp_path / 'theory.db'))
+    written = []
+
+    async def write_theory(topic, language, level=None, on_progress=None):
+        content = ''
+        for i in range(pieces):
+            await asyncio.sleep(0.01)
+            content += f"word{i} "
+            written.append(i)
+            if on_progress is not None:
+                await on_progress(content)
+        return content.strip()
+
+    ai.write_theory = write_theory
+    return ai, written
+
+async def test_cancel_stops_streaming(tmp_path):
+    """Abandoning the only student's lesson mid-stream stops the generation and the edits"""
+    ai, written = streaming_generator(tmp_path)
+    message = FakeMessage()
+    stream = ProgressiveMessage(message, "Fractions", str.strip, interval=0)
+    task = asyncio.ensure_future(ai.write_lesson_theory('Fractions', 'en', on_progress=stream.update))
+    await asyncio.sleep(0.05)
+    stream.close()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    edits, words = len(message.edits), len(written)
+
+    await asyncio.sleep(0.1)
+    assert 0 < edits == len(message.edits)
+    assert len(written) == words < 50
+    assert ai.theory_cache.get('Fractions', 'en') is None
+
+async def test_cancel_while_shared(tmp_path):
+    """A student sharing the generation still gets the lesson, but the abandoned message is left alone"""
+    ai, written = streaming_generator(tmp_path, pieces=10)
+    message = FakeMessage()
+    stream = ProgressiveMessage(message, "Fractions", str.strip, interval=0)
+    first = asyncio.ensure_future(ai.write_lesson_theory('Fractions', 'en', on_progress=stream.update))
+    second = asyncio.ensure_future(ai.write_lesson_theory('Fractions', 'en'))
+    await asyncio.sleep(0.035)
+    stream.close()
+    first.cancel()
+    edits = len(message.edits)
+
+    assert await second == ' '.join(f"word{i}" for i in range(10))
+    assert len(message.edits) == edits
+    await stream.finish("late")
+    assert len(message.edits) == edits and message.replies == []
@@ -0,0 +1,101 @@
+import pytest
+from array import array
+from ai_content import AIContentGenerator
+from question_bank import QuestionBank, SeenQuestions, sample_unseen, MAGIC, FORMAT_VERSION, LEVEL_BITS
+
+def make_questions():
+    questions = []
+    for i, (topic, levels) in enumerate([('general', 1), ('geometry', 3), ('physics', 6), ('general', 7),
+                                         ('probability', 4), ('geometry', 2), ('general', 1), ('physics', 4)]):
+        questions.append({
+            'text': f"Question {i}: ½ of x² is?",
+            'options': (f"{i}", f"{i + 1}", f"{i + 2}", "√2"),
+            'correct': 'ABCD'[i % 4],
+            'topic': topic,
+            'rationale': f"Rationale {i}",
+            'complexity': i * 3,
+            'levels': levels
+        })
+    return questions
+
+def test_encode_decode(tmp_path):
+    """Questions read back from the bank, in memory and from a saved file, match the input"""
+    questions = make_questions()
+    bank = QuestionBank.from_questions(questions, {'source': len(questions)})
+    assert len(bank) == len(questions)
+    assert bank[:] == questions
+    assert bank[-1] == questions[-1]
+    assert bank.meta == {'source': len(questions)}
+
+    path = str(tmp_path / 'bank.bin')
+    bank.save(path)
+    for use_mmap in (True, False):
+        loaded = QuestionBank.load(path, use_mmap=use_mmap)
+        assert loaded[:] == questions
+        assert loaded.checksum == bank.checksum
+
+def test_rejects_other_files():
+    """Files that are not a current-format bank are refused, so the bank is rebuilt"""
+    data = bytearray(QuestionBank.from_questions(make_questions())._buffer)
+    with pytest.raises(ValueError):
+        QuestionBank(b'not a bank')
+    data[len(MAGIC)] = FORMAT_VERSION - 1
+    with pytest.raises(ValueError, match='format'):
+        QuestionBank(bytes(data))
+
+def test_level_and_category_index():
+    """The index returns exactly the questions of a level and of a set of categories"""
+    questions = make_questions()
+    bank = QuestionBank.from_questions(questions)
+
+    for level, bit in LEVEL_BITS.items():
+        expected = {i for i, question in enumerate(questions) if question['levels'] & bit}
+        assert set(bank.level_indices(bit)) == expected, level
+
+    categories = ('general', 'physics')
+    assert set(bank.category_indices(categories)) == {i for i, question in enumerate(questions) if question['topic'] in categories}
+    assert set(bank.indices(LEVEL_BITS['Advanced'], ('physics',))) == {2, 7}
+    assert bank.topic_counts() == {'general': 3, 'geometry': 2, 'physics': 2, 'probability': 1}
+
+def test_final_test_questions_unique():
+    """Topping up a small level pool with easier questions never repeats a question"""
+    ai = AIContentGenerator.__new__(AIContentGenerator)  # only the bank is needed
+    ai.full_dataset = QuestionBank.from_questions(make_questions())
+    for _ in range(20):
+        questions = ai.generate_final_test_questions('Advanced', 180, count=6)
+        assert len(questions) == 6
+        assert len({question['question'] for question in questions}) == 6
+
+def test_seen_questions_round_trip():
+    """A stored seen set restores for the same bank and starts empty for another one"""
+    bank = QuestionBank.from_questions(make_questions())
+    seen = SeenQuestions(bank)
+    for index in (0, 3, 7):
+        seen.add(index)
+    assert len(seen) == 3
+    assert 3 in seen and 4 not in seen
+
+    restored = SeenQuestions.from_bytes(bank, seen.to_bytes(), seen.checksum)
+    assert [i for i in range(len(bank)) if i in restored] == [0, 3, 7]
+
+    other_bank = QuestionBank.from_questions(make_questions()[:5])
+    assert other_bank.checksum != bank.checksum
+    assert len(SeenQuestions.from_bytes(other_bank, seen.to_bytes(), seen.checksum)) == 0
+    assert len(SeenQuestions.from_bytes(bank, b'', None)) == 0
+
+def test_sample_unseen():
+    """Samples are unique, unseen questions come first and repeats only top up"""
+    pool = array('I', range(100, 120))
+    seen = set(range(100, 115))
+
+    for _ in range(20):
+        picked = sample_unseen(pool, 5, seen)
+        assert sorted(picked) == list(range(115, 120))
+
+        topped_up = sample_unseen(pool, 8, seen)
+        assert len(set(topped_up)) == 8
+        assert sorted(topped_up[:5]) == list(range(115, 120))
+        assert all(index in seen for index in topped_up[5:])
+
+    assert sorted(sample_unseen(pool, 50, seen)) == list(pool)
+    assert sample_unseen(array('I'), 5, seen) == []
@@ -0,0 +1,79 @@
+import asyncio
+import question_pool
+from question_pool import QuestionPool
+
+KEY = ('quiz', 'fractions', 'Beginner', 'en')
+
+class FakeGenerator:
+    """Returns batches of questions numbered from 0, repeating once `unique` have been written"""
+
+    def __init__(self, unique=100, failures=0):
+        self.unique = unique
+        self.failures = failures
+        self.written = 0
+        self.calls = []
+
+    async def generate_ai_questions(self, kind, topic, level, language, count):
+        self.calls.append((kind, topic, level, language, count))
+        if self.failures:
+            self.failures -= 1
+            raise TimeoutError("no completion")
+        questions = [{'text': f"Question {(self.written + i) % self.unique}"} for i in range(count)]
+        self.written += count
+        return questions
+
+def test_take_never_waits():
+    """An empty pool serves nothing, counts the fallback and marks the key as wanted"""
+    pool = QuestionPool(FakeGenerator(), size=4, batch=2)
+    assert pool.take('quiz', 'Fractions', 'Beginner', 'en', 3) == []
+    assert KEY in pool.wanted
+    assert (pool.served, pool.fallbacks) == (0, 3)
+
+async def test_fill_is_bounded_and_deduplicated():
+    """Fills stop at the pool size and drop questions the pool already holds"""
+    ai = FakeGenerator(unique=3)
+    pool = QuestionPool(ai, size=4, batch=2)
+    pool.take(*KEY, 1)
+    await pool.fill(KEY)
+    await pool.fill(KEY)
+    assert [q['text'] for q in pool.pools[KEY]] == ["Question 0", "Question 1", "Question 2"]
+    assert (pool.requested, pool.accepted, pool.rejected) == (4, 3, 1)
+
+    served = pool.take(*KEY, 2)
+    assert [q['text'] for q in served] == ["Question 0", "Question 1"]
+    assert len(pool.pools[KEY]) == 1
+    assert pool.stats()['fill'] == {'quiz|fractions|Beginner|en': '1/4'}
+
+def test_next_key_emptiest_wanted():
+    """The producer tops up the emptiest pool asked for recently, and skips full and idle ones"""
+    pool = QuestionPool(FakeGenerator(), size=2, batch=2)
+    other = ('quiz', 'algebra', 'Beginner', 'en')
+    pool.take(*KEY, 1)
+    pool.take(*other, 1)
+    pool.pools[KEY].append({'text': "Ready"})
+    assert pool._next_key() == other
+
+    pool.pools[other].extend([{'text': "A"}, {'text': "B"}])
+    assert pool._next_key() == KEY
+    pool.wanted[KEY] -= question_pool.POOL_IDLE_TIME
+    assert pool._next_key() is None
+
+async def test_background_fill(monkeypatch):
+    """Once started, taking from a pool gets it refilled in the background, through failures"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(question_pool, 'MAX_BACKOFF', 0.01)
+    ai = FakeGenerator(failures=1)
+    pool = QuestionPool(ai, size=4, batch=2)
+    pool.start()
+    try:
+        pool.take(*KEY, 2)
+        for _ in range(100):
+            if len(pool.pools[KEY]) == 4:
+                break
+            await asyncio.sleep(0.01)
+        assert len(pool.pools[KEY]) == 4
+        assert pool.failed_calls == 1
+        assert len(pool.take(*KEY, 2)) == 2
+    finally:
+        await pool.stop()
+    assert pool._task is None
@@ -0,0 +1,55 @@
+import time
+import asyncio
+import pytest
+from rate_limiter import RateLimiter, PRIORITY_READ, PRIORITY_WRITE, PRIORITY_BACKGROUND
+
+async def test_priority_order():
+    """Queued requests are released reads first, then writes, then background work"""
+    limiter = RateLimiter(rate=1000, burst=1)
+    limiter.pause(0.05)  # everything below has to queue
+    released = []
+
+    async def request(name, priority):
+        await limiter.acquire(priority)
+        released.append(name)
+
+    await asyncio.gather(
+        request('background', PRIORITY_BACKGROUND),
+        request('write', PRIORITY_WRITE),
+        request('read', PRIORITY_READ),
+        request('read 2', PRIORITY_READ)
+    )
+    assert released == ['read', 'read 2', 'write', 'background']
+    stats = limiter.stats()
+    assert stats['queued'] == 4
+    assert stats['queue_depth'] == 0
+
+async def test_pause():
+    """A 429 pause holds back every request until it has passed"""
+    limiter = RateLimiter(rate=1000, burst=5)
+    await limiter.acquire()
+    limiter.pause(0.2)
+
+    started = time.monotonic()
+    await limiter.acquire()
+    assert time.monotonic() - started >= 0.19
+    assert limiter.stats()['throttled_429'] == 1
+
+async def test_cancelled_waiter():
+    """A caller that gives up is skipped and does not block the queue"""
+    limiter = RateLimiter(rate=1000, burst=1)
+    limiter.pause(0.05)
+    abandoned = asyncio.ensure_future(limiter.acquire(PRIORITY_READ))
+    waiting = asyncio.ensure_future(limiter.acquire(PRIORITY_BACKGROUND))
+    await asyncio.sleep(0)
+    abandoned.cancel()
+
+    await asyncio.wait_for(waiting, 1)
+    assert limiter.queue_depth() == 0
+
+def test_rejects_settings_without_tokens():
+    """A limiter that could never hand out a token is refused up front"""
+    for rate, burst in ((0.5, 0), (0, 1), (-1, 5)):
+        with pytest.raises(ValueError):
+            RateLimiter(rate=rate, burst=burst)
+    assert RateLimiter(rate=0.5, burst=1).capacity == 1
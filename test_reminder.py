@@ -1,4 +1,5 @@
 import re
+import asyncio
 from airtable_db import AirtableDB
 
 def test_time_validation():
@@ -20,18 +21,21 @@ def test_time_validation():
 
 def test_database_reminder_storage():
     """Test if reminder time is stored correctly in database"""
+    asyncio.run(check_database_reminder_storage())
+
+async def check_database_reminder_storage():
     db = AirtableDB()
     
     # Test with a known user ID (replace with actual user ID)
     test_user_id = "2067281193"
     test_time = "12:00"
     
-    user = db.get_user(test_user_id)
+    user = await db.get_user(test_user_id)
     if user:
         print(f"\nTesting database storage for user {test_user_id}:")
         
         # Update reminder time
-        result = db.update_user(user['id'], {
+        result = await db.update_user(user['id'], {
             'Reminder Time': test_time,
             'Timezone': test_time,
             'Mode': 'idle',
@@ -42,7 +46,7 @@ def test_database_reminder_storage():
             print(f"Successfully updated reminder time to {test_time}")
             
             # Verify the update
-            updated_user = db.get_user(test_user_id)
+            updated_user = await db.get_user(test_user_id)
             if updated_user:
                 user_data = updated_user.get('fields', {})
                 stored_time = user_data.get('Reminder Time', 'N/A')
@@ -63,6 +67,7 @@ def test_database_reminder_storage():
             print("Failed to update user")
     else:
         print(f"User {test_user_id} not found")
+    await db.close()
 
 def check_current_user_reminder():
     """Check current reminder settings for all users"""
@@ -0,0 +1,121 @@
+import pytest
+from sqlite_db import SQLiteDB
+from replicator import AirtableReplicator, LOCAL_ID_FIELD
+
+QUESTIONS = [
+    {'text': f"Question {i}", 'options': ('1', '2', '3', '4'), 'correct': 'D', 'topic': 'general'}
+    for i in range(2)
+]
+
+@pytest.fixture
+def mirror(tmp_path, airtable):
+    """(replicator, local SQLiteDB, FakeAirtable) with the users import already done"""
+    db, fake = airtable
+    local = SQLiteDB(str(tmp_path / 'bomi.db'))
+    local.mark_users_imported()
+    return AirtableReplicator(local, db), local, fake
+
+async def test_sync_advances_cursor(mirror):
+    """A pass copies every changed record, then moves the cursor past the changes"""
+    replicator, local, fake = mirror
+    user = await local.create_user(42, "Test Student", "student", 4242)
+    lesson_id = await local.create_learning_record(42, 1, "Fractions")
+    await local.update_user(user['id'], {'Active Lesson ID': lesson_id})
+    session_id, _ = await local.create_quiz_session(42, QUESTIONS)
+
+    assert await replicator.sync_once()
+    assert local.change_backlog(local.get_replication_cursor())[0] == 0
+    assert len(fake.records['Quizzes']) == 2
+    [(airtable_lesson_id, lesson)] = fake.records['Learning'].items()
+    assert lesson[LOCAL_ID_FIELD] == lesson_id
+    [(airtable_user_id, fields)] = fake.records['Users'].items()
+    # Record ID fields point at the Airtable copy of the record
+    assert fields['Active Lesson ID'] == airtable_lesson_id
+
+    fake.requests.clear()
+    assert await replicator.sync_once()
+    assert fake.requests == []
+
+    await local.update_user(user['id'], {'Level': 'Advanced'})
+    assert await replicator.sync_once()
+    assert fake.requests == [('PUT', 'Users', None)]
+    assert fake.records['Users'][airtable_user_id]['Level'] == 'Advanced'
+    await replicator.airtable.close()
+    await local.close()
+
+async def test_failed_pass_is_retried(mirror):
+    """A pass that did not land keeps the cursor, so the next pass sends the changes again"""
+    replicator, local, fake = mirror
+    await local.create_user(42, "Test Student", "student", 4242)
+
+    fake.fail(401)
+    assert not await replicator.sync_once()
+    assert local.get_replication_cursor() == 0
+    assert await replicator.sync_once()
+    assert len(fake.records['Users']) == 1
+    await replicator.airtable.close()
+    await local.close()
+
+async def test_lost_create_reply_not_duplicated(mirror):
+    """Records whose create landed without the reply reaching us are updated, not created again"""
+    replicator, local, fake = mirror
+    user = await local.create_user(42, "Test Student", "student", 4242)
+    lesson_id = await local.create_learning_record(42, 1, "Fractions")
+    session_id, _ = await local.create_quiz_session(42, QUESTIONS)
+    assert await replicator.sync_once()
+    counts = {table: len(records) for table, records in fake.records.items()}
+
+    # Forget what the first pass learnt and replay it, as after a lost reply
+    local.conn.execute("DELETE FROM mirror_ids")
+    for table, record_id in (('users', user['id']), ('learning', lesson_id)):
+        local.conn.execute("INSERT INTO changes (tbl, record_id, changed_at) VALUES (?, ?, 0)", (table, record_id))
+    await local.record_quiz_answers(session_id, {1: {'answer': 'D', 'score': 1}})
+    assert await replicator.sync_once()
+
+    assert {table: len(records) for table, records in fake.records.items()} == counts
+    assert any(fields.get('User Answer') == 'D' for fields in fake.records['Quizzes'].values())
+    await replicator.airtable.close()
+    await local.close()
+
+async def test_rejected_record_dead_lettered(mirror):
+    """A record Airtable refuses is set aside and the rest of its batch still goes through"""
+    replicator, local, fake = mirror
+    await local.create_user(1, "First", "first", 1)
+    await local.create_user(2, "Second", "second", 2)
+
+    fake.fail(422, 422)  # the batch, then the first record on its own
+    assert await replicator.sync_once()
+    assert len(fake.records['Users']) == 1
+    assert local.dead_letter_count() == 1
+    assert replicator.stats()['dead_letters'] == 1
+    assert local.get_replication_cursor() > 0
+    await replicator.airtable.close()
+    await local.close()
+
+async def test_import_users(tmp_path, airtable):
+    """Airtable users are imported once; a student created locally meanwhile keeps their progress"""
+    db, fake = airtable
+    fake.page_size = 1
+    fake.add('Users', {'User ID': '1', 'Full Name': "First", 'Current Day': '5', 'Learning Status': 'In Progress'})
+    fake.add('Users', {'User ID': '2', 'Full Name': "Second", 'Current Day': '9'})
+    local = SQLiteDB(str(tmp_path / 'bomi.db'))
+    replicator = AirtableReplicator(local, db)
+    # Messaged the bot while the import was failing
+    fresh = await local.create_user(1, "First", "first", 1)
+
+    fake.fail(401)
+    assert not await replicator.import_users()
+    assert await replicator.import_users()
+    assert await replicator.import_users()  # done once per database
+
+    first = await local.get_user(1)
+    assert first['id'] == fresh['id']
+    assert (first['fields']['Current Day'], first['fields']['Learning Status'], first['fields']['Username']) == ('5', 'In Progress', 'first')
+    assert (await local.get_user(2))['fields']['Current Day'] == '9'
+
+    assert await replicator.sync_once()
+    assert len(fake.records['Users']) == 2
+    airtable_first = next(fields for fields in fake.records['Users'].values() if fields['User ID'] == '1')
+    assert (airtable_first['Current Day'], airtable_first['Username']) == ('5', 'first')
+    await replicator.stop()
+    await local.close()
@@ -1,8 +1,12 @@
+import asyncio
 from state_manager import StateManager
 from airtable_db import AirtableDB
 
 def test_resume_functionality():
     """Test the resume functionality"""
+    asyncio.run(check_resume_functionality())
+
+async def check_resume_functionality():
     db = AirtableDB()
     state_manager = StateManager(db)
     
@@ -12,7 +16,7 @@ def test_resume_functionality():
     print("=== TESTING RESUME FUNCTIONALITY ===\n")
     
     # Get current state
-    state = state_manager.get_user_state(user_id)
+    state = await state_manager.get_user_state(user_id)
     
     if state:
         print(f"User State Found:")
@@ -46,6 +50,7 @@ def test_resume_functionality():
     else:
         print("No state found for user")
     
+    await db.close()
     print("\n=== TEST COMPLETE ===")
 
 if __name__ == "__main__":
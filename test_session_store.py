@@ -0,0 +1,76 @@
+from session_store import SessionStore
+
+def lesson(current_task=1):
+    return {
+        'questions': [{'text': f"Question {i}"} for i in range(5)],
+        'current_task': current_task,
+        'answers': [],
+        'lang': 'uz',
+        'quiz_record_ids': {1: 'rec1', 2: 'rec2'}
+    }
+
+def test_restore(tmp_path):
+    """A lesson under way comes back after a restart, as the handlers stored it"""
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(path)
+    store[42] = lesson()
+    store[42]['current_task'] = 3
+    store.save(42)
+    store.close()
+
+    restored = SessionStore(path)
+    assert restored[42] == {**lesson(), 'current_task': 3}
+    restored.pop(42)
+    restored.close()
+    assert 42 not in SessionStore(path)
+
+def test_only_quizzes_under_way_are_kept(tmp_path):
+    """Question-less stubs and finished lessons are not written to disk"""
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(path)
+    store[1] = {}
+    store[1]['waiting_for_time'] = True
+    store.save(1)
+    store[2] = lesson(current_task=5)
+    store[3] = lesson()
+    store[3]['completed'] = True
+    store.save(3)
+    store[4] = {'step': 'waiting_name', 'lang': 'en'}
+    assert len(store) == 4  # still in memory for the running bot
+    store.close()
+
+    assert list(SessionStore(path)) == []
+
+def test_expiry(tmp_path):
+    """Sessions untouched for longer than max_age are dropped at start"""
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(path)
+    store[1] = lesson()
+    store[2] = lesson()
+    with store.conn:
+        store.conn.execute("UPDATE sessions SET updated_at = updated_at - 7200 WHERE user_id = '1'")
+    store.close()
+
+    assert list(SessionStore(path, max_age=3600)) == [2]
+    assert list(SessionStore(path, max_age=3600)) == [2]
+
+def test_seen_questions_survive_restart(tmp_path):
+    """A student's seen questions come back after a restart, for the same bank only"""
+    from question_bank import QuestionBank
+    path = str(tmp_path / 'sessions.db')
+    bank = QuestionBank.from_questions([
+        {'text': f"Question {i}", 'options': ('1', '2', '3', '4'), 'correct': 'A', 'topic': 'general',
+         'rationale': '', 'complexity': i, 'levels': 1}
+        for i in range(10)
+    ])
+    store = SessionStore(path)
+    assert len(store.load_seen(42, bank)) == 0
+    seen = store.load_seen(42, bank)
+    seen.add(2)
+    seen.add(9)
+    store.save_seen(42, seen)
+    store.close()
+
+    restored = SessionStore(path).load_seen(42, bank)
+    assert [i for i in range(len(bank)) if i in restored] == [2, 9]
+    assert len(SessionStore(path).load_seen(42, QuestionBank.from_questions(bank[:5]))) == 0
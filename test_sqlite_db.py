@@ -0,0 +1,79 @@
+import re
+import pytest
+from storage import Storage
+from sqlite_db import SQLiteDB
+
+QUESTIONS = [
+    {'text': f"Question {i}", 'options': ('1', '2', '3', '4'), 'correct': 'B', 'topic': 'general'}
+    for i in range(3)
+]
+
+def test_incomplete_backend():
+    """A backend that leaves out a Storage method fails when it is created"""
+    class PartialDB(Storage):
+        async def get_user(self, user_id):
+            return None
+
+    with pytest.raises(TypeError, match='abstract'):
+        PartialDB()
+
+async def test_user_records(tmp_path):
+    """Users come back in Airtable's record shape, with empty fields dropped"""
+    db = SQLiteDB(str(tmp_path / 'bomi.db'))
+    assert isinstance(db, Storage)
+
+    user = await db.create_user(42, "Test Student", "", 4242)
+    assert set(user) == {'id', 'fields'}
+    assert re.fullmatch(r'rec\w{14}', user['id'])
+    assert user['fields']['User ID'] == '42'
+    assert user['fields']['Telegram Chat ID'] == '4242'
+    assert 'Username' not in user['fields']
+
+    # Creating the same user again returns the existing record
+    assert (await db.create_user(42, "Test Student", "", 4242))['id'] == user['id']
+
+    updated = await db.update_user(user['id'], {'Level': 'Beginner', 'Full Name': ''})
+    assert updated['fields']['Level'] == 'Beginner'
+    assert 'Full Name' not in updated['fields']
+    assert await db.get_user(42) == updated
+    assert await db.get_user(43) is None
+    await db.close()
+
+async def test_quiz_records(tmp_path):
+    """A quiz session stores its answers and completion like the Quizzes table"""
+    db = SQLiteDB(str(tmp_path / 'bomi.db'))
+    session_id, record_ids = await db.create_quiz_session(42, QUESTIONS, lesson_day=3)
+    assert list(record_ids) == [1, 2, 3]
+
+    await db.record_quiz_answers(session_id, {
+        1: {'record_id': record_ids[1], 'answer': 'B', 'score': 1, 'feedback': ''},
+        2: {'answer': 'C', 'score': 0, 'feedback': 'Check the sign'}
+    })
+    await db.record_quiz_answers(session_id, {}, final_score=50.0)
+
+    records = await db.get_quiz_records(session_id)
+    assert [record['id'] for record in records] == list(record_ids.values())
+    first, second, third = (record['fields'] for record in records)
+    assert (first['User Answer'], first['Score'], first['Correct Answer']) == ('B', 1, 'B')
+    assert 'AI Feedback' not in first
+    assert second['AI Feedback'] == 'Check the sign'
+    assert 'User Answer' not in third
+    assert all(fields['Session Status'] == 'Completed' and fields['Final Score'] == 50.0 for fields in (first, second, third))
+    assert all(fields['Lesson Day'] == '3' for fields in (first, second, third))
+
+    assert await db.get_lesson_quiz_records(42, 3) == records
+    assert db.quiz_record_ids(records) == record_ids
+    await db.close()
+
+async def test_learning_records(tmp_path):
+    """Learning records are created, merged on update and listed per user"""
+    db = SQLiteDB(str(tmp_path / 'bomi.db'))
+    record_id = await db.create_learning_record(42, 1, "Fractions")
+    await db.update_learning_record(record_id, {'Lesson Score': '80', 'Lesson Status': 'Completed'})
+
+    record = await db.get_learning_record(record_id)
+    assert record['fields']['Topic'] == "Fractions"
+    assert record['fields']['Lesson Score'] == '80'
+    assert 'Theory Summary' not in record['fields']
+    assert await db.get_learning_records(42) == [record]
+    await db.close()
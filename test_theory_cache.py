@@ -0,0 +1,59 @@
+import time
+from theory_cache import TheoryCache, theory_key
+
+def test_key():
+    """Keys ignore case and spacing, and 'Advanced+' shares the Advanced lessons"""
+    assert theory_key(" Fractions ", 'en', 'Advanced+') == theory_key('fractions', 'en', 'Advanced')
+    assert theory_key('Fractions', 'en') != theory_key('Fractions', 'uz')
+
+def test_get_and_put(tmp_path):
+    """Lessons are served per topic, language and level, and survive a restart"""
+    path = str(tmp_path / 'theory.db')
+    cache = TheoryCache(1, path)
+    assert cache.get('Fractions', 'en', 'Beginner') is None
+    cache.put('Fractions', 'en', 'Beginner', "Fractions explained")
+    assert cache.get('fractions', 'en', 'Beginner') == "Fractions explained"
+    assert cache.get('Fractions', 'uz', 'Beginner') is None
+    assert cache.stats()['hits'] == 1
+
+    assert TheoryCache(1, path).get('Fractions', 'en', 'Beginner') == "Fractions explained"
+
+def test_version_and_ttl(tmp_path):
+    """Lessons written for another prompt version, or older than the TTL, are not served"""
+    path = str(tmp_path / 'theory.db')
+    TheoryCache(1, path).put('Fractions', 'en', None, "Old prompt")
+    assert TheoryCache(2, path).get('Fractions', 'en') is None
+    assert TheoryCache(1, path).get('Fractions', 'en') is None  # purged when v2 opened the file
+
+    cache = TheoryCache(1, path, ttl=3600)
+    cache.put('Ratios', 'en', None, "Ratios explained")
+    with cache.conn:
+        cache.conn.execute("UPDATE theory SET created_at = ?", (time.time() - 7200,))
+    assert cache.get('Ratios', 'en') is None
+
+def test_lru_eviction(tmp_path):
+    """Past max_entries the least recently served lesson is evicted"""
+    cache = TheoryCache(1, str(tmp_path / 'theory.db'), max_entries=2)
+    cache.put('Algebra', 'en', None, "Algebra")
+    time.sleep(0.001)
+    cache.put('Geometry', 'en', None, "Geometry")
+    time.sleep(0.001)
+    cache.get('Algebra', 'en')
+    time.sleep(0.001)
+    cache.put('Ratios', 'en', None, "Ratios")
+    assert cache.get('Geometry', 'en') is None
+    assert cache.get('Algebra', 'en') == "Algebra"
+    assert cache.stats()['size'] == 2
+
+def test_variants_rotate(tmp_path):
+    """With variants, a key misses until it is full, then serves its lessons in rotation"""
+    cache = TheoryCache(1, str(tmp_path / 'theory.db'), variants=2)
+    cache.put('Algebra', 'en', None, "First")
+    assert cache.get('Algebra', 'en') is None
+    cache.put('Algebra', 'en', None, "Second")
+    served = []
+    for _ in range(4):
+        served.append(cache.get('Algebra', 'en'))
+        time.sleep(0.001)
+    assert sorted(served[:2]) == ["First", "Second"]
+    assert served[2:] == served[:2]
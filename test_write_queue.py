@@ -0,0 +1,44 @@
+import asyncio
+from write_queue import UserWriteQueue
+
+async def test_writes_keep_order():
+    """A user's writes are applied in submission order, even when an earlier one is slower"""
+    queue = UserWriteQueue()
+    applied = []
+
+    async def write(user_id, name, delay):
+        await asyncio.sleep(delay)
+        applied.append((user_id, name))
+
+    queue.submit(1, 'first', write, 1, 'first', 0.05)
+    queue.submit(1, 'second', write, 1, 'second', 0)
+    queue.submit(2, 'other user', write, 2, 'other user', 0)
+    queue.submit(1, 'third', write, 1, 'third', 0)
+    assert queue.pending() == 4
+
+    await queue.flush()
+    assert [name for user_id, name in applied if user_id == 1] == ['first', 'second', 'third']
+    # Another user's write does not wait for user 1's slow write
+    assert applied[0] == (2, 'other user')
+    assert queue.pending() == 0
+    assert queue.stats()['applied'] == 4
+
+async def test_failed_write_does_not_stop_queue():
+    """A failing write is counted and the writes behind it still run"""
+    queue = UserWriteQueue()
+    applied = []
+
+    async def fail():
+        raise RuntimeError("storage unavailable")
+
+    async def write(name):
+        applied.append(name)
+
+    queue.submit(1, 'broken', fail)
+    queue.submit(1, 'after', write, 'after')
+    await queue.flush(1)
+
+    assert applied == ['after']
+    stats = queue.stats()
+    assert stats['failed'] == 1
+    assert stats['applied'] == 1
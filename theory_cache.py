@@ -0,0 +1,96 @@
+import os
+import time
+import sqlite3
+
+THEORY_CACHE_PATH = os.getenv('THEORY_CACHE_PATH', 'theory_cache.db')
+# Cached lessons older than this are regenerated
+THEORY_CACHE_TTL = int(os.getenv('THEORY_CACHE_TTL', str(30 * 24 * 3600)))
+# Most lessons kept on disk; least recently served ones are evicted first
+THEORY_CACHE_SIZE = int(os.getenv('THEORY_CACHE_SIZE', '500'))
+# Lessons kept per (topic, language, level); they are served in rotation
+THEORY_VARIANTS = int(os.getenv('THEORY_VARIANTS', '1'))
+
+def theory_key(topic, language, level=None):
+    """Lookup key for a theory lesson; 'Advanced+' style levels share their base level's lessons"""
+    return f"{topic.strip().lower()}|{language}|{(level or 'any').rstrip('+').lower()}"
+
+class TheoryCache:
+    """On-disk LRU of generated theory lessons keyed by topic, language and level.
+
+    Entries written under another content version (the theory prompt changed) are
+    ignored and purged. With variants > 1 a key is filled up to that many lessons,
+    after which the least recently served one is returned each time.
+    """
+
+    def __init__(self, version, path=None, ttl=THEORY_CACHE_TTL, max_entries=THEORY_CACHE_SIZE, variants=THEORY_VARIANTS):
+        self.version = str(version)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path or THEORY_CACHE_PATH, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS theory (
+                key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (key, variant)
+            )
+        """)
+        with self.conn:
+            self.conn.execute("DELETE FROM theory WHERE version != ? OR created_at < ?",
+                              (self.version, time.time() - self.ttl))
+
+    def get(self, topic, language, level=None):
+        """Cached lesson for the key, or None while the key has fewer than `variants` lessons"""
+        key = theory_key(topic, language, level)
+        rows = self.conn.execute(
+            "SELECT variant, content FROM theory WHERE key = ? AND version = ? AND created_at >= ? ORDER BY last_used",
+            (key, self.version, time.time() - self.ttl)
+        ).fetchall()
+        if len(rows) < self.variants:
+            self.misses += 1
+            return None
+
+        variant, content = rows[0]
+        with self.conn:
+            self.conn.execute("UPDATE theory SET last_used = ? WHERE key = ? AND variant = ?", (time.time(), key, variant))
+        self.hits += 1
+        return content
+
+    def put(self, topic, language, level, content):
+        key = theory_key(topic, language, level)
+        now = time.time()
+        rows = self.conn.execute(
+            "SELECT variant FROM theory WHERE key = ? AND version = ? AND created_at >= ? ORDER BY created_at",
+            (key, self.version, now - self.ttl)
+        ).fetchall()
+        used = {row[0] for row in rows}
+        # Fill a free slot, or replace the oldest lesson of a full key
+        variant = next((i for i in range(self.variants) if i not in used), rows[0][0] if rows else 0)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO theory (key, variant, version, content, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, variant, self.version, content, now, now)
+            )
+            self.conn.execute(
+                "DELETE FROM theory WHERE rowid IN (SELECT rowid FROM theory ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        size = self.conn.execute("SELECT COUNT(*) FROM theory").fetchone()[0]
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
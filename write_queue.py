@@ -0,0 +1,72 @@
+import time
+import asyncio
+from collections import deque
+
+class UserWriteQueue:
+    """Storage writes applied in the background, one at a time and in order per user.
+
+    Handlers submit() a write and reply straight away; each user with pending writes
+    has one worker task draining their queue, so a user's writes never overtake each
+    other while different users' writes run concurrently. A failed write is logged and
+    counted, and the queue moves on.
+    """
+
+    def __init__(self):
+        self._queues = {}  # user_id -> deque of (label, func, args, kwargs, queued_at)
+        self._workers = {}  # user_id -> task draining that user's queue
+
+        self.submitted = 0
+        self.applied = 0
+        self.failed = 0
+        self.max_lag = 0.0
+
+    def submit(self, user_id, label, func, *args, **kwargs):
+        """Queue `await func(*args, **kwargs)` behind the user's earlier writes"""
+        self._queues.setdefault(user_id, deque()).append((label, func, args, kwargs, time.monotonic()))
+        self.submitted += 1
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.get_running_loop().create_task(self._drain(user_id))
+
+    async def _drain(self, user_id):
+        queue = self._queues[user_id]
+        try:
+            while queue:
+                label, func, args, kwargs, queued_at = queue[0]
+                try:
+                    await func(*args, **kwargs)
+                    self.applied += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"[ERROR] Background write '{label}' for user {user_id} failed: {e!r}")
+                queue.popleft()
+                self.max_lag = max(self.max_lag, time.monotonic() - queued_at)
+        finally:
+            del self._workers[user_id]
+            if not queue:
+                del self._queues[user_id]
+
+    async def flush(self, user_id=None):
+        """Wait until the queued writes of one user (or of everyone) are applied"""
+        while True:
+            workers = list(self._workers.values()) if user_id is None else [self._workers[user_id]] if user_id in self._workers else []
+            if not workers:
+                return
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def pending(self, user_id=None):
+        if user_id is not None:
+            return len(self._queues.get(user_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        now = time.monotonic()
+        oldest = min((queue[0][4] for queue in self._queues.values() if queue), default=None)
+        return {
+            'pending': self.pending(),
+            'users_pending': len(self._queues),
+            'oldest_pending_s': round(now - oldest, 2) if oldest is not None else 0.0,
+            'submitted': self.submitted,
+            'applied': self.applied,
+            'failed': self.failed,
+            'max_lag_s': round(self.max_lag, 2)
+        }